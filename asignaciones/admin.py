@@ -1,7 +1,58 @@
 # asignaciones/admin.py
-from django.contrib import admin
-from .models import Vehiculo, Conductor, Asignacion
+from datetime import datetime
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.utils import get_last_value_from_parameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import models, transaction
+from django.utils import timezone
+from .models import Vehiculo, Conductor, HabilitacionConductor, Asignacion
+from django.urls import reverse
 from django.utils.html import format_html
+from . import eventos
+from .cache import incrementar_version
+from .pagination import ConteoEstimadoPaginator
+from .services import estadisticas
+from .services.fotos import version_foto
+
+
+class FiltroAutocompletar(admin.FieldListFilter):
+    """
+    Filtro por clave foránea que no lista todas las opciones (RelatedFieldListFilter carga la tabla
+    relacionada completa): muestra un selector con búsqueda que usa la misma vista que
+    autocomplete_fields, así que el campo debe estar en autocomplete_fields del admin.
+    """
+    template = 'admin/asignaciones/filtro_autocompletar.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = get_last_value_from_parameters(params, self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.title = field.verbose_name
+        self.selector = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(), required=False,
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={'onchange': 'this.form.submit()'}),
+        ).widget
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        # El formulario reenvía los demás parámetros (búsqueda, orden, otros filtros) como campos ocultos
+        self.parametros = [
+            (clave, valor) for clave, valores in changelist.filter_params.items()
+            if clave != self.lookup_kwarg for valor in valores
+        ]
+        self.html_selector = self.selector.render(self.lookup_kwarg, self.lookup_val, attrs={'id': f'filtro_{self.field_path}'})
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': 'Todos',
+        }
 
 @admin.register(Vehiculo)
 class VehiculoAdmin(admin.ModelAdmin):
@@ -41,21 +92,36 @@ class VehiculoAdmin(admin.ModelAdmin):
     autocomplete_fields = ['conductor_preferente']
 
 
+    def _url_foto(self, obj, variante):
+        # Las miniaturas se generan en segundo plano; mientras tanto se usa la foto original
+        if not obj.foto_variantes_generadas:
+            return obj.foto.url
+        url = reverse('vehiculo-foto', kwargs={'pk': obj.pk, 'variante': variante})
+        return f'{url}?v={version_foto(obj.foto.name)}'
+
     def ver_foto(self, obj):
         if obj.foto:
-            return format_html('<img src="{}" width="50" height="50" />', obj.foto.url)
+            return format_html('<img src="{}" width="50" height="50" loading="lazy" />', self._url_foto(obj, 'miniatura'))
         return "Sin foto"
     ver_foto.short_description = 'Foto'
 
     def foto_preview(self, obj):
         if obj.foto:
-            return format_html('<img src="{}" width="150" height="150" />', obj.foto.url)
+            return format_html('<img src="{}" width="150" height="150" />', self._url_foto(obj, 'vista_previa'))
         return "(Sin imagen)"
     foto_preview.short_description = 'Vista Previa de Foto'
 
 
+class HabilitacionConductorInline(admin.TabularInline):
+    model = HabilitacionConductor
+    extra = 1
+    verbose_name = "Tipo de vehículo habilitado"
+    verbose_name_plural = "Tipos de vehículo habilitados"
+
+
 @admin.register(Conductor)
 class ConductorAdmin(admin.ModelAdmin):
+    inlines = [HabilitacionConductorInline]
     list_display = (
         'apellido',
         'nombre',
@@ -74,7 +140,7 @@ class ConductorAdmin(admin.ModelAdmin):
             'fields': ('nombre', 'apellido', 'numero_licencia', 'fecha_vencimiento_licencia')
         }),
         ('Contacto y Estado', {
-            'fields': ('telefono', 'email', 'activo', 'estado_disponibilidad', 'tipos_vehiculo_habilitados')
+            'fields': ('telefono', 'email', 'activo', 'estado_disponibilidad')
         }),
          ('Ubicación Actual', { # Nuevo
             'fields': ('ubicacion_actual_lat', 'ubicacion_actual_lon')
@@ -82,6 +148,34 @@ class ConductorAdmin(admin.ModelAdmin):
     )
 
 
+class AniosIndexadosQuerySet(models.QuerySet):
+    """
+    date_hierarchy pide los años con datetimes(campo, 'year'), que trunca la fecha de cada fila de la
+    tabla. Aquí sale de MIN/MAX y de un exists() por año, todos búsquedas por rango sobre el índice.
+    """
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind != 'year':
+            return super().datetimes(field_name, kind, order, tzinfo)
+        rango = self.aggregate(primero=models.Min(field_name), ultimo=models.Max(field_name))
+        if rango['primero'] is None:
+            return []
+        anios = []
+        for anio in range(timezone.localtime(rango['primero']).year, timezone.localtime(rango['ultimo']).year + 1):
+            desde = timezone.make_aware(datetime(anio, 1, 1))
+            hasta = timezone.make_aware(datetime(anio + 1, 1, 1))
+            if self.filter(**{f'{field_name}__gte': desde, f'{field_name}__lt': hasta}).exists():
+                anios.append(desde)
+        return anios if order == 'ASC' else anios[::-1]
+
+
+def _accion_estado(estado, etiqueta):
+    def accion(modeladmin, request, queryset):
+        modeladmin.cambiar_estado(request, queryset, estado, etiqueta)
+    accion.__name__ = f'marcar_{estado}'
+    return admin.action(description=f'Marcar como "{etiqueta}"')(accion)
+
+
 @admin.register(Asignacion)
 class AsignacionAdmin(admin.ModelAdmin):
     list_display = (
@@ -97,8 +191,8 @@ class AsignacionAdmin(admin.ModelAdmin):
         'estado',
         'tipo_servicio',                # Añadido
         'fecha_hora_requerida_inicio',  # CORREGIDO: antes 'fecha_hora_inicio'
-        'vehiculo',
-        'conductor'
+        ('vehiculo', FiltroAutocompletar),
+        ('conductor', FiltroAutocompletar),
     )
     search_fields = (
         'id',
@@ -108,8 +202,14 @@ class AsignacionAdmin(admin.ModelAdmin):
         'conductor__apellido'
     )
     autocomplete_fields = ['vehiculo', 'conductor']
-    list_editable = ('estado',) # Puedes hacer el estado editable si quieres
     ordering = ('-fecha_hora_requerida_inicio',)
+    # Navegación por año/mes/día con rangos sobre el índice asig_inicio_id_idx
+    date_hierarchy = 'fecha_hora_requerida_inicio'
+    # Sin COUNT(*) de la tabla completa en cada página; el total filtrado sale estimado o del caché
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    # El estado se cambia con acciones masivas (un UPDATE por lote) en vez de list_editable
+    actions = [_accion_estado(estado, etiqueta) for estado, etiqueta in Asignacion.ESTADO_ASIGNACION_CHOICES]
 
 
     fieldsets = (
@@ -130,5 +230,35 @@ class AsignacionAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('fecha_hora_solicitud',) # La fecha de solicitud se pone automáticamente
 
+    def save_model(self, request, obj, form, change):
+        # Editada a mano: el planificador ya no la mueve
+        if change and {'vehiculo', 'conductor', 'estado'} & set(form.changed_data):
+            obj.asignada_por_motor = False
+        super().save_model(request, obj, form, change)
+
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('vehiculo', 'conductor')
\ No newline at end of file
+        queryset = super().get_queryset(request).select_related('vehiculo', 'conductor')
+        return AniosIndexadosQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    @property
+    def media(self):
+        # JS/CSS de select2 para los FiltroAutocompletar de la barra lateral
+        return super().media + AutocompleteSelect(Asignacion._meta.get_field('vehiculo'), self.admin_site).media
+
+    def cambiar_estado(self, request, queryset, estado, etiqueta):
+        """
+        UPDATE por lotes en vez de un save() completo por fila. queryset.update() no dispara señales:
+        los rollups de estadísticas y los eventos se actualizan aquí.
+        """
+        filas = list(queryset.exclude(estado=estado).values('id', 'vehiculo_id', 'conductor_id'))
+        cambiadas = 0
+        with transaction.atomic():
+            for i in range(0, len(filas), estadisticas.TAMANO_BLOQUE):
+                lote = filas[i:i + estadisticas.TAMANO_BLOQUE]
+                ids = [fila['id'] for fila in lote]
+                with estadisticas.seguimiento(ids):
+                    cambiadas += Asignacion.objects.filter(pk__in=ids).exclude(estado=estado).update(estado=estado)
+                eventos.publicar_al_confirmar('asignacion', [{**fila, 'estado': estado} for fila in lote])
+            if cambiadas:
+                transaction.on_commit(lambda: incrementar_version(Asignacion))
+        self.message_user(request, f'{cambiadas} asignación(es) marcada(s) como "{etiqueta}".', messages.SUCCESS)
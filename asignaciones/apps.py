@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _asegurar_indices_fts(sender, using, **kwargs):
+    from django.db import connections
+    from .busqueda import asegurar_indices_fts
+    asegurar_indices_fts(connections[using])
 
 
 class AsignacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'asignaciones'
+
+    def ready(self):
+        # Las reconstrucciones de tablas en SQLite borran los triggers FTS; se recrean después de migrar
+        post_migrate.connect(_asegurar_indices_fts, sender=self)
+        from . import signals  # noqa: F401
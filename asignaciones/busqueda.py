@@ -0,0 +1,150 @@
+# asignaciones/busqueda.py
+"""
+Índices de texto completo (FTS5) para la búsqueda libre en asignaciones, vehículos y conductores.
+
+Sólo existen en SQLite; en otros motores la búsqueda usa el SearchFilter normal (LIKE).
+Los índices se mantienen con triggers, así que también quedan al día con bulk_create,
+bulk_update y queryset.update(), que no disparan señales de Django.
+
+Cuando una migración reconstruye una tabla en SQLite (p.ej. al quitar una columna) se pierden
+sus triggers, por eso asegurar_indices_fts() es idempotente y se vuelve a ejecutar en post_migrate.
+"""
+TOKENIZADOR = "tokenize = 'unicode61 remove_diacritics 2'"
+
+_INSERT_ASIGNACION = (
+    "INSERT INTO asignaciones_asignacion_fts(rowid, destino_descripcion, origen_descripcion, observaciones) "
+    "SELECT id, destino_descripcion, origen_descripcion, COALESCE(observaciones, '') FROM asignaciones_asignacion"
+)
+_INSERT_VEHICULO = (
+    "INSERT INTO asignaciones_vehiculo_fts(rowid, patente, marca, modelo, caracteristicas_adicionales) "
+    "SELECT id, patente, marca, modelo, caracteristicas_adicionales FROM asignaciones_vehiculo"
+)
+_INSERT_CONDUCTOR = (
+    "INSERT INTO asignaciones_conductor_fts(rowid, nombre, apellido, numero_licencia) "
+    "SELECT id, nombre, apellido, numero_licencia FROM asignaciones_conductor"
+)
+
+# Cada trigger lee sólo su propia tabla: un trigger que consulta otra tabla impide que SQLite
+# reconstruya esa otra tabla en una migración. Los datos del vehículo de una asignación se
+# buscan en asignaciones_vehiculo_fts (ver BusquedaTextoFilter).
+INDICES_FTS = [
+    {
+        'tabla': 'asignaciones_asignacion_fts',
+        'crear': "CREATE VIRTUAL TABLE IF NOT EXISTS asignaciones_asignacion_fts USING fts5("
+                 f"destino_descripcion, origen_descripcion, observaciones, {TOKENIZADOR})",
+        'poblar': _INSERT_ASIGNACION,
+        'triggers': {
+            'asignaciones_asignacion_fts_ai': f"""
+                AFTER INSERT ON asignaciones_asignacion BEGIN
+                    {_INSERT_ASIGNACION} WHERE id = new.id;
+                END""",
+            'asignaciones_asignacion_fts_au': f"""
+                AFTER UPDATE OF destino_descripcion, origen_descripcion, observaciones ON asignaciones_asignacion BEGIN
+                    DELETE FROM asignaciones_asignacion_fts WHERE rowid = old.id;
+                    {_INSERT_ASIGNACION} WHERE id = new.id;
+                END""",
+            'asignaciones_asignacion_fts_ad': """
+                AFTER DELETE ON asignaciones_asignacion BEGIN
+                    DELETE FROM asignaciones_asignacion_fts WHERE rowid = old.id;
+                END""",
+        },
+    },
+    {
+        'tabla': 'asignaciones_vehiculo_fts',
+        'crear': "CREATE VIRTUAL TABLE IF NOT EXISTS asignaciones_vehiculo_fts USING fts5("
+                 f"patente, marca, modelo, caracteristicas_adicionales, {TOKENIZADOR})",
+        'poblar': _INSERT_VEHICULO,
+        'triggers': {
+            'asignaciones_vehiculo_fts_ai': f"""
+                AFTER INSERT ON asignaciones_vehiculo BEGIN
+                    {_INSERT_VEHICULO} WHERE id = new.id;
+                END""",
+            'asignaciones_vehiculo_fts_au': f"""
+                AFTER UPDATE OF patente, marca, modelo, caracteristicas_adicionales ON asignaciones_vehiculo BEGIN
+                    DELETE FROM asignaciones_vehiculo_fts WHERE rowid = old.id;
+                    {_INSERT_VEHICULO} WHERE id = new.id;
+                END""",
+            'asignaciones_vehiculo_fts_ad': """
+                AFTER DELETE ON asignaciones_vehiculo BEGIN
+                    DELETE FROM asignaciones_vehiculo_fts WHERE rowid = old.id;
+                END""",
+        },
+    },
+    {
+        'tabla': 'asignaciones_conductor_fts',
+        'crear': "CREATE VIRTUAL TABLE IF NOT EXISTS asignaciones_conductor_fts USING fts5("
+                 f"nombre, apellido, numero_licencia, {TOKENIZADOR})",
+        'poblar': _INSERT_CONDUCTOR,
+        'triggers': {
+            'asignaciones_conductor_fts_ai': f"""
+                AFTER INSERT ON asignaciones_conductor BEGIN
+                    {_INSERT_CONDUCTOR} WHERE id = new.id;
+                END""",
+            'asignaciones_conductor_fts_au': f"""
+                AFTER UPDATE OF nombre, apellido, numero_licencia ON asignaciones_conductor BEGIN
+                    DELETE FROM asignaciones_conductor_fts WHERE rowid = old.id;
+                    {_INSERT_CONDUCTOR} WHERE id = new.id;
+                END""",
+            'asignaciones_conductor_fts_ad': """
+                AFTER DELETE ON asignaciones_conductor BEGIN
+                    DELETE FROM asignaciones_conductor_fts WHERE rowid = old.id;
+                END""",
+        },
+    },
+]
+
+_tablas_disponibles = {}
+
+
+def _existentes(cursor, tipo):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = %s", [tipo])
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def asegurar_indices_fts(connection):
+    """Crea las tablas FTS y sus triggers que falten. Si faltaba algún trigger, reconstruye el índice."""
+    if connection.vendor != 'sqlite':
+        return
+    tablas_base = {'asignaciones_asignacion', 'asignaciones_vehiculo', 'asignaciones_conductor'}
+    with connection.cursor() as cursor:
+        tablas = _existentes(cursor, 'table')
+        if not tablas_base <= tablas:
+            return  # Aún no se aplican las migraciones iniciales
+        triggers = _existentes(cursor, 'trigger')
+        for indice in INDICES_FTS:
+            faltantes = [nombre for nombre in indice['triggers'] if nombre not in triggers]
+            if indice['tabla'] in tablas and not faltantes:
+                continue
+            cursor.execute(indice['crear'])
+            for nombre in faltantes:
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {nombre} {indice['triggers'][nombre]}")
+            cursor.execute(f"DELETE FROM {indice['tabla']}")
+            cursor.execute(indice['poblar'])
+    _tablas_disponibles.clear()
+
+
+def eliminar_indices_fts(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for indice in INDICES_FTS:
+            for nombre in indice['triggers']:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute(f"DROP TABLE IF EXISTS {indice['tabla']}")
+    _tablas_disponibles.clear()
+
+
+def indice_disponible(connection, tabla):
+    """True si la tabla FTS existe en esta conexión (se consulta una sola vez por alias)."""
+    if connection.vendor != 'sqlite':
+        return False
+    clave = (connection.alias, tabla)
+    if clave not in _tablas_disponibles:
+        with connection.cursor() as cursor:
+            _tablas_disponibles[clave] = tabla in _existentes(cursor, 'table')
+    return _tablas_disponibles[clave]
+
+
+def consulta_match(terminos, operador=' '):
+    """Arma la expresión MATCH de FTS5 con cada término como prefijo ("term"*). Por defecto exige todos."""
+    return operador.join('"{}"*'.format(termino.replace('"', '""')) for termino in terminos if termino)
@@ -0,0 +1,111 @@
+# asignaciones/cache.py
+"""
+Caché de respuestas de lectura versionada por modelo.
+
+Cada modelo tiene un contador de versión (en el caché 'versiones') que se incrementa con cada
+cambio (señales post_save/post_delete y los servicios que usan queryset.update()). El ETag de
+una respuesta se deriva de la versión y la URL, así que un If-None-Match se responde con 304 sin
+consultar la base de datos y nunca hace falta invalidar respuestas: al cambiar la versión cambia
+la clave. Los cuerpos se guardan en el caché 'respuestas' (LocMemCache, LRU con MAX_ENTRIES).
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import usar_primaria
+
+TIEMPO_RESPUESTAS = 300
+
+
+def _cache(alias):
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _claves(modelo):
+    nombre = modelo._meta.label_lower
+    return f'version:{nombre}', f'modificado:{nombre}'
+
+
+def version_modelo(modelo):
+    """(version, timestamp de la última modificación) del modelo."""
+    cache = _cache('versiones')
+    clave_version, clave_modificado = _claves(modelo)
+    valores = cache.get_many([clave_version, clave_modificado])
+    if clave_version not in valores:
+        ahora = time.time()
+        cache.add(clave_version, 1, timeout=None)
+        cache.add(clave_modificado, ahora, timeout=None)
+        return cache.get(clave_version, 1), cache.get(clave_modificado, ahora)
+    return valores[clave_version], valores.get(clave_modificado, time.time())
+
+
+def incrementar_version(*modelos):
+    cache = _cache('versiones')
+    for modelo in modelos:
+        clave_version, clave_modificado = _claves(modelo)
+        try:
+            cache.incr(clave_version)
+        except ValueError:
+            cache.set(clave_version, 2, timeout=None)
+        cache.set(clave_modificado, time.time(), timeout=None)
+
+
+class RespuestaCacheadaMixin:
+    """
+    Cachea list/retrieve según la versión de 'modelos_cache' y responde ETag/Last-Modified.
+    La autenticación es perezosa (como sugiere DRF): una lectura pública que termina en 304 o en
+    un acierto de caché no consulta la base de datos ni siquiera para validar el token.
+    """
+    modelos_cache = ()
+
+    def perform_authentication(self, request):
+        pass
+
+    def _version(self):
+        versiones = [version_modelo(modelo) for modelo in self.modelos_cache]
+        return ':'.join(str(v) for v, _ in versiones), max(m for _, m in versiones)
+
+    def _respuesta_cacheada(self, request, generar):
+        version, modificado = self._version()
+        firma = f'{version}|{request.accepted_renderer.format}|{request.get_full_path()}'
+        etag = '"{}"'.format(hashlib.sha1(firma.encode()).hexdigest())
+
+        if_none_match = request.headers.get('If-None-Match')
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if (if_none_match and etag in [e.strip() for e in if_none_match.split(',')]) or (
+            not if_none_match and if_modified_since and int(modificado) <= if_modified_since
+        ):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = _cache('respuestas')
+            clave = f'respuesta:{etag}'
+            data = cache.get(clave)
+            if data is not None:
+                response = Response(data)
+            else:
+                # El cuerpo queda guardado bajo la versión actual: se genera con datos de 'default'
+                with usar_primaria():
+                    response = generar()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(clave, response.data, TIEMPO_RESPUESTAS)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modificado)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).retrieve(request, *args, **kwargs))
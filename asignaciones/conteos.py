@@ -0,0 +1,88 @@
+# asignaciones/conteos.py
+"""
+Conteos baratos para listados grandes.
+
+Paginar con números exige un COUNT(*) por página, que en una tabla de millones de filas recorre
+un índice completo. Sin filtros se usa la cantidad de filas que ANALYZE dejó en sqlite_stat1
+(aproximada: se refresca con analizar(), que 'generar_datos' ejecuta al terminar). Con filtros,
+sin estadísticas o en tablas chicas se hace el COUNT exacto y se guarda en el caché 'default' por
+TIEMPO_CONTEOS_S. La clave es la firma normalizada del filtro más la versión del modelo, así que
+cualquier escritura (señales o servicios que llaman a incrementar_version) la invalida; los
+filtros sobre tablas relacionadas sólo dependen del TTL.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from .cache import version_modelo
+
+TIEMPO_CONTEOS_S = getattr(settings, 'ASIGNACIONES_CONTEOS_TTL_S', 60)
+MINIMO_ESTIMADO = getattr(settings, 'ASIGNACIONES_CONTEOS_MINIMO_ESTIMADO', 10000)   # Bajo esto se cuenta exacto
+
+
+def analizar(using='default'):
+    """Ejecuta ANALYZE para refrescar sqlite_stat1 (en otros motores no hace nada)."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def filas_estimadas(modelo, using='default'):
+    """Filas de la tabla según sqlite_stat1, o None si no hay estadísticas."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        # Sin ANALYZE la tabla sqlite_stat1 no existe; consultarla fallaría y abortaría la transacción
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [modelo._meta.db_table])
+        # El primer número de 'stat' es la cantidad de filas de la tabla (o del índice)
+        filas = [int(stat.split()[0]) for (stat,) in cursor.fetchall() if stat]
+    return max(filas) if filas else None
+
+
+def _clave(queryset):
+    """Firma del filtro: el SQL sin orden ni columnas (el listado puede leer con .values() o con el serializer)."""
+    sql, params = queryset.order_by().values_list('pk').query.sql_with_params()
+    huella = hashlib.sha1(f'{sql}|{params!r}'.encode()).hexdigest()
+    version = version_modelo(queryset.model)[0]
+    return f'conteo:{queryset.model._meta.label_lower}:{version}:{huella}'
+
+
+def conteo_cacheado(queryset):
+    """Total ya conocido para este filtro y esta versión del modelo, o None."""
+    try:
+        return caches['default'].get(_clave(queryset))
+    except EmptyResultSet:
+        return 0  # p.ej. pk__in=[]
+
+
+def recordar_conteo(queryset, total):
+    try:
+        caches['default'].set(_clave(queryset), total, TIEMPO_CONTEOS_S)
+    except EmptyResultSet:
+        pass
+
+
+def contar(queryset, estimar=True):
+    """
+    Cantidad de filas del queryset, exacta y cacheada. Con estimar=True un queryset sin filtros
+    sobre una tabla grande usa las estadísticas de ANALYZE.
+    """
+    query = queryset.query
+    if estimar and not query.where and not query.distinct and not query.is_sliced:
+        estimadas = filas_estimadas(queryset.model, queryset.db)
+        if estimadas is not None and estimadas >= MINIMO_ESTIMADO:
+            return estimadas
+    total = conteo_cacheado(queryset)
+    if total is None:
+        total = queryset.count()
+        recordar_conteo(queryset, total)
+    return total
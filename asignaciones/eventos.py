@@ -0,0 +1,97 @@
+# asignaciones/eventos.py
+"""
+Pub/sub en memoria para el stream de eventos en vivo (/api/eventos/, Server-Sent Events).
+
+Cada suscriptor es una cola asyncio en el event loop del servidor ASGI. publicar() se puede
+llamar desde cualquier hilo (las vistas síncronas y las señales corren en hilos aparte): el
+evento se serializa una sola vez y se entrega a cada cola con call_soon_threadsafe. Si un
+suscriptor no alcanza a leer, se descartan sus eventos más antiguos en lugar de acumularlos.
+
+Es por proceso: un suscriptor sólo ve los cambios hechos por el proceso que lo atiende.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+TIPOS = ('asignacion', 'vehiculo', 'conductor')
+TAMANO_COLA = 256
+
+_lock = threading.Lock()
+_suscriptores = set()
+_secuencia = itertools.count(1)
+
+
+class Suscripcion:
+    def __init__(self, tipos):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(TAMANO_COLA)
+        self.tipos = frozenset(tipos)
+
+    def _entregar(self, evento):
+        # Corre en el loop del suscriptor
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+
+def suscribir(tipos=TIPOS):
+    suscripcion = Suscripcion(tipos)
+    with _lock:
+        _suscriptores.add(suscripcion)
+    return suscripcion
+
+
+def desuscribir(suscripcion):
+    with _lock:
+        _suscriptores.discard(suscripcion)
+
+
+def hay_suscriptores():
+    return bool(_suscriptores)
+
+
+def publicar(tipo, datos):
+    """Envía {'id', ...campos} a los suscriptores de 'tipo'. Sin suscriptores no hace nada."""
+    if not _suscriptores:
+        return
+    with _lock:
+        destinos = [s for s in _suscriptores if tipo in s.tipos]
+    if not destinos:
+        return
+    evento = (next(_secuencia), tipo, json.dumps(datos, cls=DjangoJSONEncoder))
+    for suscripcion in destinos:
+        try:
+            suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+        except RuntimeError:
+            desuscribir(suscripcion)  # Su loop ya se cerró
+
+
+def publicar_al_confirmar(tipo, filas):
+    """Publica un evento por fila cuando la transacción actual se confirme."""
+    if _suscriptores and filas:
+        filas = list(filas)
+        transaction.on_commit(lambda: [publicar(tipo, fila) for fila in filas])
+
+
+def datos_asignacion(asignacion):
+    return {'id': asignacion.pk, 'estado': asignacion.estado,
+            'vehiculo_id': asignacion.vehiculo_id, 'conductor_id': asignacion.conductor_id}
+
+
+def datos_vehiculo(vehiculo):
+    return {'id': vehiculo.pk, 'estado': vehiculo.estado,
+            'lat': vehiculo.ubicacion_actual_lat, 'lon': vehiculo.ubicacion_actual_lon}
+
+
+def datos_conductor(conductor):
+    return {'id': conductor.pk, 'estado_disponibilidad': conductor.estado_disponibilidad, 'activo': conductor.activo,
+            'lat': conductor.ubicacion_actual_lat, 'lon': conductor.ubicacion_actual_lon}
+
+
+def formato_sse(evento):
+    numero, tipo, datos = evento
+    return f'id: {numero}\nevent: {tipo}\ndata: {datos}\n\n'
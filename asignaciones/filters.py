@@ -0,0 +1,101 @@
+# asignaciones/filters.py
+from django.db import connections, router
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
+
+from .busqueda import consulta_match, indice_disponible
+from .models import Vehiculo, Conductor
+from .services import caracteristicas
+
+
+class BusquedaTextoFilter(SearchFilter):
+    """
+    SearchFilter que usa índices FTS5 cuando la vista define 'busqueda_fts'.
+
+    'busqueda_fts' es un dict {campo: tabla_fts}: una fila coincide con un término si el rowid
+    de la tabla FTS es igual al valor de ese campo (p.ej. {'pk': ..., 'vehiculo': ...} busca en la
+    asignación y en su vehículo). Cada término se trata como prefijo ("amb" encuentra "ambulancia")
+    y todos deben aparecer. Si no se pide otro ?ordering=, se ordena por relevancia (bm25) de la
+    tabla de 'pk'. Si el motor no es SQLite o falta alguna tabla FTS, se comporta igual que SearchFilter.
+    """
+    def filter_queryset(self, request, queryset, view):
+        indices = getattr(view, 'busqueda_fts', None)
+        terminos = self.get_search_terms(request)
+        if not indices or not terminos:
+            return super().filter_queryset(request, queryset, view)
+        connection = connections[router.db_for_read(queryset.model)]
+        if not all(indice_disponible(connection, tabla) for tabla in indices.values()):
+            return super().filter_queryset(request, queryset, view)
+
+        for termino in terminos:
+            match = consulta_match([termino])
+            coincide = Q()
+            for campo, tabla in indices.items():
+                coincide |= Q(**{f'{campo}__in': RawSQL(f"SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s", [match])})
+            queryset = queryset.filter(coincide)
+
+        tabla = indices.get('pk')
+        if tabla and 'ordering' not in request.query_params:
+            relevancia = RawSQL(
+                f'SELECT bm25({tabla}) FROM {tabla} WHERE {tabla} MATCH %s '
+                f'AND {tabla}.rowid = "{queryset.model._meta.db_table}"."id"',
+                [consulta_match(terminos, operador=' OR ')],
+            )
+            queryset = queryset.annotate(relevancia_busqueda=relevancia).order_by(
+                F('relevancia_busqueda').asc(nulls_last=True), '-pk'
+            )
+        return queryset
+
+
+def filtrar_habilitados(queryset, tipo):
+    """Conductores habilitados para 'tipo' (usa el índice único (tipo_vehiculo, conductor_id))."""
+    return queryset.filter(habilitaciones__tipo_vehiculo=tipo)
+
+
+class ConductorFilter(filters.FilterSet):
+    habilitado_para = filters.ChoiceFilter(
+        choices=Vehiculo.TIPO_VEHICULO_CHOICES, method='filtrar_habilitado_para',
+        label="Tipo de vehículo para el que el conductor está habilitado",
+    )
+
+    class Meta:
+        model = Conductor
+        fields = ['activo', 'estado_disponibilidad', 'habilitado_para']
+
+    def filtrar_habilitado_para(self, queryset, name, value):
+        return filtrar_habilitados(queryset, value)
+
+
+def filtrar_con_caracteristicas(queryset, requeridas, campo='caracteristicas'):
+    """Filas cuya máscara incluye todas las 'requeridas' (IN sobre el índice de la máscara)."""
+    if not requeridas:
+        return queryset
+    return queryset.filter(**{f'{campo}__in': caracteristicas.superconjuntos(requeridas)})
+
+
+class VehiculoFilter(filters.FilterSet):
+    caracteristicas = filters.CharFilter(
+        method='filtrar_caracteristicas',
+        label="Características requeridas, separadas por coma (el vehículo debe tenerlas todas)",
+    )
+
+    class Meta:
+        model = Vehiculo
+        fields = {
+            'estado': ['exact'],
+            'marca': ['exact'],
+            'tipo_vehiculo': ['exact'],
+            'capacidad_pasajeros': ['exact', 'gte'],
+            'capacidad_carga_kg': ['gte'],
+        }
+
+    def filtrar_caracteristicas(self, queryset, name, value):
+        try:
+            requeridas = caracteristicas.mascara_de_claves(t.strip() for t in value.split(',') if t.strip())
+        except ValueError as error:
+            raise ValidationError({name: f"Características desconocidas: {', '.join(error.args[0])}. "
+                                         f"Opciones: {', '.join(caracteristicas.BITS)}."})
+        return filtrar_con_caracteristicas(queryset, requeridas)
@@ -0,0 +1,15 @@
+# asignaciones/management/commands/asignar_pendientes.py
+from django.core.management.base import BaseCommand
+
+from asignaciones.services.asignacion_automatica import asignar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Ejecuta el motor de asignación automática sobre todas las solicitudes 'pendiente_auto'."
+
+    def handle(self, *args, **options):
+        resultado = asignar_pendientes()
+        self.stdout.write(self.style.SUCCESS(
+            f"Asignadas: {resultado['asignadas']} | Fallidas: {resultado['fallidas']} | "
+            f"Pendientes: {resultado['pendientes']}"
+        ))
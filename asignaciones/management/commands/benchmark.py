@@ -0,0 +1,211 @@
+# asignaciones/management/commands/benchmark.py
+"""
+Mide los caminos críticos de la API sobre la base de datos actual (ver 'generar_datos').
+
+Cada caso se ejecuta --repeticiones veces (después de una pasada de calentamiento) y se
+reporta mínimo, mediana y p95 en milisegundos junto con la cantidad de consultas SQL. El
+resultado es JSON (en stdout o en --salida) e incluye el commit, para comparar entre versiones
+con --comparar. Los casos que modifican datos corren dentro de una transacción que se revierte; su
+preparación no se incluye en el tiempo medido.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from asignaciones.models import Vehiculo, Conductor, Asignacion
+from asignaciones.serializers import AsignacionSerializer
+
+USUARIO_BENCHMARK = 'benchmark'
+
+
+class _Revertir(Exception):
+    pass
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Ejecuta el benchmark de la API y emite los resultados en JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--filtro', help="Ejecuta sólo los casos cuyo nombre contenga este texto.")
+        parser.add_argument('--salida', help="Archivo donde guardar el JSON (por defecto, stdout).")
+        parser.add_argument('--comparar', help="JSON de una ejecución anterior: agrega la razón contra su mediana.")
+
+    def handle(self, *args, **options):
+        if not Asignacion.objects.exists():
+            raise CommandError("No hay datos: ejecute primero 'manage.py generar_datos'.")
+        setup_test_environment()  # Permite usar el cliente de pruebas (ALLOWED_HOSTS, etc.)
+        self.cliente = self._cliente()
+        self.repeticiones = options['repeticiones']
+
+        resultados = []
+        for nombre, caso, preparar in self._casos():
+            if options['filtro'] and options['filtro'] not in nombre:
+                continue
+            resultado = self._medir(caso, preparar)
+            resultado['nombre'] = nombre
+            resultados.append(resultado)
+            self.stderr.write(f"{nombre:45s} mediana {resultado['mediana_ms']:9.2f} ms  consultas {resultado['consultas']}")
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                anteriores = {r['nombre']: r for r in json.load(archivo)['resultados']}
+            for resultado in resultados:
+                anterior = anteriores.get(resultado['nombre'])
+                if anterior and anterior['mediana_ms']:
+                    resultado['razon_vs_anterior'] = round(resultado['mediana_ms'] / anterior['mediana_ms'], 3)
+
+        informe = {
+            'commit': _commit_actual(),
+            'fecha': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'motor_bd': connection.vendor,
+            'filas': {
+                'vehiculos': Vehiculo.objects.count(),
+                'conductores': Conductor.objects.count(),
+                'asignaciones': Asignacion.objects.count(),
+            },
+            'repeticiones': self.repeticiones,
+            'resultados': resultados,
+        }
+        texto = json.dumps(informe, ensure_ascii=False, indent=2)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+        else:
+            self.stdout.write(texto)
+
+    def _cliente(self):
+        usuario, _ = User.objects.get_or_create(username=USUARIO_BENCHMARK)
+        token, _ = Token.objects.get_or_create(user=usuario)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return cliente
+
+    def _medir(self, caso, preparar=None):
+        """Sin 'preparar' el caso es de sólo lectura; si no, ambos corren en una transacción revertida."""
+        tiempos = []
+        consultas = 0
+        for i in range(self.repeticiones + 1):
+            try:
+                with transaction.atomic():
+                    argumento = preparar() if preparar else None
+                    with CaptureQueriesContext(connection) as capturadas:
+                        inicio = time.perf_counter()
+                        caso(argumento)
+                        duracion = time.perf_counter() - inicio
+                    if preparar:
+                        raise _Revertir
+            except _Revertir:
+                pass
+            if i == 0:
+                continue  # Calentamiento
+            tiempos.append(duracion * 1000)
+            consultas = len(capturadas.captured_queries)
+        tiempos.sort()
+        return {
+            'min_ms': round(tiempos[0], 3),
+            'mediana_ms': round(statistics.median(tiempos), 3),
+            'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+            'consultas': consultas,
+        }
+
+    def _get(self, url, cache=False):
+        def caso(_):
+            if not cache:
+                caches['respuestas'].clear()
+            respuesta = self.cliente.get(url)
+            if respuesta.status_code != 200:
+                raise CommandError(f"{url} respondió {respuesta.status_code}")
+        return caso
+
+    def _post(self):
+        def caso(url):
+            if url is None:
+                return
+            respuesta = self.cliente.post(url)
+            if respuesta.status_code != 200:
+                raise CommandError(f"{url} respondió {respuesta.status_code}: {respuesta.content[:200]}")
+        return caso
+
+    def _url_transicion(self, estado, accion):
+        """Elige una asignación en 'estado' y deja su vehículo y conductor listos para 'accion'."""
+        pk = Asignacion.objects.filter(estado=estado).exclude(vehiculo=None).exclude(conductor=None).values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        asignacion = Asignacion.objects.get(pk=pk)
+        Vehiculo.objects.filter(pk=asignacion.vehiculo_id).update(estado='reservado' if accion == 'iniciar' else 'en_uso')
+        Conductor.objects.filter(pk=asignacion.conductor_id).update(activo=True, estado_disponibilidad='disponible')
+        return f'/api/asignaciones/{pk}/{accion}/'
+
+    def _validar_serializer(self):
+        vehiculo = Vehiculo.objects.values_list('pk', flat=True).first()
+        conductor = Conductor.objects.values_list('pk', flat=True).first()
+        inicio = timezone.now() + timedelta(days=400)
+        datos = {
+            'destino_descripcion': 'Benchmark', 'tipo_servicio': 'otro', 'estado': 'programada',
+            'vehiculo_id': vehiculo, 'conductor_id': conductor,
+            'fecha_hora_requerida_inicio': inicio.isoformat(),
+            'fecha_hora_fin_prevista': (inicio + timedelta(hours=1)).isoformat(),
+        }
+
+        def caso(_):
+            serializer = AsignacionSerializer(data=datos)
+            if not serializer.is_valid():
+                raise CommandError(f"Validación inesperadamente inválida: {serializer.errors}")
+        return caso
+
+    def _casos(self):
+        hoy = timezone.localdate()
+        desde = (hoy - timedelta(days=30)).isoformat()
+        return [
+            ('vehiculos_lista', self._get('/api/vehiculos/'), None),
+            ('vehiculos_lista_cacheada', self._get('/api/vehiculos/', cache=True), None),
+            ('vehiculos_filtro_estado', self._get('/api/vehiculos/?estado=disponible&tipo_vehiculo=ambulancia'), None),
+            ('vehiculos_caracteristicas', self._get('/api/vehiculos/?caracteristicas=silla_ruedas,oxigeno'), None),
+            ('vehiculos_busqueda', self._get('/api/vehiculos/?search=toyota'), None),
+            ('vehiculos_orden', self._get('/api/vehiculos/?ordering=-capacidad_pasajeros'), None),
+            ('vehiculos_cercanos', self._get('/api/vehiculos/cercanos/?lat=-33.45&lon=-70.65&k=20'), None),
+            ('conductores_lista', self._get('/api/conductores/'), None),
+            ('conductores_filtro', self._get('/api/conductores/?activo=true&estado_disponibilidad=disponible'), None),
+            ('conductores_habilitado_para', self._get('/api/conductores/?habilitado_para=ambulancia&activo=true'), None),
+            ('conductores_busqueda', self._get('/api/conductores/?search=gonzalez'), None),
+            ('conductores_orden', self._get('/api/conductores/?ordering=apellido'), None),
+            ('asignaciones_lista', self._get('/api/asignaciones/'), None),
+            ('asignaciones_lista_pagina_100', self._get('/api/asignaciones/?page=100'), None),
+            ('asignaciones_lista_conteo_exacto', self._get('/api/asignaciones/?conteo=exacto'), None),
+            ('asignaciones_lista_cursor', self._get('/api/asignaciones/?paginacion=cursor'), None),
+            ('asignaciones_filtro', self._get(f'/api/asignaciones/?estado=completada&fecha_hora_requerida_inicio__gte={desde}'), None),
+            ('asignaciones_busqueda', self._get('/api/asignaciones/?search=hospital'), None),
+            ('asignaciones_orden', self._get('/api/asignaciones/?ordering=-fecha_hora_fin_prevista'), None),
+            ('asignaciones_expand', self._get('/api/asignaciones/?expand=vehiculo,conductor'), None),
+            ('asignaciones_conflictos', self._get('/api/asignaciones/conflictos/'), None),
+            ('estadisticas_30_dias', self._get('/api/estadisticas/'), None),
+            ('asignacion_iniciar', self._post(), lambda: self._url_transicion('programada', 'iniciar')),
+            ('asignacion_completar', self._post(), lambda: self._url_transicion('activa', 'completar')),
+            ('serializer_validacion', self._validar_serializer(), None),
+        ]
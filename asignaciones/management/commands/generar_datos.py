@@ -0,0 +1,179 @@
+# asignaciones/management/commands/generar_datos.py
+"""
+Genera una flota sintética (vehículos, conductores y asignaciones) para medir rendimiento.
+
+Los datos son reproducibles (--semilla) y se insertan con bulk_create por lotes, así que
+también se pueden generar millones de asignaciones. Como bulk_create no pasa por save() ni por
+las señales, celda_geo y las máscaras de características se calculan aquí y al final se
+reconstruyen los rollups de estadísticas. Termina con ANALYZE, que alimenta los conteos estimados
+de los listados (conteos.py).
+"""
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from asignaciones.cache import incrementar_version
+from asignaciones.conteos import analizar
+from asignaciones.models import (
+    Vehiculo, Conductor, HabilitacionConductor, Asignacion, EstadisticaDiaria, PosicionHistorica, Tarea,
+)
+from asignaciones.services.caracteristicas import mascara_de
+from asignaciones.services.estadisticas import reconstruir
+from asignaciones.services.geo import celda_para
+
+CENTRO = (-33.45, -70.65)   # Santiago
+DISPERSION_GRADOS = 0.25
+MARCAS = {
+    'Toyota': ['Hilux', 'Corolla', 'Hiace'], 'Hyundai': ['H-1', 'Accent', 'Porter'],
+    'Peugeot': ['Partner', 'Boxer', '308'], 'Mercedes-Benz': ['Sprinter', 'Vito'],
+    'Chevrolet': ['Sail', 'N300', 'D-Max'], 'Nissan': ['NP300', 'Urvan', 'Versa'],
+}
+CAPACIDADES = {
+    'auto_funcionario': (4, 300), 'furgon_insumos': (2, 1200), 'ambulancia': (3, 400),
+    'camioneta_grande': (12, 800), 'camion_carga': (2, 3500), 'otro': (4, 500),
+}
+EXTRAS_POR_TIPO = {
+    'auto_funcionario': ['GPS', 'Aire acondicionado'], 'furgon_insumos': ['GPS', 'Refrigeración'],
+    'ambulancia': ['Silla de ruedas', 'Camilla', 'Oxígeno', 'GPS'], 'camioneta_grande': ['GPS', 'Aire acondicionado', 'Silla de ruedas'],
+    'camion_carga': ['GPS', 'Refrigerado', '4x4'], 'otro': ['GPS', '4x4'],
+}
+REQUERIMIENTOS_POR_SERVICIO = {
+    'funcionarios': [''], 'insumos': ['', '', 'refrigerado'], 'pacientes': ['', 'silla de ruedas', 'camilla, oxígeno'], 'otro': [''],
+}
+NOMBRES = ['Ana', 'Pedro', 'María', 'José', 'Camila', 'Luis', 'Javiera', 'Diego', 'Francisca', 'Matías', 'Sofía', 'Andrés']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda', 'Morales', 'Núñez']
+LUGARES = ['Hospital del Salvador', 'CESFAM Ñuñoa', 'Bodega Central', 'Hospital Sótero del Río', 'Consultorio Maipú',
+           'Posta Central', 'Laboratorio Regional', 'SAR La Florida', 'Hospital San Juan de Dios', 'Farmacia Comunal']
+SERVICIOS_POR_TIPO = {
+    'funcionarios': 'auto_funcionario', 'insumos': 'furgon_insumos', 'pacientes': 'ambulancia', 'otro': None,
+}
+
+
+class Command(BaseCommand):
+    help = "Genera datos sintéticos reproducibles de flota y asignaciones (para benchmarks)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehiculos', type=int, default=500)
+        parser.add_argument('--conductores', type=int, default=1000)
+        parser.add_argument('--asignaciones', type=int, default=20000)
+        parser.add_argument('--dias', type=int, default=365, help="Días de historia hacia atrás.")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help="Filas por bulk_create.")
+        parser.add_argument('--limpiar', action='store_true', help="Borra antes todas las asignaciones, conductores y vehículos.")
+
+    def handle(self, *args, **options):
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        if options['limpiar']:
+            with transaction.atomic():
+                # Borrado directo en SQL, sin señales ni cascadas: el orden respeta las claves foráneas
+                for modelo in (Tarea, PosicionHistorica, EstadisticaDiaria, Asignacion, Vehiculo, HabilitacionConductor, Conductor):
+                    modelo.objects.all()._raw_delete(modelo.objects.db)
+            self.stdout.write("Datos anteriores eliminados.")
+
+        conductores = self._conductores(options['conductores'])
+        vehiculos = self._vehiculos(options['vehiculos'], conductores)
+        total = self._asignaciones(options['asignaciones'], options['dias'], vehiculos, conductores)
+        filas = reconstruir()
+        analizar()
+        incrementar_version(Vehiculo, Conductor, Asignacion)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generados: {len(vehiculos)} vehículos, {len(conductores)} conductores, {total} asignaciones "
+            f"({filas} filas de estadísticas)."
+        ))
+
+    def _posicion(self):
+        lat = round(CENTRO[0] + self.azar.uniform(-DISPERSION_GRADOS, DISPERSION_GRADOS), 6)
+        lon = round(CENTRO[1] + self.azar.uniform(-DISPERSION_GRADOS, DISPERSION_GRADOS), 6)
+        return lat, lon
+
+    def _insertar(self, modelo, objetos):
+        creados = []
+        for i in range(0, len(objetos), self.lote):
+            with transaction.atomic():
+                creados += modelo.objects.bulk_create(objetos[i:i + self.lote])
+        return creados
+
+    def _conductores(self, cantidad):
+        inicio = Conductor.objects.count()
+        tipos = list(CAPACIDADES)
+        objetos = []
+        for i in range(inicio, inicio + cantidad):
+            lat, lon = self._posicion()
+            objetos.append(Conductor(
+                nombre=self.azar.choice(NOMBRES), apellido=self.azar.choice(APELLIDOS),
+                numero_licencia=f'SIM-{i:07d}',
+                fecha_vencimiento_licencia=date.today() + timedelta(days=self.azar.randint(-30, 1500)),
+                activo=self.azar.random() > 0.05,
+                estado_disponibilidad=self.azar.choices(['disponible', 'en_ruta', 'no_disponible'], [0.7, 0.2, 0.1])[0],
+                ubicacion_actual_lat=lat, ubicacion_actual_lon=lon, celda_geo=celda_para(lat, lon),
+            ))
+        ids = [c.pk for c in self._insertar(Conductor, objetos)]
+        self._insertar(HabilitacionConductor, [
+            HabilitacionConductor(conductor_id=pk, tipo_vehiculo=tipo)
+            for pk in ids for tipo in self.azar.sample(tipos, self.azar.randint(1, 3))
+        ])
+        return ids
+
+    def _vehiculos(self, cantidad, conductores):
+        inicio = Vehiculo.objects.count()
+        objetos = []
+        for i in range(inicio, inicio + cantidad):
+            marca = self.azar.choice(list(MARCAS))
+            tipo = self.azar.choice(list(CAPACIDADES))
+            pasajeros, carga = CAPACIDADES[tipo]
+            extras = ', '.join(self.azar.sample(EXTRAS_POR_TIPO[tipo], self.azar.randint(0, len(EXTRAS_POR_TIPO[tipo]))))
+            lat, lon = self._posicion()
+            objetos.append(Vehiculo(
+                marca=marca, modelo=self.azar.choice(MARCAS[marca]), patente=f'SIM{i:06d}',
+                estado=self.azar.choices(['disponible', 'en_uso', 'mantenimiento', 'reservado'], [0.7, 0.15, 0.05, 0.1])[0],
+                tipo_vehiculo=tipo, capacidad_pasajeros=pasajeros, capacidad_carga_kg=carga,
+                caracteristicas_adicionales=extras, caracteristicas=mascara_de(extras),
+                ubicacion_actual_lat=lat, ubicacion_actual_lon=lon, celda_geo=celda_para(lat, lon),
+                conductor_preferente_id=self.azar.choice(conductores) if conductores and self.azar.random() < 0.3 else None,
+            ))
+        return [v.pk for v in self._insertar(Vehiculo, objetos)]
+
+    def _asignacion(self, ahora, dias, vehiculos, conductores):
+        inicio = ahora + timedelta(minutes=self.azar.randint(-dias * 24 * 60, 14 * 24 * 60))
+        inicio = inicio.replace(second=0, microsecond=0)
+        fin_prevista = inicio + timedelta(minutes=self.azar.choice([30, 45, 60, 90, 120, 180]))
+        tipo_servicio = self.azar.choice(list(SERVICIOS_POR_TIPO))
+        if inicio < ahora - timedelta(hours=4):
+            estado = self.azar.choices(['completada', 'cancelada', 'fallo_auto'], [0.88, 0.1, 0.02])[0]
+        elif inicio < ahora:
+            estado = self.azar.choice(['activa', 'completada'])
+        else:
+            estado = self.azar.choices(['programada', 'pendiente_auto'], [0.8, 0.2])[0]
+        con_recursos = estado not in ('pendiente_auto', 'fallo_auto')
+        origen, destino = self._posicion(), self._posicion()
+        requerimientos = self.azar.choice(REQUERIMIENTOS_POR_SERVICIO[tipo_servicio])
+        return Asignacion(
+            vehiculo_id=self.azar.choice(vehiculos) if con_recursos and vehiculos else None,
+            conductor_id=self.azar.choice(conductores) if con_recursos and conductores else None,
+            tipo_servicio=tipo_servicio,
+            origen_descripcion=self.azar.choice(LUGARES), destino_descripcion=self.azar.choice(LUGARES),
+            fecha_hora_requerida_inicio=inicio, fecha_hora_fin_prevista=fin_prevista,
+            fecha_hora_fin_real=fin_prevista + timedelta(minutes=self.azar.randint(-15, 40)) if estado == 'completada' else None,
+            req_pasajeros=self.azar.randint(1, 4), req_carga_kg=self.azar.choice([None, 50, 200, 800]),
+            req_tipo_vehiculo_preferente=SERVICIOS_POR_TIPO[tipo_servicio] if self.azar.random() < 0.5 else None,
+            req_caracteristicas_especiales=requerimientos, req_caracteristicas=mascara_de(requerimientos),
+            origen_lat=origen[0], origen_lon=origen[1], destino_lat=destino[0], destino_lon=destino[1],
+            estado=estado,
+            observaciones=self.azar.choice([None, '', 'Urgente', 'Llamar al llegar', 'Paciente con movilidad reducida']),
+        )
+
+    def _asignaciones(self, cantidad, dias, vehiculos, conductores):
+        ahora = timezone.now()
+        creadas = 0
+        while creadas < cantidad:
+            n = min(self.lote, cantidad - creadas)
+            with transaction.atomic():
+                Asignacion.objects.bulk_create([self._asignacion(ahora, dias, vehiculos, conductores) for _ in range(n)])
+            creadas += n
+            self.stdout.write(f"  asignaciones: {creadas}/{cantidad}", ending='\r')
+        self.stdout.write('')
+        return creadas
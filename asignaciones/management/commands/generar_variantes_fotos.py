@@ -0,0 +1,21 @@
+# asignaciones/management/commands/generar_variantes_fotos.py
+from django.core.management.base import BaseCommand
+
+from asignaciones.models import Vehiculo
+from asignaciones.services import tareas
+
+
+class Command(BaseCommand):
+    help = "Encola la generación de miniaturas para los vehículos con foto que aún no las tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help="Regenera también las que ya existen.")
+
+    def handle(self, *args, **options):
+        vehiculos = Vehiculo.objects.exclude(foto='').exclude(foto__isnull=True)
+        if not options['todas']:
+            vehiculos = vehiculos.filter(foto_variantes_generadas=False)
+        ids = list(vehiculos.values_list('id', flat=True))
+        for pk in ids:
+            tareas.encolar('variantes_foto', pk)
+        self.stdout.write(self.style.SUCCESS(f"Tareas encoladas: {len(ids)}"))
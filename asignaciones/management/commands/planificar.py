@@ -0,0 +1,41 @@
+# asignaciones/management/commands/planificar.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from asignaciones.services import planificacion
+
+
+class Command(BaseCommand):
+    help = "Planifica las solicitudes 'pendiente_auto' y 'programada' de un horizonte encadenando servicios por vehículo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Inicio del horizonte en ISO (por defecto, ahora).")
+        parser.add_argument('--horas', type=float, help="Largo del horizonte en horas.")
+        parser.add_argument('--tiempo', type=float, help="Presupuesto de la búsqueda local en segundos.")
+        parser.add_argument('--procesos', type=int, help="Procesos para resolver las zonas en paralelo.")
+        parser.add_argument('--solo-pendientes', action='store_true', help="No replanifica las 'programada'.")
+        parser.add_argument('--simular', action='store_true', help="Muestra el plan sin guardarlo.")
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            desde = parse_datetime(options['desde'])
+            if desde is None:
+                raise CommandError("--desde debe ser una fecha y hora ISO.")
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+        hasta = (desde or timezone.now()) + timedelta(hours=options['horas']) if options['horas'] else None
+        resultado = planificacion.planificar(
+            desde, hasta, tiempo_limite=options['tiempo'], procesos=options['procesos'],
+            aplicar=not options['simular'], incluir_programadas=not options['solo_pendientes'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Simulación' if options['simular'] else 'Plan guardado'} | Solicitudes: {resultado['solicitudes']} | "
+            f"Programadas: {resultado['programadas']} | Sin asignar: {resultado['sin_asignar']} | "
+            f"Vehículos: {resultado['vehiculos']} (antes {resultado['vehiculos_antes']}) | "
+            f"Km en vacío: {resultado['km_vacios']} | Zonas: {resultado['zonas']} | "
+            f"Costo: {resultado['costo_inicial']} -> {resultado['costo_final']}"
+        ))
@@ -0,0 +1,35 @@
+# asignaciones/management/commands/procesar_tareas.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from asignaciones.services import tareas
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de tareas en segundo plano (asignación automática, etc.)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Procesa las tareas disponibles y termina.")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--lote', type=int, default=10, help="Tareas que se toman por vuelta.")
+
+    def handle(self, *args, **options):
+        recuperadas = tareas.recuperar_abandonadas()
+        if recuperadas:
+            self.stdout.write(f"Tareas abandonadas devueltas a la cola: {recuperadas}")
+        try:
+            while True:
+                close_old_connections()
+                ejecutadas, fallidas = tareas.procesar_disponibles(options['lote'])
+                if ejecutadas or fallidas:
+                    self.stdout.write(f"Ejecutadas: {ejecutadas} | Con error: {fallidas}")
+                elif options['una_vez']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+                    tareas.recuperar_abandonadas()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Worker detenido."))
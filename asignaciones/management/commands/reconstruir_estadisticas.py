@@ -0,0 +1,12 @@
+# asignaciones/management/commands/reconstruir_estadisticas.py
+from django.core.management.base import BaseCommand
+
+from asignaciones.services.estadisticas import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los rollups diarios de estadísticas a partir de todas las asignaciones."
+
+    def handle(self, *args, **options):
+        filas = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Rollups reconstruidos: {filas} filas."))
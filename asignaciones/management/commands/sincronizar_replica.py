@@ -0,0 +1,48 @@
+# asignaciones/management/commands/sincronizar_replica.py
+"""
+Copia la base 'default' a las réplicas SQLite con la API de backup de sqlite3 (esquema y datos).
+
+Sirve para probar en local el enrutamiento a réplicas con un segundo archivo. En producción la
+réplica la mantiene el propio motor (replicación de PostgreSQL/MySQL) y este comando no se usa.
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copia la base de datos principal a las réplicas SQLite (para probar réplicas en local)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, help="Repite la copia cada tantos segundos (simula el retraso de la réplica).")
+
+    def handle(self, *args, **options):
+        replicas = settings.ASIGNACIONES_REPLICAS
+        if not replicas:
+            raise CommandError("No hay réplicas configuradas (defina GESTOR_DB_REPLICA).")
+        for alias in [DEFAULT_DB_ALIAS, *replicas]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"'{alias}' no es SQLite: use la replicación del motor de base de datos.")
+        try:
+            while True:
+                for alias in replicas:
+                    self._copiar(alias)
+                if not options['intervalo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+    def _copiar(self, alias):
+        inicio = time.perf_counter()
+        origen = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        destino = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            origen.backup(destino)
+        finally:
+            destino.close()
+            origen.close()
+        self.stdout.write(f"Réplica '{alias}' sincronizada en {(time.perf_counter() - inicio) * 1000:.0f} ms.")
@@ -0,0 +1,202 @@
+# asignaciones/metricas.py
+"""
+Métricas por ruta y método: latencia (histograma), consultas SQL, tiempo SQL y bytes de respuesta.
+
+MetricasMiddleware cuenta las consultas con connection.execute_wrapper (una suma y dos
+perf_counter por consulta) y acumula todo en un dict en memoria del proceso protegido por un
+lock, así que puede quedar activo en producción. /api/metrics/ lo expone en formato de texto de
+Prometheus (cada proceso expone sus propios contadores). Sólo lo ven los usuarios staff y quien
+envíe 'Authorization: Bearer <ASIGNACIONES_METRICAS_TOKEN>'; ASIGNACIONES_METRICAS_IPS (vacío por
+defecto) abre además el acceso por REMOTE_ADDR, útil sólo si nada se interpone entre Prometheus y
+Django: detrás de un proxy todas las peticiones llegan desde su IP.
+
+Con ASIGNACIONES_METRICAS_LENTA_MS definido, las peticiones que superan ese tiempo se registran
+en el logger 'asignaciones.lentas' junto con sus consultas más lentas y las repetidas (N+1).
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger_lentas = logging.getLogger('asignaciones.lentas')
+
+LIMITE_LENTA_MS = getattr(settings, 'ASIGNACIONES_METRICAS_LENTA_MS', None)
+TOKEN = getattr(settings, 'ASIGNACIONES_METRICAS_TOKEN', None)
+IPS_PERMITIDAS = set(getattr(settings, 'ASIGNACIONES_METRICAS_IPS', ()))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_CONSULTAS_REGISTRADAS = 200
+
+_lock = threading.Lock()
+_series = {}   # (ruta, metodo) -> _Serie
+
+
+class _Serie:
+    __slots__ = ('buckets', 'cantidad', 'segundos', 'consultas', 'segundos_sql', 'bytes', 'por_estado')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.cantidad = 0
+        self.segundos = 0.0
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.bytes = 0
+        self.por_estado = Counter()
+
+
+def registrar(ruta, metodo, estado, segundos, consultas=0, segundos_sql=0.0, bytes_respuesta=0):
+    with _lock:
+        serie = _series.get((ruta, metodo))
+        if serie is None:
+            serie = _series[(ruta, metodo)] = _Serie()
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                serie.buckets[i] += 1
+                break
+        serie.cantidad += 1
+        serie.segundos += segundos
+        serie.consultas += consultas
+        serie.segundos_sql += segundos_sql
+        serie.bytes += bytes_respuesta
+        serie.por_estado[f'{estado // 100}xx'] += 1
+
+
+class _ContadorSQL:
+    """execute_wrapper que suma consultas y tiempo; si se pide, guarda también el SQL."""
+
+    def __init__(self, guardar_sql):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.sql = [] if guardar_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += duracion
+            if self.sql is not None and len(self.sql) < MAX_CONSULTAS_REGISTRADAS:
+                self.sql.append((duracion, sql))
+
+
+def _ruta(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    return coincidencia.view_name if coincidencia else 'sin_ruta'
+
+
+def _bytes(response):
+    if response.streaming:
+        return 0
+    return len(response.content)
+
+
+def _registrar_lenta(request, segundos, contador):
+    repetidas = Counter(sql for _, sql in contador.sql)
+    lentas = sorted(contador.sql, reverse=True)[:10]
+    logger_lentas.warning(
+        'Petición lenta: %s %s (%s) %.0f ms, %d consultas, %.0f ms en SQL\nConsultas más lentas:\n%s\nConsultas repetidas:\n%s',
+        request.method, request.get_full_path(), _ruta(request), segundos * 1000, contador.consultas, contador.segundos * 1000,
+        '\n'.join(f'  {duracion * 1000:.1f} ms  {sql}' for duracion, sql in lentas),
+        '\n'.join(f'  x{veces}  {sql}' for sql, veces in repetidas.most_common(5) if veces > 1) or '  (ninguna)',
+    )
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self._call_async(request)
+        contador = _ContadorSQL(guardar_sql=LIMITE_LENTA_MS is not None)
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(contador))
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+        registrar(_ruta(request), request.method, response.status_code, segundos,
+                  contador.consultas, contador.segundos, _bytes(response))
+        if LIMITE_LENTA_MS is not None and segundos * 1000 >= LIMITE_LENTA_MS:
+            _registrar_lenta(request, segundos, contador)
+        return response
+
+    async def _call_async(self, request):
+        # Las consultas de las vistas async corren en otros hilos (sync_to_async): sólo se mide latencia
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        registrar(_ruta(request), request.method, response.status_code, time.perf_counter() - inicio,
+                  bytes_respuesta=_bytes(response))
+        return response
+
+
+def _etiquetas(ruta, metodo, **extra):
+    pares = {'ruta': ruta, 'metodo': metodo, **extra}
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pares.items())
+
+
+def texto_prometheus():
+    with _lock:
+        series = {clave: (list(s.buckets), s.cantidad, s.segundos, s.consultas, s.segundos_sql, s.bytes, dict(s.por_estado))
+                  for clave, s in _series.items()}
+    lineas = [
+        '# HELP gestor_http_request_duration_seconds Latencia de las peticiones por ruta y método.',
+        '# TYPE gestor_http_request_duration_seconds histogram',
+    ]
+    for (ruta, metodo), (buckets, cantidad, segundos, *_) in sorted(series.items()):
+        acumulado = 0
+        for limite, n in zip(BUCKETS, buckets):
+            acumulado += n
+            lineas.append(f'gestor_http_request_duration_seconds_bucket{{{_etiquetas(ruta, metodo, le=limite)}}} {acumulado}')
+        lineas.append(f'gestor_http_request_duration_seconds_bucket{{{_etiquetas(ruta, metodo, le="+Inf")}}} {cantidad}')
+        lineas.append(f'gestor_http_request_duration_seconds_sum{{{_etiquetas(ruta, metodo)}}} {segundos:.6f}')
+        lineas.append(f'gestor_http_request_duration_seconds_count{{{_etiquetas(ruta, metodo)}}} {cantidad}')
+
+    contadores = [
+        ('gestor_http_requests_total', 'Peticiones por ruta, método y clase de estado HTTP.', None),
+        ('gestor_db_queries_total', 'Consultas SQL ejecutadas por las peticiones.', 3),
+        ('gestor_db_query_seconds_total', 'Tiempo total en SQL de las peticiones.', 4),
+        ('gestor_http_response_bytes_total', 'Bytes de respuesta (sin contar las respuestas streaming).', 5),
+    ]
+    for nombre, ayuda, indice in contadores:
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        for (ruta, metodo), valores in sorted(series.items()):
+            if indice is None:
+                for estado, n in sorted(valores[6].items()):
+                    lineas.append(f'{nombre}{{{_etiquetas(ruta, metodo, estado=estado)}}} {n}')
+            else:
+                valor = valores[indice]
+                lineas.append(f'{nombre}{{{_etiquetas(ruta, metodo)}}} {valor:.6f}' if isinstance(valor, float)
+                              else f'{nombre}{{{_etiquetas(ruta, metodo)}}} {valor}')
+    return '\n'.join(lineas) + '\n'
+
+
+def _autorizado(request):
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_staff:
+        return True
+    tipo, _, token = request.headers.get('Authorization', '').partition(' ')
+    if TOKEN and tipo.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), TOKEN.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in IPS_PERMITIDAS
+
+
+def vista_metricas(request):
+    """Endpoint de Prometheus: para usuarios staff, el token configurado o ASIGNACIONES_METRICAS_IPS."""
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:57
+
+import math
+
+from django.db import migrations, models
+
+# Copia congelada de services/geo.celda_para(): la migración no debe cambiar si cambia el código de la app
+CELDA_GRADOS = 0.05
+FACTOR_FILA = 10000
+COLUMNAS = 7200
+
+
+def celda_para(lat, lon):
+    fila = int(math.floor((lat + 90.0) / CELDA_GRADOS))
+    columna = int(math.floor((lon + 180.0) / CELDA_GRADOS)) % COLUMNAS
+    return fila * FACTOR_FILA + columna
+
+
+def calcular_celdas(apps, schema_editor):
+    for nombre in ('Vehiculo', 'Conductor'):
+        modelo = apps.get_model('asignaciones', nombre)
+        objetos = list(modelo.objects.exclude(ubicacion_actual_lat=None).exclude(ubicacion_actual_lon=None))
+        for obj in objetos:
+            obj.celda_geo = celda_para(obj.ubicacion_actual_lat, obj.ubicacion_actual_lon)
+        modelo.objects.bulk_update(objetos, ['celda_geo'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0002_remove_asignacion_destino_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conductor',
+            name='celda_geo',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, help_text='Celda de la grilla espacial (se calcula desde la ubicación)', null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiculo',
+            name='celda_geo',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, help_text='Celda de la grilla espacial (se calcula desde la ubicación)', null=True),
+        ),
+        migrations.RunPython(calcular_celdas, migrations.RunPython.noop),
+    ]
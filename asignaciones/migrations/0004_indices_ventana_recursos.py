@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0003_celda_geo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asignacion',
+            index=models.Index(fields=['vehiculo', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista'], name='asig_vehiculo_ventana_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacion',
+            index=models.Index(fields=['conductor', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista'], name='asig_conductor_ventana_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0004_indices_ventana_recursos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asignacion',
+            index=models.Index(fields=['fecha_hora_solicitud', 'id'], name='asig_solicitud_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacion',
+            index=models.Index(fields=['fecha_hora_requerida_inicio', 'id'], name='asig_inicio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacion',
+            index=models.Index(fields=['fecha_hora_fin_prevista', 'id'], name='asig_fin_prevista_id_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:20
+
+from django.db import migrations
+
+# Copia congelada de asignaciones/busqueda.py: tabla -> [(columna FTS, expresión sobre la tabla)].
+# Después de migrar, post_migrate vuelve a ejecutar busqueda.asegurar_indices_fts() con la versión actual.
+INDICES = {
+    'asignaciones_asignacion': [
+        ('destino_descripcion', 'destino_descripcion'),
+        ('origen_descripcion', 'origen_descripcion'),
+        ('observaciones', "COALESCE(observaciones, '')"),
+    ],
+    'asignaciones_vehiculo': [
+        ('patente', 'patente'), ('marca', 'marca'), ('modelo', 'modelo'),
+        ('caracteristicas_adicionales', 'caracteristicas_adicionales'),
+    ],
+    'asignaciones_conductor': [('nombre', 'nombre'), ('apellido', 'apellido'), ('numero_licencia', 'numero_licencia')],
+}
+TOKENIZADOR = "tokenize = 'unicode61 remove_diacritics 2'"
+
+
+def _sentencias(tabla, columnas):
+    fts = f'{tabla}_fts'
+    nombres = ', '.join(c for c, _ in columnas)
+    insertar = f"INSERT INTO {fts}(rowid, {nombres}) SELECT id, {', '.join(e for _, e in columnas)} FROM {tabla}"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({nombres}, {TOKENIZADOR})",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} WHERE id = new.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {nombres} ON {tabla} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; {insertar} WHERE id = new.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN DELETE FROM {fts} WHERE rowid = old.id; END",
+        f"DELETE FROM {fts}",
+        insertar,
+    ]
+
+
+def crear(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for tabla, columnas in INDICES.items():
+        for sentencia in _sentencias(tabla, columnas):
+            schema_editor.execute(sentencia)
+
+
+def eliminar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for tabla in INDICES:
+        for sufijo in ('ai', 'au', 'ad'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {tabla}_fts_{sufijo}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {tabla}_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0005_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, eliminar),
+    ]
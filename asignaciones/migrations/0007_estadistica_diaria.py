@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:11
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# Copia congelada de services/estadisticas.reconstruir() y aporte()
+CAMPOS = ('vehiculo_id', 'tipo_servicio', 'estado', 'fecha_hora_solicitud', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_real')
+METRICAS = ('total', 'completadas', 'canceladas', 'minutos_servicio', 'minutos_anticipacion')
+
+
+def _minutos(desde, hasta):
+    return max((hasta - desde).total_seconds() / 60, 0.0)
+
+
+def poblar_estadisticas(apps, schema_editor):
+    Asignacion = apps.get_model('asignaciones', 'Asignacion')
+    EstadisticaDiaria = apps.get_model('asignaciones', 'EstadisticaDiaria')
+    acumulado = defaultdict(lambda: dict.fromkeys(METRICAS, 0))
+    for fila in Asignacion.objects.values(*CAMPOS).iterator(chunk_size=2000):
+        inicio = fila['fecha_hora_requerida_inicio']
+        dia = timezone.localtime(inicio).date() if timezone.is_aware(inicio) else inicio.date()
+        metricas = acumulado[(dia, fila['vehiculo_id'], fila['tipo_servicio'])]
+        metricas['total'] += 1
+        if fila['fecha_hora_solicitud']:
+            metricas['minutos_anticipacion'] += _minutos(fila['fecha_hora_solicitud'], inicio)
+        if fila['estado'] == 'completada':
+            metricas['completadas'] += 1
+            if fila['fecha_hora_fin_real']:
+                metricas['minutos_servicio'] += _minutos(inicio, fila['fecha_hora_fin_real'])
+        elif fila['estado'] == 'cancelada':
+            metricas['canceladas'] += 1
+    EstadisticaDiaria.objects.bulk_create([
+        EstadisticaDiaria(fecha=fecha, vehiculo_id=vehiculo_id, tipo_servicio=tipo_servicio, **metricas)
+        for (fecha, vehiculo_id, tipo_servicio), metricas in acumulado.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0006_indices_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día (hora local) de fecha_hora_requerida_inicio')),
+                ('tipo_servicio', models.CharField(choices=[('funcionarios', 'Traslado de Funcionarios'), ('insumos', 'Traslado de Insumos'), ('pacientes', 'Traslado de Pacientes'), ('otro', 'Otro Servicio')], max_length=50)),
+                ('total', models.IntegerField(default=0)),
+                ('completadas', models.IntegerField(default=0)),
+                ('canceladas', models.IntegerField(default=0)),
+                ('minutos_servicio', models.FloatField(default=0, help_text='Minutos entre el inicio requerido y el fin real de las completadas')),
+                ('minutos_anticipacion', models.FloatField(default=0, help_text='Suma de minutos entre la solicitud y el inicio requerido')),
+                ('vehiculo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='estadisticas_diarias', to='asignaciones.vehiculo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'vehiculo', 'tipo_servicio'], name='estadistica_clave_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
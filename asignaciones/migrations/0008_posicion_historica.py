@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0007_estadistica_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionHistorica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat', models.FloatField()),
+                ('lon', models.FloatField()),
+                ('registrada', models.DateTimeField(help_text='Momento del ping informado por el dispositivo')),
+                ('conductor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='posiciones', to='asignaciones.conductor')),
+                ('vehiculo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='posiciones', to='asignaciones.vehiculo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vehiculo', 'registrada'], name='posicion_vehiculo_idx'), models.Index(fields=['conductor', 'registrada'], name='posicion_conductor_idx')],
+            },
+        ),
+    ]
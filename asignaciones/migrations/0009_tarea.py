@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0008_posicion_historica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('clave', models.CharField(blank=True, default='', help_text='Identifica el trabajo para deduplicarlo (p.ej. id de la asignación)', max_length=100)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=3)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='No se ejecuta antes de este momento (reintentos con espera)')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('iniciada', models.DateTimeField(blank=True, null=True)),
+                ('finalizada', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_cola_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('tipo', 'clave'), name='tarea_pendiente_unica')],
+            },
+        ),
+    ]
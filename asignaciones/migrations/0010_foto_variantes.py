@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0009_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiculo',
+            name='foto_variantes_generadas',
+            field=models.BooleanField(default=False, editable=False, help_text='Miniaturas de la foto ya generadas (ver services/fotos.py)'),
+        ),
+    ]
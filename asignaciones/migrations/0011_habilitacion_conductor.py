@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_habilitaciones(apps, schema_editor):
+    # "auto_funcionario, furgon_insumos" -> una fila por tipo; se descartan los tipos desconocidos
+    Conductor = apps.get_model('asignaciones', 'Conductor')
+    HabilitacionConductor = apps.get_model('asignaciones', 'HabilitacionConductor')
+    validos = {valor for valor, _ in HabilitacionConductor._meta.get_field('tipo_vehiculo').choices}
+    filas = []
+    for conductor_id, texto in Conductor.objects.exclude(tipos_vehiculo_habilitados='').values_list('id', 'tipos_vehiculo_habilitados').iterator():
+        tipos = {t.strip() for t in texto.split(',')} & validos
+        filas += [HabilitacionConductor(conductor_id=conductor_id, tipo_vehiculo=tipo) for tipo in sorted(tipos)]
+    HabilitacionConductor.objects.bulk_create(filas, batch_size=1000)
+
+
+def restaurar_texto(apps, schema_editor):
+    Conductor = apps.get_model('asignaciones', 'Conductor')
+    HabilitacionConductor = apps.get_model('asignaciones', 'HabilitacionConductor')
+    tipos = {}
+    for conductor_id, tipo in HabilitacionConductor.objects.order_by('conductor_id', 'tipo_vehiculo').values_list('conductor_id', 'tipo_vehiculo'):
+        tipos.setdefault(conductor_id, []).append(tipo)
+    Conductor.objects.bulk_update(
+        [Conductor(id=conductor_id, tipos_vehiculo_habilitados=','.join(lista)) for conductor_id, lista in tipos.items()],
+        ['tipos_vehiculo_habilitados'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0010_foto_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabilitacionConductor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_vehiculo', models.CharField(choices=[('auto_funcionario', 'Auto para Funcionarios'), ('furgon_insumos', 'Furgón para Insumos'), ('ambulancia', 'Ambulancia para Pacientes'), ('camioneta_grande', 'Camioneta Grande Pasajeros'), ('camion_carga', 'Camión de Carga Ligera'), ('otro', 'Otro')], max_length=50)),
+                ('conductor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='habilitaciones', to='asignaciones.conductor')),
+            ],
+            options={
+                'verbose_name': 'Habilitación de conductor',
+                'verbose_name_plural': 'Habilitaciones de conductores',
+                'constraints': [models.UniqueConstraint(fields=('tipo_vehiculo', 'conductor'), name='habilitacion_unica')],
+            },
+        ),
+        migrations.RunPython(copiar_habilitaciones, restaurar_texto),
+        migrations.RemoveField(
+            model_name='conductor',
+            name='tipos_vehiculo_habilitados',
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:29
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia congelada del vocabulario y de services/caracteristicas.parsear() (sólo la máscara)
+SINONIMOS = {
+    'silla_ruedas': ['silla de ruedas', 'silla ruedas', 'rampa', 'elevador', 'plataforma elevadora'],
+    'camilla': ['camilla', 'paciente acostado'],
+    'oxigeno': ['oxigeno', 'balon de oxigeno'],
+    'refrigerado': ['refrigerado', 'refrigerada', 'refrigeracion', 'cadena de frio'],
+    'aire_acondicionado': ['aire acondicionado', 'climatizado'],
+    'gps': ['gps'],
+    'traccion_4x4': ['4x4', 'traccion 4x4'],
+}
+BITS = {clave: 1 << i for i, clave in enumerate(SINONIMOS)}
+NEGACIONES = {'sin', 'no', 'ni'}
+AFIRMACIONES = {'con', 'y', 'e', 'pero'}
+
+
+def _normalizar(texto):
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return ' '.join(sin_tildes.lower().replace('_', ' ').split())
+
+
+CLAVE_DE = {_normalizar(s): clave for clave, sinonimos in SINONIMOS.items() for s in [clave, *sinonimos]}
+MAX_PALABRAS = max(len(s.split()) for s in CLAVE_DE)
+
+
+def mascara_de(texto):
+    texto = texto or ''
+    for separador in ',;/\n+':
+        texto = texto.replace(separador, ',')
+    mascara = 0
+    for termino in texto.split(','):
+        palabras = _normalizar(termino).split()
+        negado = False
+        i = 0
+        while i < len(palabras):
+            for largo in range(min(MAX_PALABRAS, len(palabras) - i), 0, -1):
+                clave = CLAVE_DE.get(' '.join(palabras[i:i + largo]))
+                if clave is not None:
+                    if not negado:
+                        mascara |= BITS[clave]
+                    i += largo
+                    break
+            else:
+                if palabras[i] in NEGACIONES:
+                    negado = True
+                elif palabras[i] in AFIRMACIONES:
+                    negado = False
+                i += 1
+    return mascara
+
+
+def calcular_mascaras(apps, schema_editor):
+    for modelo, texto, mascara in (
+        ('Vehiculo', 'caracteristicas_adicionales', 'caracteristicas'),
+        ('Asignacion', 'req_caracteristicas_especiales', 'req_caracteristicas'),
+    ):
+        Modelo = apps.get_model('asignaciones', modelo)
+        cambios = []
+        for pk, valor in Modelo.objects.exclude(**{texto: ''}).values_list('id', texto).iterator():
+            valor_mascara = mascara_de(valor)
+            if valor_mascara:
+                cambios.append(Modelo(id=pk, **{mascara: valor_mascara}))
+        Modelo.objects.bulk_update(cambios, [mascara], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0011_habilitacion_conductor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asignacion',
+            name='req_caracteristicas',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Máscara de bits de las características requeridas reconocidas en el texto'),
+        ),
+        migrations.AddField(
+            model_name='vehiculo',
+            name='caracteristicas',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Máscara de bits de las características reconocidas en el texto (ver services/caracteristicas.py)'),
+        ),
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asignaciones', '0012_caracteristicas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asignacion',
+            name='asignada_por_motor',
+            field=models.BooleanField(default=False, editable=False, help_text='Vehículo y conductor los eligió el motor o el planificador (sólo éstas se replanifican)'),
+        ),
+    ]
@@ -1,8 +1,40 @@
 # GOPH/gestor_vehiculos/asignaciones/models.py
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone # Necesitarás esto si usas timezone.now como default
 
-class Vehiculo(models.Model):
+from .cache import incrementar_version
+from .services import caracteristicas
+from .services.geo import celda_para
+
+
+class UbicacionIndexadaMixin:
+    """Mantiene 'celda_geo' sincronizada con ubicacion_actual_lat/lon en cada save()."""
+
+    def save(self, *args, **kwargs):
+        self.celda_geo = celda_para(self.ubicacion_actual_lat, self.ubicacion_actual_lon)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'ubicacion_actual_lat', 'ubicacion_actual_lon'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'celda_geo'}
+        super().save(*args, **kwargs)
+
+
+class CaracteristicasIndexadasMixin:
+    """Mantiene la máscara de características (campo_mascara) sincronizada con su texto libre (campo_texto)."""
+    campo_texto = campo_mascara = None
+
+    def actualizar_mascara(self):
+        # También lo llaman los servicios que guardan con bulk_create/bulk_update (no pasan por save())
+        setattr(self, self.campo_mascara, caracteristicas.mascara_de(getattr(self, self.campo_texto)))
+
+    def save(self, *args, **kwargs):
+        self.actualizar_mascara()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.campo_texto in set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {self.campo_mascara}
+        super().save(*args, **kwargs)
+
+
+class Vehiculo(UbicacionIndexadaMixin, CaracteristicasIndexadasMixin, models.Model):
     ESTADO_CHOICES = [
         ('disponible', 'Disponible'),
         ('en_uso', 'En Uso'), # Ocupado en una asignación
@@ -23,6 +55,9 @@ class Vehiculo(models.Model):
     patente = models.CharField(max_length=20, unique=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='disponible')
     foto = models.ImageField(upload_to='vehiculos_fotos/', null=True, blank=True)
+    foto_variantes_generadas = models.BooleanField(
+        default=False, editable=False, help_text="Miniaturas de la foto ya generadas (ver services/fotos.py)"
+    )
 
     # Nuevos campos para el algoritmo
     tipo_vehiculo = models.CharField(
@@ -43,9 +78,17 @@ class Vehiculo(models.Model):
     caracteristicas_adicionales = models.TextField(
         blank=True, help_text="Características especiales: silla de ruedas, refrigerado, etc. (texto libre o JSON)"
     )
+    caracteristicas = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False,
+        help_text="Máscara de bits de las características reconocidas en el texto (ver services/caracteristicas.py)"
+    )
     # Ubicación (simplificado, para producción real podrías necesitar algo más robusto o integración GPS)
     ubicacion_actual_lat = models.FloatField(null=True, blank=True, help_text="Latitud actual del vehículo")
     ubicacion_actual_lon = models.FloatField(null=True, blank=True, help_text="Longitud actual del vehículo")
+    celda_geo = models.IntegerField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="Celda de la grilla espacial (se calcula desde la ubicación)"
+    )
     # Si un vehículo tiene un conductor "principal" o "ligado" de forma preferente
     conductor_preferente = models.ForeignKey(
         'Conductor', # Usar string para evitar problemas de importación circular si Conductor se define después
@@ -55,11 +98,13 @@ class Vehiculo(models.Model):
         help_text="Conductor usual o preferente para este vehículo (opcional)"
     )
 
+    campo_texto, campo_mascara = 'caracteristicas_adicionales', 'caracteristicas'
+
 
     def __str__(self):
         return f"{self.marca} {self.modelo} ({self.patente})"
 
-class Conductor(models.Model):
+class Conductor(UbicacionIndexadaMixin, models.Model):
     ESTADO_DISPONIBILIDAD_CHOICES = [
         ('disponible', 'Disponible'),
         ('en_ruta', 'En Ruta'),
@@ -75,11 +120,7 @@ class Conductor(models.Model):
     activo = models.BooleanField(default=True, help_text="Indica si el conductor está habilitado en el sistema")
     fecha_registro = models.DateTimeField(auto_now_add=True)
 
-    # Nuevos campos
-    tipos_vehiculo_habilitados = models.CharField( # Simplificado, podría ser ManyToManyField a TipoVehiculo
-        max_length=255, blank=True,
-        help_text="Tipos de vehículo que puede manejar (ej: auto_funcionario,furgon_insumos)"
-    )
+    # Nuevos campos (los tipos de vehículo que puede manejar están en HabilitacionConductor)
     estado_disponibilidad = models.CharField(
         max_length=20,
         choices=ESTADO_DISPONIBILIDAD_CHOICES,
@@ -88,6 +129,10 @@ class Conductor(models.Model):
     # Ubicación (si los conductores inician desde una base o su casa)
     ubicacion_actual_lat = models.FloatField(null=True, blank=True, help_text="Latitud actual del conductor")
     ubicacion_actual_lon = models.FloatField(null=True, blank=True, help_text="Longitud actual del conductor")
+    celda_geo = models.IntegerField(
+        null=True, blank=True, db_index=True, editable=False,
+        help_text="Celda de la grilla espacial (se calcula desde la ubicación)"
+    )
 
 
     def __str__(self):
@@ -98,9 +143,46 @@ class Conductor(models.Model):
         verbose_name_plural = "Conductores"
         ordering = ['apellido', 'nombre']
 
+    @property
+    def tipos_vehiculo_habilitados(self):
+        return sorted(h.tipo_vehiculo for h in self.habilitaciones.all())
+
+    def definir_tipos_habilitados(self, tipos):
+        """Reemplaza los tipos de vehículo habilitados (sólo borra e inserta las diferencias)."""
+        tipos = set(tipos)
+        actuales = set(self.habilitaciones.values_list('tipo_vehiculo', flat=True))
+        if actuales - tipos:
+            self.habilitaciones.filter(tipo_vehiculo__in=actuales - tipos).delete()
+        if tipos - actuales:
+            # bulk_create no envía post_save: la versión del caché se incrementa aquí
+            HabilitacionConductor.objects.bulk_create(
+                [HabilitacionConductor(conductor=self, tipo_vehiculo=tipo) for tipo in sorted(tipos - actuales)]
+            )
+            transaction.on_commit(lambda: incrementar_version(Conductor))
+        if hasattr(self, '_prefetched_objects_cache'):
+            self._prefetched_objects_cache.pop('habilitaciones', None)
+        return actuales != tipos
+
+
+class HabilitacionConductor(models.Model):
+    """Tipo de vehículo que un conductor está habilitado para manejar (una fila por tipo)."""
+    conductor = models.ForeignKey(Conductor, on_delete=models.CASCADE, related_name='habilitaciones')
+    tipo_vehiculo = models.CharField(max_length=50, choices=Vehiculo.TIPO_VEHICULO_CHOICES)
 
+    def __str__(self):
+        return f"{self.conductor_id}: {self.tipo_vehiculo}"
+
+    class Meta:
+        verbose_name = "Habilitación de conductor"
+        verbose_name_plural = "Habilitaciones de conductores"
+        constraints = [
+            # También es el índice de ?habilitado_para=: (tipo_vehiculo, conductor_id)
+            models.UniqueConstraint(fields=['tipo_vehiculo', 'conductor'], name='habilitacion_unica'),
+        ]
 
-class Asignacion(models.Model):
+
+
+class Asignacion(CaracteristicasIndexadasMixin, models.Model):
     ESTADO_ASIGNACION_CHOICES = [
         ('pendiente_auto', 'Pendiente de Asignación Automática'),
         ('programada', 'Programada (Auto/Manual)'),
@@ -151,6 +233,10 @@ class Asignacion(models.Model):
     req_caracteristicas_especiales = models.TextField(
         blank=True, help_text="Requerimientos especiales para el vehículo (ej: silla de ruedas)"
     )
+    req_caracteristicas = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Máscara de bits de las características requeridas reconocidas en el texto"
+    )
     # Para el cálculo de distancia (coordenadas)
     origen_lat = models.FloatField(null=True, blank=True)
     origen_lon = models.FloatField(null=True, blank=True)
@@ -161,12 +247,106 @@ class Asignacion(models.Model):
     fecha_hora_fin_prevista = models.DateTimeField(null=True, blank=True) # Puede calcularse o definirse después
     fecha_hora_fin_real = models.DateTimeField(null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADO_ASIGNACION_CHOICES, default='pendiente_auto')
+    asignada_por_motor = models.BooleanField(
+        default=False, editable=False,
+        help_text="Vehículo y conductor los eligió el motor o el planificador (sólo éstas se replanifican)"
+    )
     observaciones = models.TextField(blank=True, null=True)
 
+    campo_texto, campo_mascara = 'req_caracteristicas_especiales', 'req_caracteristicas'
+
+    class Meta:
+        indexes = [
+            # Búsqueda acotada de choques de horario por recurso (ver services/conflictos.py)
+            models.Index(fields=['vehiculo', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista'], name='asig_vehiculo_ventana_idx'),
+            models.Index(fields=['conductor', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista'], name='asig_conductor_ventana_idx'),
+            # Paginación por cursor (keyset) sobre cada campo ordenable (ver pagination.py)
+            models.Index(fields=['fecha_hora_solicitud', 'id'], name='asig_solicitud_id_idx'),
+            models.Index(fields=['fecha_hora_requerida_inicio', 'id'], name='asig_inicio_id_idx'),
+            models.Index(fields=['fecha_hora_fin_prevista', 'id'], name='asig_fin_prevista_id_idx'),
+        ]
 
     def __str__(self):
         conductor_str = f"{self.conductor.nombre} {self.conductor.apellido}" if self.conductor else "Por asignar"
         vehiculo_str = str(self.vehiculo) if self.vehiculo else "Por asignar"
         # Corregido para usar get_tipo_servicio_display() si existe o el valor directo
         tipo_servicio_display = self.get_tipo_servicio_display() if hasattr(self, 'get_tipo_servicio_display') else self.tipo_servicio
-        return f"Servicio {tipo_servicio_display} a {self.destino_descripcion} - Vehículo: {vehiculo_str}, Conductor: {conductor_str}"
\ No newline at end of file
+        return f"Servicio {tipo_servicio_display} a {self.destino_descripcion} - Vehículo: {vehiculo_str}, Conductor: {conductor_str}"
+
+class EstadisticaDiaria(models.Model):
+    """
+    Rollup diario de asignaciones por vehículo y tipo de servicio (ver services/estadisticas.py).
+    Se mantiene con deltas al crear/modificar asignaciones y se puede reconstruir con el comando
+    'reconstruir_estadisticas'. Puede haber más de una fila por clave: las lecturas siempre suman.
+    """
+    fecha = models.DateField(help_text="Día (hora local) de fecha_hora_requerida_inicio")
+    vehiculo = models.ForeignKey(Vehiculo, on_delete=models.SET_NULL, null=True, blank=True, related_name='estadisticas_diarias')
+    tipo_servicio = models.CharField(max_length=50, choices=Asignacion.TIPO_SERVICIO_CHOICES)
+    total = models.IntegerField(default=0)
+    completadas = models.IntegerField(default=0)
+    canceladas = models.IntegerField(default=0)
+    minutos_servicio = models.FloatField(default=0, help_text="Minutos entre el inicio requerido y el fin real de las completadas")
+    minutos_anticipacion = models.FloatField(default=0, help_text="Suma de minutos entre la solicitud y el inicio requerido")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'vehiculo', 'tipo_servicio'], name='estadistica_clave_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.vehiculo_id or 'sin vehículo'} - {self.tipo_servicio}: {self.total}"
+
+
+class PosicionHistorica(models.Model):
+    """Historial de pings GPS (sólo si ASIGNACIONES_GPS_HISTORIAL = True, ver services/posiciones.py)."""
+    vehiculo = models.ForeignKey(Vehiculo, on_delete=models.CASCADE, null=True, blank=True, related_name='posiciones')
+    conductor = models.ForeignKey(Conductor, on_delete=models.CASCADE, null=True, blank=True, related_name='posiciones')
+    lat = models.FloatField()
+    lon = models.FloatField()
+    registrada = models.DateTimeField(help_text="Momento del ping informado por el dispositivo")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vehiculo', 'registrada'], name='posicion_vehiculo_idx'),
+            models.Index(fields=['conductor', 'registrada'], name='posicion_conductor_idx'),
+        ]
+
+    def __str__(self):
+        unidad = f"vehículo {self.vehiculo_id}" if self.vehiculo_id else f"conductor {self.conductor_id}"
+        return f"{unidad} ({self.lat}, {self.lon}) {self.registrada}"
+
+
+class Tarea(models.Model):
+    """
+    Cola de trabajos en segundo plano guardada en la BD (ver services/tareas.py y el comando
+    'procesar_tareas'). Sólo puede haber una tarea pendiente por (tipo, clave): encolar de nuevo
+    el mismo trabajo antes de que se ejecute no crea otra fila.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    clave = models.CharField(max_length=100, blank=True, default='', help_text="Identifica el trabajo para deduplicarlo (p.ej. id de la asignación)")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    disponible_desde = models.DateTimeField(default=timezone.now, help_text="No se ejecuta antes de este momento (reintentos con espera)")
+    creada = models.DateTimeField(auto_now_add=True)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    finalizada = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'clave'], condition=models.Q(estado='pendiente'), name='tarea_pendiente_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}({self.clave}) - {self.estado}"
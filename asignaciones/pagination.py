@@ -0,0 +1,278 @@
+# asignaciones/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.template import loader
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from .conteos import contar, conteo_cacheado, recordar_conteo
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """Paginator de Django cuyo total sale de conteos.contar(): estimado sin filtros, cacheado con filtros."""
+    estimar = True
+
+    @cached_property
+    def count(self):
+        return contar(self.object_list, estimar=self.estimar)
+
+
+class ConteoCacheadoPaginator(ConteoEstimadoPaginator):
+    """Total siempre exacto, cacheado por firma del filtro y versión del modelo."""
+    estimar = False
+
+
+class ConteoCacheadoPagination(PageNumberPagination):
+    """
+    PageNumberPagination sin COUNT(*) por defecto.
+
+    Se leen page_size + 1 filas: la extra indica si hay página siguiente. 'count' es el total si ya
+    está en el caché de conteos (o si ésta es la última página, donde se deduce y se guarda); si no,
+    es una cota inferior ("al menos N") y 'count_exacto' viene en false. Con ?conteo=exacto (o
+    ?page=last) se calcula el total exacto con ConteoCacheadoPaginator. Así una página cuesta lo que
+    cuesta leerla, no lo que cuesta contar la tabla.
+    """
+    conteo_query_param = 'conteo'
+    django_paginator_class = ConteoCacheadoPaginator
+    template_sin_conteo = 'rest_framework/pagination/previous_and_next.html'
+
+    def pide_conteo_exacto(self, request):
+        return (
+            request.query_params.get(self.conteo_query_param) == 'exacto'
+            or request.query_params.get(self.page_query_param) in self.last_page_strings
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.conteo_exacto = self.pide_conteo_exacto(request)
+        if self.conteo_exacto:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        numero = request.query_params.get(self.page_query_param) or 1
+        try:
+            self.numero = int(numero)
+            if self.numero < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=numero, message='Número de página inválido.'))
+
+        inicio = (self.numero - 1) * page_size
+        filas = list(queryset[inicio:inicio + page_size + 1])
+        self.hay_siguiente = len(filas) > page_size
+        filas = filas[:page_size]
+        if not filas and self.numero > 1:
+            raise NotFound(self.invalid_page_message.format(page_number=numero, message='La página no contiene resultados.'))
+
+        if self.hay_siguiente:
+            self.total = conteo_cacheado(queryset)
+        else:
+            self.total = inicio + len(filas)
+            recordar_conteo(queryset, self.total)
+        self.total_exacto = self.total is not None
+        if not self.total_exacto:
+            self.total = inicio + len(filas) + 1
+        self.display_page_controls = self.hay_siguiente or self.numero > 1
+        return filas
+
+    def get_paginated_response(self, data):
+        if self.conteo_exacto:
+            total, exacto = self.page.paginator.count, True
+        else:
+            total, exacto = self.total, self.total_exacto
+        return Response({
+            'count': total,
+            'count_exacto': exacto,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        esquema = super().get_paginated_response_schema(schema)
+        esquema['properties']['count']['description'] = (
+            'Total de resultados; si count_exacto es false es una cota inferior (pedir ?conteo=exacto para el total).'
+        )
+        esquema['properties']['count_exacto'] = {'type': 'boolean', 'example': True}
+        return esquema
+
+    def get_next_link(self):
+        if self.conteo_exacto:
+            return super().get_next_link()
+        if not self.hay_siguiente:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.numero + 1)
+
+    def get_previous_link(self):
+        if self.conteo_exacto:
+            return super().get_previous_link()
+        if self.numero == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.numero == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.numero - 1)
+
+    def get_html_context(self):
+        if self.conteo_exacto:
+            return super().get_html_context()
+        return {'previous_url': self.get_previous_link(), 'next_url': self.get_next_link()}
+
+    def to_html(self):
+        if self.conteo_exacto:
+            return super().to_html()
+        return loader.get_template(self.template_sin_conteo).render(self.get_html_context())
+
+
+class KeysetPagination(ConteoCacheadoPagination):
+    """
+    ConteoCacheadoPagination con un modo "cursor" (keyset) opcional.
+
+    Si la petición trae ?cursor=... o ?paginacion=cursor, la página se obtiene con
+    WHERE (campo, id) < (ultimo_valor, ultimo_id) ORDER BY campo, id LIMIT n, que usa el índice
+    compuesto (campo, id) y cuesta lo mismo en la página 1 que en la 10.000, sin OFFSET ni COUNT(*).
+    Sin esos parámetros se comporta exactamente como ConteoCacheadoPagination.
+    """
+    cursor_query_param = 'cursor'
+    modo_query_param = 'paginacion'
+    campos_cursor = ()        # Campos por los que se permite ordenar en modo cursor (deben tener índice (campo, id))
+    ordering_cursor = None    # Orden por defecto en modo cursor, p.ej. '-fecha_hora_solicitud'
+
+    def es_modo_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.modo_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.es_modo_cursor(request)
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self._modelo = queryset.model
+        self.campo, self.descendente = self._ordenamiento(request)
+        page_size = self.get_page_size(request)
+        valor, pk, hacia_atras = self._decodificar_cursor(request)
+        # Hacia atrás se recorre con el orden invertido y luego se da vuelta la página
+        desc = self.descendente != hacia_atras
+
+        queryset = queryset.order_by(*self._order_by(desc))
+        if pk is not None:
+            queryset = queryset.filter(self._filtro_despues(valor, pk, desc))
+        filas = list(queryset[:page_size + 1])
+        hay_mas = len(filas) > page_size
+        filas = filas[:page_size]
+        if hacia_atras:
+            filas.reverse()
+
+        self.cursor_siguiente = self.cursor_anterior = None
+        if filas:
+            if hay_mas or hacia_atras:
+                self.cursor_siguiente = self._codificar_cursor(filas[-1], atras=False)
+            if pk is not None and (hay_mas or not hacia_atras):
+                self.cursor_anterior = self._codificar_cursor(filas[0], atras=True)
+        return filas
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self._url_cursor(self.cursor_siguiente),
+            'previous': self._url_cursor(self.cursor_anterior),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        esquema = super().get_paginated_response_schema(schema)
+        esquema['properties']['count']['description'] += ' Se omite en modo cursor (?paginacion=cursor).'
+        return esquema
+
+    def get_html_context(self):
+        if not self.modo_cursor:
+            return super().get_html_context()
+        return {'previous_url': self._url_cursor(self.cursor_anterior), 'next_url': self._url_cursor(self.cursor_siguiente)}
+
+    def to_html(self):
+        if not self.modo_cursor:
+            return super().to_html()
+        return ''
+
+    # -- detalles del modo cursor --
+
+    def _ordenamiento(self, request):
+        orden = request.query_params.get('ordering', '').split(',')[0].strip()
+        if orden.lstrip('-') not in self.campos_cursor:
+            orden = self.ordering_cursor
+        return orden.lstrip('-'), orden.startswith('-')
+
+    def _admite_nulos(self):
+        return self.campo != 'id' and self._modelo._meta.get_field(self.campo).null
+
+    def _order_by(self, desc):
+        # Convención: descendente deja los NULL al final y ascendente al principio (así la inversa es simétrica)
+        campo = F(self.campo).desc(nulls_last=True) if desc else F(self.campo).asc(nulls_first=True)
+        if not self._admite_nulos():
+            campo = f'-{self.campo}' if desc else self.campo
+        return [campo, '-id' if desc else 'id']
+
+    def _filtro_despues(self, valor, pk, desc):
+        """Filas estrictamente posteriores a (valor, pk) en el orden indicado."""
+        menor = 'lt' if desc else 'gt'
+        if valor is None:
+            filtro = Q(**{f'{self.campo}__isnull': True, f'id__{menor}': pk})
+            return filtro if desc else filtro | Q(**{f'{self.campo}__isnull': False})
+        comparacion = 'lte' if desc else 'gte'
+        filtro = Q(**{f'{self.campo}__{comparacion}': valor}) & (
+            Q(**{f'{self.campo}__{menor}': valor}) | Q(**{f'id__{menor}': pk})
+        )
+        if desc and self._admite_nulos():
+            filtro |= Q(**{f'{self.campo}__isnull': True})
+        return filtro
+
+    def _valor(self, fila, campo):
+        return fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+
+    def _codificar_cursor(self, fila, atras):
+        valor = self._valor(fila, self.campo)
+        if isinstance(valor, datetime):
+            valor = valor.isoformat()
+        datos = {'o': self.campo, 'v': valor, 'id': self._valor(fila, 'id'), 'a': int(atras)}
+        return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+    def _decodificar_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, None, False
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if datos['o'] != self.campo:
+                raise ValueError('El cursor corresponde a otro ordenamiento.')
+            valor = datos['v']
+            if isinstance(valor, str):
+                valor = parse_datetime(valor) or valor
+            return valor, int(datos['id']), bool(datos['a'])
+        except (TypeError, ValueError, KeyError, json.JSONDecodeError):
+            raise NotFound('Cursor inválido.')
+
+    def _url_cursor(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class AsignacionPagination(KeysetPagination):
+    campos_cursor = ('fecha_hora_solicitud', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista')
+    ordering_cursor = '-fecha_hora_solicitud'
+
@@ -0,0 +1,150 @@
+# asignaciones/replicas.py
+"""
+Réplicas de lectura: las lecturas seguras de la API van a una réplica y las escrituras a 'default'.
+
+ReplicaLecturaMiddleware elige una réplica de ASIGNACIONES_REPLICAS para cada petición GET/HEAD/
+OPTIONS y la guarda en un contextvar; RouterReplicas la usa en db_for_read. Todo lo demás
+(escrituras, acciones de transición, comandos, el worker de tareas) lee y escribe en 'default'.
+
+Después de que un cliente escribe, sus lecturas vuelven a 'default' durante VENTANA_PEGAJOSA
+segundos (read-your-writes), así no ve datos anteriores a su propio cambio mientras la réplica se
+pone al día. El cliente se identifica por su token, su cookie de sesión o, si no tiene, su IP, y
+la marca se guarda en el caché 'versiones', que comparten todos los procesos.
+"""
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICAS = list(getattr(settings, 'ASIGNACIONES_REPLICAS', []))
+VENTANA_PEGAJOSA = getattr(settings, 'ASIGNACIONES_REPLICA_VENTANA_S', 5)
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_actual = contextvars.ContextVar('replica_actual', default=None)
+
+
+def replica_actual():
+    """Alias de la réplica asignada a la petición en curso, o None si se lee de 'default'."""
+    return _replica_actual.get()
+
+
+@contextmanager
+def usar_primaria():
+    """Fuerza las lecturas del bloque a 'default' (p.ej. para lo que se guarda bajo una versión)."""
+    token = _replica_actual.set(None)
+    try:
+        yield
+    finally:
+        _replica_actual.reset(token)
+
+
+class RouterReplicas:
+    def db_for_read(self, model, **hints):
+        alias = _replica_actual.get()
+        # Dentro de una transacción se lee lo que ella misma escribió
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema junto con los datos (ver 'sincronizar_replica')
+        return db not in REPLICAS
+
+
+def _cache_pegajoso():
+    try:
+        return caches['versiones']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _claves_cliente(request, response=None):
+    claves = []
+    autorizacion = request.headers.get('Authorization')
+    if autorizacion:
+        claves.append('auth:' + hashlib.sha1(autorizacion.encode()).hexdigest())
+    sesiones = {request.COOKIES.get(settings.SESSION_COOKIE_NAME)}
+    if response is not None and settings.SESSION_COOKIE_NAME in response.cookies:
+        # Al iniciar sesión la cookie cambia: la nueva también queda marcada
+        sesiones.add(response.cookies[settings.SESSION_COOKIE_NAME].value)
+    claves += [f'sesion:{sesion}' for sesion in sesiones if sesion]
+    if not claves:
+        claves.append(f"ip:{request.META.get('REMOTE_ADDR')}")
+    return [f'replica:pegajoso:{clave}' for clave in claves]
+
+
+def _elegir(request):
+    if not REPLICAS or request.method not in METODOS_LECTURA:
+        return None
+    if _cache_pegajoso().get_many(_claves_cliente(request)):
+        return None
+    return random.choice(REPLICAS)
+
+
+def _iterar_en(alias, contenido):
+    """Itera una respuesta streaming (p.ej. la exportación) leyendo de la réplica de su petición."""
+    iterador = iter(contenido)
+    while True:
+        token = _replica_actual.set(alias)
+        try:
+            parte = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _replica_actual.reset(token)
+        yield parte
+
+
+def _marcar(request, response):
+    if REPLICAS and request.method not in METODOS_LECTURA:
+        _cache_pegajoso().set_many(dict.fromkeys(_claves_cliente(request, response), 1), VENTANA_PEGAJOSA)
+
+
+class ReplicaLecturaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self._call_async(request)
+        alias = _elegir(request)
+        token = _replica_actual.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_actual.reset(token)
+        if alias and response.streaming and not response.is_async:
+            # El contenido se genera después de que termina este middleware
+            response.streaming_content = _iterar_en(alias, response.streaming_content)
+        _marcar(request, response)
+        return response
+
+    async def _call_async(self, request):
+        token = _replica_actual.set(_elegir(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_actual.reset(token)
+        _marcar(request, response)
+        return response
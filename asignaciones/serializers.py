@@ -1,9 +1,99 @@
 # GOPH/gestor_vehiculos/asignaciones/serializers.py
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Vehiculo, Conductor, Asignacion
+from .services import caracteristicas, eta
+from .services.conflictos import buscar_conflictos, excede_duracion_maxima, mensaje_duracion_maxima
+from .services.fotos import VARIANTES, version_foto
 
-class VehiculoSerializer(serializers.ModelSerializer):
+ESTADOS_CON_RESERVA = ['pendiente_auto', 'programada', 'activa']
+NOMBRES_RECURSO = {'vehiculo': 'vehículo', 'conductor': 'conductor'}
+
+class PrimaryKeyPrecargadaField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que, si el contexto trae context['precargados'][Modelo] (un dict pk -> objeto,
+    armado con una sola consulta para todo un lote), lo usa en vez de hacer un .get() por elemento.
+    """
+    def to_internal_value(self, data):
+        precargados = self.context.get('precargados', {}).get(self.get_queryset().model)
+        if precargados is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = precargados.get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+def parsear_lista_param(valor):
+    return [v.strip() for v in (valor or '').split(',') if v.strip()]
+
+
+def datos_eta(data, instancia=None):
+    """Argumentos de services/eta.py tomados de los datos validados o, si no vienen, de la instancia."""
+    valor = lambda campo: data[campo] if campo in data else getattr(instancia, campo, None)
+    return {
+        'origen_lat': valor('origen_lat'), 'origen_lon': valor('origen_lon'),
+        'destino_lat': valor('destino_lat'), 'destino_lon': valor('destino_lon'),
+        'tipo_vehiculo': eta.tipo_vehiculo_de(valor('vehiculo'), valor('req_tipo_vehiculo_preferente')),
+        'tipo_servicio': valor('tipo_servicio') or 'otro',
+    }
+
+
+# Nombre -> clase de los serializers que se pueden anidar con ?expand=; se llena al final del módulo,
+# cuando las clases ya existen (las referencias entre ellas son circulares)
+SERIALIZERS_ANIDABLES = {}
+
+
+class CamposDinamicosMixin:
+    """
+    Respuestas parciales controladas por query params (sólo en el serializer de nivel superior):
+      ?fields=id,estado,...   devuelve únicamente esos campos (en lecturas)
+      ?expand=vehiculo,...    reemplaza el id de la relación por el objeto anidado (ver 'expandibles')
+    'expandibles' mapea campo -> nombre de la clase serializer a anidar, registrada en SERIALIZERS_ANIDABLES.
+    """
+    expandibles = {}
+
+    def __init__(self, *args, **kwargs):
+        aplicar_parametros = kwargs.pop('aplicar_parametros', True)
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if not aplicar_parametros or request is None:
+            return
+        for nombre in parsear_lista_param(request.query_params.get('expand')):
+            if nombre in self.expandibles and nombre in self.fields:
+                if not self.fields[nombre].read_only and request.method not in SAFE_METHODS:
+                    continue  # En escrituras un campo editable debe seguir aceptando el id
+                clase = SERIALIZERS_ANIDABLES[self.expandibles[nombre]]
+                self.fields[nombre] = clase(read_only=True, aplicar_parametros=False)
+        campos = parsear_lista_param(request.query_params.get('fields'))
+        if campos and request.method in SAFE_METHODS:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+
+class CaracteristicasField(serializers.Field):
+    """Máscara de características como lista de claves del vocabulario (sólo lectura)."""
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return caracteristicas.claves(value or 0)
+
+
+class VehiculoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    caracteristicas = CaracteristicasField()
     foto_url = serializers.ImageField(source='foto', read_only=True)
+    foto_variantes = serializers.SerializerMethodField()
 
     class Meta:
         model = Vehiculo
@@ -16,10 +106,12 @@ class VehiculoSerializer(serializers.ModelSerializer):
             'estado',
             'foto',
             'foto_url',
+            'foto_variantes',
             # Nuevos campos que podrías querer exponer:
             'tipo_vehiculo',
             'capacidad_carga_kg',
             'caracteristicas_adicionales',
+            'caracteristicas', # Reconocidas en el texto anterior (ver ?caracteristicas= en VehiculoViewSet)
             'ubicacion_actual_lat',
             'ubicacion_actual_lon',
             'conductor_preferente',
@@ -27,11 +119,34 @@ class VehiculoSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'foto': {'write_only': True, 'required': False}
         }
-        # profundidad para mostrar detalles del conductor_preferente si es necesario
-        # depth = 1
+    # ?expand=conductor_preferente para recibir el conductor completo en vez de su id
+    expandibles = {'conductor_preferente': 'ConductorSerializer'}
+
+    def get_foto_variantes(self, obj):
+        # URLs de las versiones redimensionadas (null mientras se generan); ?v= cambia con cada foto nueva
+        if not obj.foto or not obj.foto_variantes_generadas:
+            return None
+        request = self.context.get('request')
+        variantes = {}
+        for variante in VARIANTES:
+            url = reverse('vehiculo-foto', kwargs={'pk': obj.pk, 'variante': variante}) + f'?v={version_foto(obj.foto.name)}'
+            variantes[variante] = request.build_absolute_uri(url) if request else url
+        return variantes
+
+
+class TiposHabilitadosField(serializers.ListField):
+    """Lista de tipos de vehículo habilitados; también acepta el formato anterior "tipo1,tipo2"."""
+    child = serializers.ChoiceField(choices=Vehiculo.TIPO_VEHICULO_CHOICES)
 
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = parsear_lista_param(data)
+        return sorted(set(super().to_internal_value(data)))
+
+
+class ConductorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    tipos_vehiculo_habilitados = TiposHabilitadosField(required=False)
 
-class ConductorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conductor
         fields = [
@@ -52,19 +167,37 @@ class ConductorSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['fecha_registro']
 
+    @transaction.atomic
+    def create(self, validated_data):
+        tipos = validated_data.pop('tipos_vehiculo_habilitados', [])
+        conductor = super().create(validated_data)
+        conductor.definir_tipos_habilitados(tipos)
+        return conductor
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        tipos = validated_data.pop('tipos_vehiculo_habilitados', None)
+        conductor = super().update(instance, validated_data)
+        if tipos is not None:
+            conductor.definir_tipos_habilitados(tipos)
+        return conductor
 
-class AsignacionSerializer(serializers.ModelSerializer):
-    vehiculo = VehiculoSerializer(read_only=True)
-    conductor = ConductorSerializer(read_only=True)
 
-    vehiculo_id = serializers.PrimaryKeyRelatedField(
+class AsignacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    # Por defecto sólo el id; ?expand=vehiculo,conductor devuelve los objetos completos
+    vehiculo = serializers.PrimaryKeyRelatedField(read_only=True)
+    conductor = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandibles = {'vehiculo': 'VehiculoSerializer', 'conductor': 'ConductorSerializer'}
+    req_caracteristicas = CaracteristicasField()
+
+    vehiculo_id = PrimaryKeyPrecargadaField(
         queryset=Vehiculo.objects.all(),
         source='vehiculo',
         write_only=True,
         allow_null=True, # Permitir nulo si la asignación es automática
         required=False
     )
-    conductor_id = serializers.PrimaryKeyRelatedField(
+    conductor_id = PrimaryKeyPrecargadaField(
         queryset=Conductor.objects.filter(activo=True),
         source='conductor',
         write_only=True,
@@ -93,6 +226,7 @@ class AsignacionSerializer(serializers.ModelSerializer):
             'req_carga_kg',
             'req_tipo_vehiculo_preferente',
             'req_caracteristicas_especiales',
+            'req_caracteristicas',
             'origen_lat',
             'origen_lon',
             'destino_lat',
@@ -113,6 +247,21 @@ class AsignacionSerializer(serializers.ModelSerializer):
                     "fecha_hora_fin_prevista": "La fecha de fin prevista debe ser posterior a la fecha de inicio requerida."
                 })
         
+        # Sin fin previsto se estima con la distancia, el tipo de vehículo y el de servicio (ver services/eta.py);
+        # la carga masiva lo hace después para todo el lote de una vez
+        if fecha_fin_prevista is None and self.context.get('estimar_fin', True):
+            fecha_fin_prevista = eta.estimar_fin(fecha_inicio or timezone.now(), **datos_eta(data, self.instance))
+            if fecha_fin_prevista is not None:
+                data['fecha_hora_fin_prevista'] = fecha_fin_prevista
+
+        # Una asignación editada a mano deja de ser del motor: el planificador ya no la mueve
+        if self.instance is not None and {'vehiculo', 'conductor', 'estado'} & set(data):
+            data['asignada_por_motor'] = False
+
+        # La detección de choques sólo mira DURACION_MAXIMA hacia atrás (ver services/conflictos.py)
+        if excede_duracion_maxima(fecha_inicio or timezone.now(), fecha_fin_prevista):
+            raise serializers.ValidationError({"fecha_hora_fin_prevista": mensaje_duracion_maxima()})
+
         # Validación de disponibilidad del vehículo
         # Usamos .get('vehiculo') que es el source de 'vehiculo_id' en el serializer.
         # El objeto vehiculo es establecido por DRF cuando se valida vehiculo_id.
@@ -128,4 +277,32 @@ class AsignacionSerializer(serializers.ModelSerializer):
                  raise serializers.ValidationError({
                      "vehiculo_id": f"El nuevo vehículo {vehiculo_obj.patente} no está disponible."
                  })
-        return data
\ No newline at end of file
+
+        # Choques de horario con otras reservas del mismo vehículo o conductor
+        estado = data.get('estado', getattr(self.instance, 'estado', 'pendiente_auto'))
+        vehiculo_final = data['vehiculo'] if 'vehiculo' in data else getattr(self.instance, 'vehiculo', None)
+        conductor_final = data['conductor'] if 'conductor' in data else getattr(self.instance, 'conductor', None)
+        # (la carga masiva desactiva esta verificación y la hace para todo el lote de una vez)
+        verificar = self.context.get('verificar_conflictos', True)
+        if verificar and estado in ESTADOS_CON_RESERVA and (vehiculo_final or conductor_final):
+            conflictos = buscar_conflictos(
+                fecha_inicio or timezone.now(),
+                fecha_fin_prevista,
+                vehiculo_id=vehiculo_final.pk if vehiculo_final else None,
+                conductor_id=conductor_final.pk if conductor_final else None,
+                excluir_id=getattr(self.instance, 'pk', None),
+            )
+            errores = {}
+            for conflicto in conflictos:
+                errores.setdefault(f"{conflicto['recurso']}_id", (
+                    f"El {NOMBRES_RECURSO[conflicto['recurso']]} ya está reservado en ese horario "
+                    f"(asignación {conflicto['asignacion_id']})."
+                ))
+            if errores:
+                raise serializers.ValidationError(errores)
+        return data
+
+
+SERIALIZERS_ANIDABLES.update({
+    clase.__name__: clase for clase in (VehiculoSerializer, ConductorSerializer, AsignacionSerializer)
+})
@@ -0,0 +1,267 @@
+# asignaciones/services/asignacion_automatica.py
+"""
+Motor de asignación automática para las solicitudes en estado 'pendiente_auto'.
+
+Se cargan de una sola vez las solicitudes pendientes, la flota, los conductores activos y las
+reservas que pueden solaparse con las solicitudes; se construyen matrices de costo con NumPy y
+se resuelve un emparejamiento óptimo global (algoritmo húngaro) en lugar de asignar solicitud
+por solicitud. Un vehículo o conductor sólo se descarta para las solicitudes cuyo horario choca
+con alguna de sus reservas.
+
+El emparejamiento se hace en dos etapas (solicitud-vehículo y luego vehículo-conductor). Es una
+simplificación: una matriz conjunta solicitudes x (vehículos x conductores) no escala, y el
+costo del conductor (distancia al vehículo) es chico frente al del vehículo.
+"""
+from datetime import timedelta
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from django.db import transaction
+
+from .. import eventos
+from ..cache import incrementar_version
+from ..models import Vehiculo, Conductor, HabilitacionConductor, Asignacion
+from . import estadisticas, eta
+from .conflictos import DURACION_MAXIMA, DURACION_POR_DEFECTO, fin_efectivo, reservas_en_ventana
+from .geo import matriz_distancias_km, coordenadas
+
+# Todos los costos están expresados en "km equivalentes"
+INFACTIBLE = 1e6
+DISTANCIA_DESCONOCIDA_KM = 25.0     # Si falta alguna coordenada
+PENALIZACION_TIPO = 50.0            # El vehículo no es del tipo preferente
+PESO_ASIENTO_SOBRANTE = 0.5         # Por cada asiento desocupado
+PESO_CARGA_SOBRANTE = 0.01          # Por cada kg de capacidad de carga desocupada
+BONO_CONDUCTOR_PREFERENTE = 20.0
+
+ESTADOS_CONDUCTOR = ['disponible', 'en_ruta']
+TIPOS_VEHICULO = [valor for valor, _ in Vehiculo.TIPO_VEHICULO_CHOICES]
+INDICE_TIPO = {tipo: i for i, tipo in enumerate(TIPOS_VEHICULO)}
+
+
+def costo_vehiculos(solicitudes, vehiculos):
+    """Matriz (solicitudes x vehículos) con distancia, holguras, preferencia de tipo y características."""
+    distancia = matriz_distancias_km(
+        coordenadas([s['origen_lat'] for s in solicitudes]),
+        coordenadas([s['origen_lon'] for s in solicitudes]),
+        coordenadas([v['ubicacion_actual_lat'] for v in vehiculos]),
+        coordenadas([v['ubicacion_actual_lon'] for v in vehiculos]),
+    )
+    costo = np.where(np.isnan(distancia), DISTANCIA_DESCONOCIDA_KM, distancia)
+
+    req_pasajeros = np.array([s['req_pasajeros'] for s in solicitudes], dtype=float)[:, None]
+    req_carga = np.array([s['req_carga_kg'] or 0 for s in solicitudes], dtype=float)[:, None]
+    cap_pasajeros = np.array([v['capacidad_pasajeros'] for v in vehiculos], dtype=float)[None, :]
+    cap_carga = np.array([v['capacidad_carga_kg'] or 0 for v in vehiculos], dtype=float)[None, :]
+
+    costo = costo + (cap_pasajeros - req_pasajeros) * PESO_ASIENTO_SOBRANTE
+    costo = costo + np.where(req_carga > 0, (cap_carga - req_carga) * PESO_CARGA_SOBRANTE, 0.0)
+
+    tipo_preferente = np.array([s['req_tipo_vehiculo_preferente'] or '' for s in solicitudes], dtype=object)[:, None]
+    tipo_vehiculo = np.array([v['tipo_vehiculo'] for v in vehiculos], dtype=object)[None, :]
+    costo = costo + np.where((tipo_preferente != '') & (tipo_preferente != tipo_vehiculo), PENALIZACION_TIPO, 0.0)
+
+    # El vehículo debe tener todas las características pedidas: (tiene & pide) == pide
+    req_caract = np.array([s.get('req_caracteristicas') or 0 for s in solicitudes], dtype=np.int64)[:, None]
+    caract = np.array([v.get('caracteristicas') or 0 for v in vehiculos], dtype=np.int64)[None, :]
+
+    factible = (cap_pasajeros >= req_pasajeros) & (cap_carga >= req_carga) & ((caract & req_caract) == req_caract)
+    return np.where(factible, costo, INFACTIBLE)
+
+
+def costo_conductores(vehiculos, conductores):
+    """Matriz (vehículos x conductores): distancia del conductor al vehículo, habilitación y bono preferente."""
+    distancia = matriz_distancias_km(
+        coordenadas([v['ubicacion_actual_lat'] for v in vehiculos]),
+        coordenadas([v['ubicacion_actual_lon'] for v in vehiculos]),
+        coordenadas([c['ubicacion_actual_lat'] for c in conductores]),
+        coordenadas([c['ubicacion_actual_lon'] for c in conductores]),
+    )
+    costo = np.where(np.isnan(distancia), DISTANCIA_DESCONOCIDA_KM, distancia)
+
+    preferente = np.array([v['conductor_preferente_id'] or -1 for v in vehiculos])[:, None]
+    ids_conductores = np.array([c['id'] for c in conductores])[None, :]
+    costo = costo - np.where(preferente == ids_conductores, BONO_CONDUCTOR_PREFERENTE, 0.0)
+
+    # Matriz booleana (conductores x TIPOS_VEHICULO) más una columna en False para tipos desconocidos;
+    # la columna de cada vehículo dice qué conductores lo pueden manejar
+    tipos = np.array([c['tipos'] for c in conductores], dtype=bool).reshape(len(conductores), len(TIPOS_VEHICULO))
+    tipos = np.hstack([tipos, np.zeros((len(conductores), 1), dtype=bool)])
+    # Un conductor sin tipos registrados se considera habilitado para cualquiera (datos antiguos)
+    tipos = tipos | ~tipos.any(axis=1, keepdims=True)
+    columnas = np.array([INDICE_TIPO.get(v['tipo_vehiculo'], len(TIPOS_VEHICULO)) for v in vehiculos], dtype=int)
+    habilitado = tipos[:, columnas].T
+    return np.where(habilitado, costo, INFACTIBLE)
+
+
+def _cargar_datos():
+    solicitudes = list(
+        Asignacion.objects.filter(estado='pendiente_auto')
+        .order_by('fecha_hora_requerida_inicio', 'id')
+        .values('id', 'origen_lat', 'origen_lon', 'req_pasajeros', 'req_carga_kg', 'req_tipo_vehiculo_preferente',
+                'req_caracteristicas', 'destino_lat', 'destino_lon', 'tipo_servicio',
+                'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista')
+    )
+    # Toda la flota: una solicitud sólo falla si ningún vehículo podría atenderla nunca
+    vehiculos = list(
+        Vehiculo.objects.values('id', 'estado', 'tipo_vehiculo', 'capacidad_pasajeros', 'capacidad_carga_kg',
+                                'caracteristicas', 'ubicacion_actual_lat', 'ubicacion_actual_lon',
+                                'conductor_preferente_id')
+    )
+    activos = Conductor.objects.filter(activo=True, estado_disponibilidad__in=ESTADOS_CONDUCTOR)
+    conductores = list(activos.values('id', 'ubicacion_actual_lat', 'ubicacion_actual_lon'))
+    marcar_habilitaciones(conductores, activos)
+    reservas = []
+    if solicitudes:
+        # Una solicitud asignable dura a lo sumo DURACION_MAXIMA
+        desde = solicitudes[0]['fecha_hora_requerida_inicio']
+        hasta = max(s['fecha_hora_requerida_inicio'] for s in solicitudes) + DURACION_MAXIMA
+        reservas = [
+            {'vehiculo_id': vehiculo_id, 'conductor_id': conductor_id, 'inicio': inicio,
+             'fin': fin_efectivo(inicio, fin)}
+            for vehiculo_id, conductor_id, inicio, fin in reservas_en_ventana(desde, hasta).values_list(
+                'vehiculo_id', 'conductor_id', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista')
+        ]
+    return solicitudes, vehiculos, conductores, reservas
+
+
+def marcar_habilitaciones(conductores, queryset):
+    """Agrega a cada conductor (dict) 'tipos': un bool por TIPOS_VEHICULO, con una sola consulta sobre 'queryset'."""
+    posicion = {c['id']: i for i, c in enumerate(conductores)}
+    for c in conductores:
+        c['tipos'] = [False] * len(TIPOS_VEHICULO)
+    habilitaciones = HabilitacionConductor.objects.filter(conductor__in=queryset).values_list('conductor_id', 'tipo_vehiculo')
+    for conductor_id, tipo in habilitaciones:
+        if conductor_id in posicion and tipo in INDICE_TIPO:
+            conductores[posicion[conductor_id]]['tipos'][INDICE_TIPO[tipo]] = True
+
+
+def duraciones(solicitudes, vehiculos):
+    """Matriz (solicitudes x vehículos) de minutos de servicio: el fin previsto o la ETA con el tipo de cada vehículo."""
+    por_tipo = np.hstack([
+        eta.duraciones_por_tipo(solicitudes, TIPOS_VEHICULO, DURACION_POR_DEFECTO),
+        np.full((len(solicitudes), 1), DURACION_POR_DEFECTO.total_seconds() / 60),   # Tipos desconocidos
+    ])
+    return por_tipo[:, [INDICE_TIPO.get(v['tipo_vehiculo'], len(TIPOS_VEHICULO)) for v in vehiculos]]
+
+
+def _ocupados(inicio, fin, reservas, campo, recursos):
+    """
+    Matriz (ventanas x recursos): True si el recurso tiene una reserva que se solapa con la ventana.
+    'inicio' e 'fin' son minutos (una fila por ventana, o una columna por recurso en 'fin').
+    """
+    inicio = np.asarray(inicio, dtype=float).reshape(-1, 1)
+    fin = np.broadcast_to(np.asarray(fin, dtype=float).reshape(len(inicio), -1), (len(inicio), len(recursos)))
+    ocupado = np.zeros((len(inicio), len(recursos)), dtype=bool)
+    posicion = {r['id']: j for j, r in enumerate(recursos)}
+    for reserva in reservas:
+        j = posicion.get(reserva[campo])
+        if j is not None:
+            ocupado[:, j] |= (reserva['inicio_min'] < fin[:, j]) & (reserva['fin_min'] > inicio[:, 0])
+    return ocupado
+
+
+def resolver(solicitudes, vehiculos, conductores, reservas=(), duracion=None):
+    """
+    Resuelve el emparejamiento sin tocar la base de datos.
+    Devuelve (pares, sin_vehiculo_factible) donde pares es una lista de
+    (indice_solicitud, indice_vehiculo, indice_conductor). sin_vehiculo_factible son las solicitudes
+    que ningún vehículo de 'vehiculos' puede atender (capacidad, características o duración),
+    ocupado o no; las demás sin par quedan para la siguiente ejecución.
+    """
+    if not solicitudes:
+        return [], []
+    if not vehiculos:
+        return [], list(range(len(solicitudes)))
+    if duracion is None:
+        duracion = duraciones(solicitudes, vehiculos)
+    costo_v = costo_vehiculos(solicitudes, vehiculos)
+    # Una reserva más larga que DURACION_MAXIMA no la vería conflictos.py: no se asigna
+    costo_v[duracion > DURACION_MAXIMA.total_seconds() / 60] = INFACTIBLE
+    sin_vehiculo_factible = [i for i in range(len(solicitudes)) if not (costo_v[i] < INFACTIBLE).any()]
+    if not conductores:
+        return [], sin_vehiculo_factible
+
+    # Minutos desde la primera solicitud, para comparar ventanas con NumPy
+    origen = solicitudes[0]['fecha_hora_requerida_inicio']
+    inicio = np.array([(s['fecha_hora_requerida_inicio'] - origen).total_seconds() / 60 for s in solicitudes])
+    reservas = [
+        {**r, 'inicio_min': (r['inicio'] - origen).total_seconds() / 60, 'fin_min': (r['fin'] - origen).total_seconds() / 60}
+        for r in reservas
+    ]
+    fin = inicio[:, None] + duracion
+    ocupado = _ocupados(inicio, fin, reservas, 'vehiculo_id', vehiculos)
+    ocupado |= np.array([v.get('estado') == 'mantenimiento' for v in vehiculos])[None, :]
+    costo_v = np.where(ocupado, INFACTIBLE, costo_v)
+
+    filas, cols = linear_sum_assignment(costo_v)
+    elegidos = [(s, v) for s, v in zip(filas, cols) if costo_v[s, v] < INFACTIBLE]
+    if not elegidos:
+        return [], sin_vehiculo_factible
+
+    costo_c = costo_conductores([vehiculos[v] for _, v in elegidos], conductores)
+    ocupado = _ocupados(
+        [inicio[s] for s, _ in elegidos], [fin[s, v] for s, v in elegidos], reservas, 'conductor_id', conductores
+    )
+    costo_c = np.where(ocupado, INFACTIBLE, costo_c)
+    filas_c, cols_c = linear_sum_assignment(costo_c)
+    pares = [
+        (elegidos[i][0], elegidos[i][1], c)
+        for i, c in zip(filas_c, cols_c) if costo_c[i, c] < INFACTIBLE
+    ]
+    return pares, sin_vehiculo_factible
+
+
+def asignar_pendientes():
+    """
+    Ejecuta el motor sobre todas las solicitudes 'pendiente_auto'.
+    Las que obtienen vehículo y conductor pasan a 'programada' (y el vehículo, si estaba
+    disponible, a 'reservado'); las que ningún vehículo de la flota puede atender pasan a
+    'fallo_auto' para revisión manual; el resto queda pendiente para la siguiente ejecución.
+    """
+    with transaction.atomic():
+        solicitudes, vehiculos, conductores, reservas = _cargar_datos()
+        duracion = duraciones(solicitudes, vehiculos) if solicitudes and vehiculos else None
+        pares, sin_vehiculo_factible = resolver(solicitudes, vehiculos, conductores, reservas, duracion)
+
+        programadas = [
+            Asignacion(
+                id=solicitudes[s]['id'],
+                vehiculo_id=vehiculos[v]['id'],
+                conductor_id=conductores[c]['id'],
+                estado='programada',
+                asignada_por_motor=True,
+                # Fin previsto con el tipo del vehículo elegido para las que no lo traían
+                fecha_hora_fin_prevista=solicitudes[s]['fecha_hora_fin_prevista'] or (
+                    solicitudes[s]['fecha_hora_requerida_inicio'] + timedelta(minutes=round(float(duracion[s, v]), 1))
+                ),
+            )
+            for s, v, c in pares
+        ]
+        fallidas = [solicitudes[s]['id'] for s in sin_vehiculo_factible]
+        # Un vehículo en uso mantiene su estado: la nueva reserva es para otro horario
+        reservados = [vehiculos[v]['id'] for _, v, _ in pares if vehiculos[v]['estado'] == 'disponible']
+        with estadisticas.seguimiento([a.id for a in programadas] + fallidas):
+            if programadas:
+                Asignacion.objects.bulk_update(
+                    programadas, ['vehiculo', 'conductor', 'estado', 'asignada_por_motor', 'fecha_hora_fin_prevista'],
+                    batch_size=500,
+                )
+            if reservados:
+                Vehiculo.objects.filter(id__in=reservados, estado='disponible').update(estado='reservado')
+                transaction.on_commit(lambda: incrementar_version(Vehiculo))
+            if fallidas:
+                Asignacion.objects.filter(id__in=fallidas).update(estado='fallo_auto')
+        if programadas or fallidas:
+            transaction.on_commit(lambda: incrementar_version(Asignacion))
+
+        eventos.publicar_al_confirmar('asignacion', [eventos.datos_asignacion(a) for a in programadas])
+        eventos.publicar_al_confirmar('asignacion', [
+            {'id': pk, 'estado': 'fallo_auto', 'vehiculo_id': None, 'conductor_id': None} for pk in fallidas
+        ])
+        eventos.publicar_al_confirmar('vehiculo', [{'id': pk, 'estado': 'reservado'} for pk in reservados])
+
+    return {
+        'asignadas': len(pares),
+        'fallidas': len(sin_vehiculo_factible),
+        'pendientes': len(solicitudes) - len(pares) - len(sin_vehiculo_factible),
+    }
@@ -0,0 +1,118 @@
+# asignaciones/services/caracteristicas.py
+"""
+Vocabulario controlado de características especiales de vehículos, codificado como máscara de bits.
+
+Los textos libres (Vehiculo.caracteristicas_adicionales y Asignacion.req_caracteristicas_especiales)
+se traducen con parsear() a un entero donde cada bit es una característica de CARACTERISTICAS; el
+modelo guarda ese entero en una columna indexada al guardar, igual que celda_geo.
+
+"El vehículo tiene todo lo que pide la solicitud" es (vehiculo & requeridas) == requeridas. Como el
+vocabulario es chico, las máscaras que cumplen eso son a lo más 2^len(CARACTERISTICAS) y se pueden
+enumerar (superconjuntos()), así que el filtro es un IN sobre el índice de la columna.
+"""
+import unicodedata
+
+# clave -> (etiqueta, sinónimos normalizados). El bit de cada una es su posición: sólo agregar al final.
+# Sin sinónimos sueltos ambiguos ("silla", "aire", "frio"...): "silla de bebé" no es una silla de ruedas.
+CARACTERISTICAS = {
+    'silla_ruedas': ('Silla de ruedas', ['silla de ruedas', 'silla ruedas', 'rampa', 'elevador', 'plataforma elevadora']),
+    'camilla': ('Camilla', ['camilla', 'paciente acostado']),
+    'oxigeno': ('Oxígeno', ['oxigeno', 'balon de oxigeno']),
+    'refrigerado': ('Refrigerado', ['refrigerado', 'refrigerada', 'refrigeracion', 'cadena de frio']),
+    'aire_acondicionado': ('Aire acondicionado', ['aire acondicionado', 'climatizado']),
+    'gps': ('GPS', ['gps']),
+    'traccion_4x4': ('Tracción 4x4', ['4x4', 'traccion 4x4']),
+}
+BITS = {clave: 1 << i for i, clave in enumerate(CARACTERISTICAS)}
+TODAS = (1 << len(CARACTERISTICAS)) - 1
+CHOICES = [(clave, etiqueta) for clave, (etiqueta, _) in CARACTERISTICAS.items()]
+SEPARADORES = ',;/\n+'
+NEGACIONES = {'sin', 'no', 'ni'}           # "sin aire acondicionado", "no requiere oxígeno"
+AFIRMACIONES = {'con', 'y', 'e', 'pero'}   # "sin camilla pero con oxígeno"
+
+
+def _normalizar(texto):
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return ' '.join(sin_tildes.lower().replace('_', ' ').split())
+
+
+_SINONIMOS = {
+    _normalizar(sinonimo): clave for clave, (_, sinonimos) in CARACTERISTICAS.items() for sinonimo in [clave, *sinonimos]
+}
+_MAX_PALABRAS = max(len(sinonimo.split()) for sinonimo in _SINONIMOS)
+
+
+def _menciones(palabras):
+    """(afirmadas, negadas): claves nombradas en el término, el sinónimo más largo primero."""
+    afirmadas, negadas = set(), set()
+    negado = False
+    i = 0
+    while i < len(palabras):
+        for largo in range(min(_MAX_PALABRAS, len(palabras) - i), 0, -1):
+            clave = _SINONIMOS.get(' '.join(palabras[i:i + largo]))
+            if clave is not None:
+                (negadas if negado else afirmadas).add(clave)
+                i += largo
+                break
+        else:
+            if palabras[i] in NEGACIONES:
+                negado = True
+            elif palabras[i] in AFIRMACIONES:
+                negado = False
+            i += 1
+    return afirmadas, negadas
+
+
+def parsear(texto):
+    """
+    (máscara, términos no reconocidos) de un texto como "Silla de ruedas, refrigerado".
+    Lo que va negado ("sin aire acondicionado", "no requiere oxígeno") no se incluye en la máscara.
+    """
+    texto = texto or ''
+    for separador in SEPARADORES:
+        texto = texto.replace(separador, ',')
+    mascara = 0
+    desconocidos = []
+    for termino in texto.split(','):
+        palabras = _normalizar(termino).split()
+        if not palabras:
+            continue
+        afirmadas, negadas = _menciones(palabras)
+        if not afirmadas and not negadas:
+            desconocidos.append(termino.strip())
+        for clave in afirmadas:
+            mascara |= BITS[clave]
+    return mascara, desconocidos
+
+
+def mascara_de(texto):
+    return parsear(texto)[0]
+
+
+def claves(mascara):
+    """Lista de claves de una máscara (en el orden del vocabulario)."""
+    return [clave for clave, bit in BITS.items() if mascara & bit]
+
+
+def mascara_de_claves(lista):
+    """Máscara de una lista de claves exactas. Lanza ValueError con las claves desconocidas."""
+    lista = list(lista)
+    desconocidas = [clave for clave in lista if clave not in BITS]
+    if desconocidas:
+        raise ValueError(desconocidas)
+    mascara = 0
+    for clave in lista:
+        mascara |= BITS[clave]
+    return mascara
+
+
+def superconjuntos(requeridas):
+    """Todas las máscaras que incluyen 'requeridas' (para filtrar con IN sobre el índice)."""
+    libres = TODAS & ~requeridas
+    resultado = []
+    subconjunto = libres
+    while True:  # Recorre los subconjuntos de 'libres' (truco de (s - 1) & libres)
+        resultado.append(requeridas | subconjunto)
+        if subconjunto == 0:
+            return resultado
+        subconjunto = (subconjunto - 1) & libres
@@ -0,0 +1,178 @@
+# asignaciones/services/carga_masiva.py
+"""
+Creación/actualización masiva de asignaciones (importación de la planificación nocturna).
+
+Todo el lote se valida con las reglas de AsignacionSerializer y se escribe en una sola
+transacción: los vehículos y conductores referenciados se leen con una consulta por modelo
+y las filas se insertan/actualizan con bulk_create/bulk_update. Si algún elemento es inválido
+no se escribe nada y se devuelven los errores por índice.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .. import eventos
+from ..cache import incrementar_version
+from ..models import Asignacion
+from ..serializers import AsignacionSerializer, ESTADOS_CON_RESERVA, NOMBRES_RECURSO, datos_eta
+from . import estadisticas, eta
+from .conflictos import conflictos_de_lote, excede_duracion_maxima, mensaje_duracion_maxima
+
+MAX_ELEMENTOS = 1000
+TAMANO_LOTE_SQL = 500
+
+
+def _precargar(items):
+    campos = AsignacionSerializer().fields
+    precargados = {}
+    for nombre in ('vehiculo_id', 'conductor_id'):
+        ids = set()
+        for item in items:
+            valor = item.get(nombre)
+            if valor is not None and not isinstance(valor, bool) and str(valor).isdigit():
+                ids.add(int(valor))
+        queryset = campos[nombre].get_queryset()
+        precargados[queryset.model] = queryset.in_bulk(ids) if ids else {}
+    return precargados
+
+
+def _validar(items, instancias, context):
+    validos, errores = [], []
+    for indice, item in enumerate(items):
+        instancia = None
+        if instancias is not None:
+            instancia = instancias.get(item.get('id'))
+            if instancia is None:
+                errores.append({'indice': indice, 'errores': {'id': ['No existe una asignación con ese id.']}})
+                continue
+        serializer = AsignacionSerializer(instancia, data=item, partial=instancia is not None, context=context)
+        if serializer.is_valid():
+            validos.append((indice, instancia, serializer.validated_data))
+        else:
+            errores.append({'indice': indice, 'errores': serializer.errors})
+    return validos, errores
+
+
+def _valor_final(instancia, datos, campo, por_defecto=None):
+    if campo in datos:
+        return datos[campo]
+    return getattr(instancia, campo, por_defecto)
+
+
+def _estimar_fines(validos):
+    """Completa fecha_hora_fin_prevista de todo el lote con una sola estimación vectorizada."""
+    sin_fin = [
+        (instancia, datos) for _, instancia, datos in validos
+        if _valor_final(instancia, datos, 'fecha_hora_fin_prevista') is None
+    ]
+    if not sin_fin:
+        return
+    ahora = timezone.now()
+    filas = [
+        {'inicio': _valor_final(instancia, datos, 'fecha_hora_requerida_inicio') or ahora, **datos_eta(datos, instancia)}
+        for instancia, datos in sin_fin
+    ]
+    for (_, datos), fin in zip(sin_fin, eta.estimar_fines(filas)):
+        if fin is not None:
+            datos['fecha_hora_fin_prevista'] = fin
+
+
+def _errores_de_duracion(validos):
+    """Los fines estimados por lote no pasaron por la validación de duración del serializer."""
+    ahora = timezone.now()
+    return [
+        {'indice': indice, 'errores': {'fecha_hora_fin_prevista': [mensaje_duracion_maxima()]}}
+        for indice, instancia, datos in validos
+        if excede_duracion_maxima(
+            _valor_final(instancia, datos, 'fecha_hora_requerida_inicio') or ahora,
+            _valor_final(instancia, datos, 'fecha_hora_fin_prevista'),
+        )
+    ]
+
+
+def _errores_de_conflicto(validos):
+    """Verifica los choques de horario de todo el lote con una consulta por tipo de recurso."""
+    reservas = []
+    ahora = timezone.now()
+    for indice, instancia, datos in validos:
+        if _valor_final(instancia, datos, 'estado', 'pendiente_auto') not in ESTADOS_CON_RESERVA:
+            continue
+        vehiculo = _valor_final(instancia, datos, 'vehiculo')
+        conductor = _valor_final(instancia, datos, 'conductor')
+        if vehiculo is None and conductor is None:
+            continue
+        reservas.append({
+            'clave': indice,
+            'pk': getattr(instancia, 'pk', None),
+            'inicio': _valor_final(instancia, datos, 'fecha_hora_requerida_inicio') or ahora,
+            'fin': _valor_final(instancia, datos, 'fecha_hora_fin_prevista'),
+            'vehiculo_id': vehiculo.pk if vehiculo else None,
+            'conductor_id': conductor.pk if conductor else None,
+        })
+
+    errores = []
+    for indice, conflictos in sorted(conflictos_de_lote(reservas).items()):
+        detalle = {}
+        for conflicto in conflictos:
+            origen, clave = conflicto['otra']
+            referencia = f"asignación {clave}" if origen == 'bd' else f"elemento {clave} del lote"
+            detalle.setdefault(f"{conflicto['recurso']}_id", [
+                f"El {NOMBRES_RECURSO[conflicto['recurso']]} ya está reservado en ese horario ({referencia})."
+            ])
+        errores.append({'indice': indice, 'errores': detalle})
+    return errores
+
+
+def procesar_lote(items, actualizar=False, context=None):
+    """
+    Crea (o actualiza, si actualizar=True y cada elemento trae 'id') todas las asignaciones de 'items'.
+    Devuelve (asignaciones, errores); si hay errores la lista de asignaciones viene vacía y no se escribió nada.
+    """
+    context = dict(context or {})
+    context['precargados'] = _precargar(items)
+    context['verificar_conflictos'] = False
+    context['estimar_fin'] = False
+
+    with transaction.atomic():
+        instancias = None
+        if actualizar:
+            ids = [item.get('id') for item in items if isinstance(item.get('id'), int)]
+            instancias = Asignacion.objects.select_related('vehiculo', 'conductor').in_bulk(ids)
+
+        validos, errores = _validar(items, instancias, context)
+        _estimar_fines(validos)
+        errores += _errores_de_duracion(validos)
+        errores += _errores_de_conflicto(validos)
+        if errores:
+            return [], sorted(errores, key=lambda e: e['indice'])
+
+        if not actualizar:
+            objetos = [Asignacion(**datos) for _, _, datos in validos]
+            for objeto in objetos:
+                objeto.actualizar_mascara()
+            Asignacion.objects.bulk_create(objetos, batch_size=TAMANO_LOTE_SQL)
+            transaction.on_commit(lambda: incrementar_version(Asignacion))
+            estadisticas.aplicar(estadisticas.diferencia([], [estadisticas.fila_de(o) for o in objetos]))
+            eventos.publicar_al_confirmar('asignacion', [eventos.datos_asignacion(o) for o in objetos])
+            return objetos, []
+
+        campos = set()
+        objetos = []
+        # bulk_update no dispara señales: los rollups se ajustan con el antes/después de cada instancia
+        antes = [estadisticas.fila_de(instancia) for _, instancia, _ in validos]
+        for _, instancia, datos in validos:
+            for campo, valor in datos.items():
+                setattr(instancia, campo, valor)
+            campos.update(datos.keys())
+            objetos.append(instancia)
+        if Asignacion.campo_texto in campos:
+            for objeto in objetos:
+                objeto.actualizar_mascara()
+            campos.add(Asignacion.campo_mascara)
+        if campos:
+            Asignacion.objects.bulk_update(objetos, sorted(campos), batch_size=TAMANO_LOTE_SQL)
+            transaction.on_commit(lambda: incrementar_version(Asignacion))
+            estadisticas.aplicar(estadisticas.diferencia(antes, [estadisticas.fila_de(o) for o in objetos]))
+            eventos.publicar_al_confirmar('asignacion', [
+                eventos.datos_asignacion(o) for fila, o in zip(antes, objetos) if fila['estado'] != o.estado
+            ])
+        return objetos, []
@@ -0,0 +1,52 @@
+# asignaciones/services/cercania.py
+"""Búsqueda de los vehículos/conductores más cercanos usando el índice de grilla 'celda_geo'."""
+from django.db.models import Q
+
+from .geo import haversine_km, rangos_celdas
+
+RADIO_INICIAL_KM = 5.0
+RADIO_MAXIMO_KM = 320.0
+
+
+def _filtro_celdas(lat, lon, radio_km):
+    filtro = Q()
+    for desde, hasta in rangos_celdas(lat, lon, radio_km):
+        filtro |= Q(celda_geo__range=(desde, hasta))
+    return filtro
+
+
+def _candidatos(queryset, lat, lon, radio_km):
+    filas = list(
+        queryset.filter(_filtro_celdas(lat, lon, radio_km))
+        .values_list('id', 'ubicacion_actual_lat', 'ubicacion_actual_lon')
+    )
+    if not filas:
+        return []
+    ids, lats, lons = zip(*filas)
+    distancias = haversine_km(lat, lon, lats, lons)
+    return sorted(
+        ((d, pk) for pk, d in zip(ids, distancias.tolist()) if d <= radio_km),
+        key=lambda x: x[0],
+    )
+
+
+def buscar_cercanos(queryset, lat, lon, k=10, radio_km=None):
+    """
+    Devuelve una lista de (objeto, distancia_km) con los k elementos más cercanos a (lat, lon).
+
+    Si no se indica radio_km, el radio se duplica desde RADIO_INICIAL_KM hasta encontrar k
+    candidatos (o llegar a RADIO_MAXIMO_KM). Sólo se leen las celdas de la grilla que cubren el
+    radio, nunca la tabla completa.
+    """
+    if radio_km is not None:
+        encontrados = _candidatos(queryset, lat, lon, radio_km)
+    else:
+        radio = RADIO_INICIAL_KM
+        while True:
+            encontrados = _candidatos(queryset, lat, lon, radio)
+            if len(encontrados) >= k or radio >= RADIO_MAXIMO_KM:
+                break
+            radio *= 2
+    encontrados = encontrados[:k]
+    objetos = queryset.in_bulk([pk for _, pk in encontrados])
+    return [(objetos[pk], round(d, 3)) for d, pk in encontrados if pk in objetos]
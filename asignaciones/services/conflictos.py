@@ -0,0 +1,146 @@
+# asignaciones/services/conflictos.py
+"""
+Detección de choques de horario para vehículos y conductores.
+
+Las consultas se acotan por rango sobre los índices compuestos (vehiculo, inicio, fin) y
+(conductor, inicio, fin): una reserva que termina después de 'inicio' no puede haber empezado
+antes de 'inicio - DURACION_MAXIMA', así que sólo se recorre esa ventana del índice en vez
+de todo el historial del recurso. Para que esa cota sea cierta, el serializer y la carga masiva
+rechazan las asignaciones que duran más que DURACION_MAXIMA (excede_duracion_maxima()).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+
+from ..models import Asignacion
+
+ESTADOS_QUE_OCUPAN = ['programada', 'activa']
+DURACION_POR_DEFECTO = timedelta(minutes=getattr(settings, 'ASIGNACIONES_DURACION_POR_DEFECTO_MIN', 60))
+DURACION_MAXIMA = timedelta(hours=getattr(settings, 'ASIGNACIONES_DURACION_MAXIMA_HORAS', 24))
+
+RECURSOS = ('vehiculo', 'conductor')
+
+
+def fin_efectivo(inicio, fin):
+    """Las asignaciones sin fin previsto se consideran de DURACION_POR_DEFECTO."""
+    return fin or inicio + DURACION_POR_DEFECTO
+
+
+def excede_duracion_maxima(inicio, fin):
+    """True si [inicio, fin) dura más que DURACION_MAXIMA; reservas_en_ventana() no la encontraría."""
+    return inicio is not None and fin is not None and fin - inicio > DURACION_MAXIMA
+
+
+def mensaje_duracion_maxima():
+    horas = DURACION_MAXIMA.total_seconds() / 3600
+    return f"Una asignación no puede durar más de {horas:g} horas; divídala en varias asignaciones."
+
+
+def reservas_en_ventana(desde, hasta):
+    """Reservas que pueden solaparse con [desde, hasta) (las que terminan antes de 'desde' se descartan después)."""
+    return Asignacion.objects.filter(
+        estado__in=ESTADOS_QUE_OCUPAN,
+        fecha_hora_requerida_inicio__lt=hasta,
+        fecha_hora_requerida_inicio__gt=desde - DURACION_MAXIMA,
+    )
+
+
+def buscar_conflictos(inicio, fin=None, vehiculo_id=None, conductor_id=None, excluir_id=None):
+    """
+    Devuelve las reservas del vehículo y/o conductor que se solapan con [inicio, fin).
+    Cada elemento es un dict con 'recurso', 'asignacion_id', 'inicio' y 'fin'.
+    """
+    fin = fin_efectivo(inicio, fin)
+    conflictos = []
+    for recurso, recurso_id in (('vehiculo', vehiculo_id), ('conductor', conductor_id)):
+        if recurso_id is None:
+            continue
+        reservas = reservas_en_ventana(inicio, fin).filter(**{f'{recurso}_id': recurso_id})
+        if excluir_id is not None:
+            reservas = reservas.exclude(pk=excluir_id)
+        for pk, otro_inicio, otro_fin in reservas.values_list('id', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista'):
+            otro_fin = fin_efectivo(otro_inicio, otro_fin)
+            if otro_fin > inicio:
+                conflictos.append({'recurso': recurso, 'asignacion_id': pk, 'inicio': otro_inicio, 'fin': otro_fin})
+    return conflictos
+
+
+def solapamientos(intervalos):
+    """
+    Barrido lineal sobre intervalos (recurso_id, inicio, fin, clave) ya ordenados por (recurso_id, inicio).
+    Genera (recurso_id, clave_anterior, clave, solapamiento_inicio, solapamiento_fin) por cada par solapado.
+    """
+    recurso_actual = None
+    abiertas = []  # (fin, clave) de los intervalos del recurso actual que aún no terminan
+    for recurso_id, inicio, fin, clave in intervalos:
+        if recurso_id != recurso_actual:
+            recurso_actual, abiertas = recurso_id, []
+        abiertas = [(otro_fin, otra_clave) for otro_fin, otra_clave in abiertas if otro_fin > inicio]
+        for otro_fin, otra_clave in abiertas:
+            yield recurso_id, otra_clave, clave, inicio, min(fin, otro_fin)
+        abiertas.append((fin, clave))
+
+
+def detectar_conflictos(desde, hasta):
+    """
+    Reporte de todos los pares de reservas solapadas entre 'desde' y 'hasta'.
+    Una consulta por tipo de recurso, ordenada por (recurso, inicio), y un barrido lineal.
+    """
+    reporte = []
+    for recurso in RECURSOS:
+        filas = (
+            reservas_en_ventana(desde, hasta)
+            .filter(**{f'{recurso}__isnull': False})
+            .order_by(f'{recurso}_id', 'fecha_hora_requerida_inicio')
+            .values_list(f'{recurso}_id', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista', 'id')
+        )
+        intervalos = (
+            (recurso_id, inicio, fin_efectivo(inicio, fin), pk)
+            for recurso_id, inicio, fin, pk in filas.iterator(chunk_size=2000)
+        )
+        for recurso_id, pk_a, pk_b, inicio, fin in solapamientos(intervalos):
+            if fin > desde:
+                reporte.append({
+                    'recurso': recurso,
+                    'recurso_id': recurso_id,
+                    'asignaciones': [pk_a, pk_b],
+                    'solapamiento_inicio': inicio,
+                    'solapamiento_fin': fin,
+                })
+    return reporte
+
+
+def conflictos_de_lote(reservas):
+    """
+    Choques para un lote de reservas nuevas, entre sí y contra las ya guardadas.
+    'reservas' es una lista de dicts con 'clave', 'inicio', 'fin', 'vehiculo_id', 'conductor_id'
+    y opcionalmente 'pk' (si la reserva reemplaza a una fila existente).
+    Hace una consulta por tipo de recurso para todo el lote y devuelve {clave: [conflicto, ...]}.
+    """
+    resultado = {}
+    if not reservas:
+        return resultado
+    reemplazadas = [r['pk'] for r in reservas if r.get('pk') is not None]
+    for recurso in RECURSOS:
+        propias = [r for r in reservas if r.get(f'{recurso}_id') is not None]
+        if not propias:
+            continue
+        desde = min(r['inicio'] for r in propias)
+        hasta = max(fin_efectivo(r['inicio'], r['fin']) for r in propias)
+        guardadas = (
+            reservas_en_ventana(desde, hasta)
+            .filter(**{f'{recurso}_id__in': {r[f'{recurso}_id'] for r in propias}})
+            .exclude(pk__in=reemplazadas)
+            .values_list(f'{recurso}_id', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista', 'id')
+        )
+        intervalos = [
+            (recurso_id, inicio, fin_efectivo(inicio, fin), ('bd', pk)) for recurso_id, inicio, fin, pk in guardadas
+        ] + [
+            (r[f'{recurso}_id'], r['inicio'], fin_efectivo(r['inicio'], r['fin']), ('lote', r['clave'])) for r in propias
+        ]
+        intervalos.sort(key=lambda x: (x[0], x[1]))
+        for _, a, b, _, _ in solapamientos(intervalos):
+            for propia, otra in ((a, b), (b, a)):
+                if propia[0] == 'lote':
+                    resultado.setdefault(propia[1], []).append({'recurso': recurso, 'otra': otra})
+    return resultado
@@ -0,0 +1,68 @@
+# asignaciones/services/disponibilidad.py
+"""
+Calendario libre/ocupado de vehículos o conductores en una ventana de tiempo.
+
+Una sola consulta por rango (sobre el índice (recurso, inicio, fin), como en conflictos.py) trae
+las reservas 'programada' y 'activa' de todos los recursos pedidos, ordenadas por (recurso,
+inicio). Un barrido lineal las funde en bloques ocupados y los huecos entre bloques son las
+franjas libres, así que el costo no depende de cuántos recursos haya. La ventana del índice
+empieza DURACION_MAXIMA antes de 'desde', igual que en conflictos.py: ninguna reserva dura más.
+"""
+from datetime import timedelta
+
+from .conflictos import fin_efectivo, reservas_en_ventana
+
+
+def bloques_ocupados(intervalos, desde, hasta):
+    """
+    Barrido sobre intervalos (recurso_id, inicio, fin, clave) ordenados por (recurso_id, inicio).
+    Devuelve {recurso_id: [[inicio, fin, [claves]], ...]} con los intervalos solapados o contiguos
+    fundidos en un bloque y recortados a [desde, hasta).
+    """
+    bloques = {}
+    for recurso_id, inicio, fin, clave in intervalos:
+        if fin <= desde or inicio >= hasta:
+            continue
+        inicio, fin = max(inicio, desde), min(fin, hasta)
+        propios = bloques.setdefault(recurso_id, [])
+        if propios and inicio <= propios[-1][1]:
+            propios[-1][1] = max(propios[-1][1], fin)
+            propios[-1][2].append(clave)
+        else:
+            propios.append([inicio, fin, [clave]])
+    return bloques
+
+
+def franjas_libres(bloques, desde, hasta, minimo=timedelta(0)):
+    """Huecos de al menos 'minimo' entre los bloques ocupados (ordenados) dentro de [desde, hasta)."""
+    libres = []
+    cursor = desde
+    for inicio, fin, _ in bloques:
+        if inicio > cursor and inicio - cursor >= minimo:
+            libres.append((cursor, inicio))
+        cursor = max(cursor, fin)
+    if hasta > cursor and hasta - cursor >= minimo:
+        libres.append((cursor, hasta))
+    return libres
+
+
+def calendario(recurso, recursos, desde, hasta, minimo=timedelta(0)):
+    """
+    {recurso_id: (bloques ocupados, franjas libres)} para los 'vehiculo' o 'conductor' del queryset
+    'recursos' (que entra como subconsulta: una sola ida a la base de datos). Los recursos sin
+    reservas en la ventana no aparecen: están libres todo el rango.
+    """
+    filas = (
+        reservas_en_ventana(desde, hasta)
+        .filter(**{f'{recurso}__in': recursos.order_by().values('pk')})
+        .order_by(f'{recurso}_id', 'fecha_hora_requerida_inicio')
+        .values_list(f'{recurso}_id', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista', 'id')
+    )
+    intervalos = (
+        (recurso_id, inicio, fin_efectivo(inicio, fin), pk)
+        for recurso_id, inicio, fin, pk in filas.iterator(chunk_size=2000)
+    )
+    return {
+        recurso_id: (bloques, franjas_libres(bloques, desde, hasta, minimo))
+        for recurso_id, bloques in bloques_ocupados(intervalos, desde, hasta).items()
+    }
@@ -0,0 +1,155 @@
+# asignaciones/services/estadisticas.py
+"""
+Rollups diarios de uso de la flota (modelo EstadisticaDiaria).
+
+Cada asignación aporta a una fila (día, vehículo, tipo de servicio): 1 al total, 1 a completadas
+o canceladas según su estado, los minutos de servicio si está completada y los minutos de
+anticipación entre la solicitud y el inicio requerido. Al crear/modificar/borrar una asignación
+se aplica sólo la diferencia entre su aporte anterior y el nuevo, así que el dashboard lee
+O(días del rango) filas en lugar de recorrer toda la tabla de asignaciones.
+
+Los .save()/.delete() se registran con señales (signals.py). Los servicios que escriben con
+bulk_create/bulk_update/queryset.update() deben envolver la escritura en seguimiento().
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import Asignacion, EstadisticaDiaria
+
+CAMPOS = ('id', 'vehiculo_id', 'tipo_servicio', 'estado',
+          'fecha_hora_solicitud', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_real')
+CAMPOS_RELEVANTES = {'vehiculo', 'vehiculo_id', 'tipo_servicio', 'estado',
+                     'fecha_hora_solicitud', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_real'}
+METRICAS = ('total', 'completadas', 'canceladas', 'minutos_servicio', 'minutos_anticipacion')
+TAMANO_BLOQUE = 2000
+
+
+def _minutos(desde, hasta):
+    return max((hasta - desde).total_seconds() / 60, 0.0)
+
+
+def _dia(fecha_hora):
+    return timezone.localtime(fecha_hora).date() if timezone.is_aware(fecha_hora) else fecha_hora.date()
+
+
+def aporte(fila):
+    """(clave, métricas) con que una asignación (dict con CAMPOS) contribuye a los rollups."""
+    inicio = fila['fecha_hora_requerida_inicio']
+    clave = (_dia(inicio), fila['vehiculo_id'], fila['tipo_servicio'])
+    metricas = {'total': 1}
+    if fila['fecha_hora_solicitud']:
+        metricas['minutos_anticipacion'] = _minutos(fila['fecha_hora_solicitud'], inicio)
+    if fila['estado'] == 'completada':
+        metricas['completadas'] = 1
+        if fila['fecha_hora_fin_real']:
+            metricas['minutos_servicio'] = _minutos(inicio, fila['fecha_hora_fin_real'])
+    elif fila['estado'] == 'cancelada':
+        metricas['canceladas'] = 1
+    return clave, metricas
+
+
+def fila_de(asignacion):
+    return {campo: getattr(asignacion, campo) for campo in CAMPOS}
+
+
+def _nuevo_acumulado():
+    return defaultdict(lambda: dict.fromkeys(METRICAS, 0))
+
+
+def sumar(acumulado, filas, signo=1):
+    for fila in filas:
+        clave, metricas = aporte(fila)
+        for metrica, valor in metricas.items():
+            acumulado[clave][metrica] += signo * valor
+    return acumulado
+
+
+def diferencia(antes, despues):
+    """Deltas para pasar del aporte de las filas 'antes' al de las filas 'despues'."""
+    return sumar(sumar(_nuevo_acumulado(), antes, signo=-1), despues)
+
+
+def filas_de(ids):
+    ids = list(ids)
+    if not ids:
+        return []
+    return list(Asignacion.objects.filter(pk__in=ids).values(*CAMPOS))
+
+
+def aplicar(deltas):
+    """Suma los deltas {clave: {métrica: valor}} a las filas de rollup (creándolas si no existen)."""
+    for (fecha, vehiculo_id, tipo_servicio), metricas in deltas.items():
+        cambios = {m: v for m, v in metricas.items() if abs(v) > 1e-9}
+        if not cambios:
+            continue
+        filas = EstadisticaDiaria.objects.filter(fecha=fecha, vehiculo_id=vehiculo_id, tipo_servicio=tipo_servicio)
+        if not filas.update(**{m: F(m) + v for m, v in cambios.items()}):
+            EstadisticaDiaria.objects.create(fecha=fecha, vehiculo_id=vehiculo_id, tipo_servicio=tipo_servicio, **cambios)
+
+
+@contextmanager
+def seguimiento(ids=()):
+    """
+    Registra en los rollups los cambios que el bloque haga sobre las asignaciones 'ids'.
+    Devuelve el set de ids: las asignaciones creadas dentro del bloque se agregan a él.
+    """
+    ids = set(ids)
+    antes = filas_de(ids)
+    yield ids
+    aplicar(diferencia(antes, filas_de(ids)))
+
+
+def reconstruir(modelo_asignacion=Asignacion, modelo_estadistica=EstadisticaDiaria):
+    """
+    Recalcula todos los rollups desde la tabla de asignaciones. Devuelve la cantidad de filas creadas.
+    Los modelos se pueden pasar para usarlo desde una migración (apps.get_model).
+    """
+    with transaction.atomic():
+        modelo_estadistica.objects.all().delete()
+        filas = modelo_asignacion.objects.values(*CAMPOS).iterator(chunk_size=TAMANO_BLOQUE)
+        objetos = [
+            modelo_estadistica(fecha=fecha, vehiculo_id=vehiculo_id, tipo_servicio=tipo_servicio, **metricas)
+            for (fecha, vehiculo_id, tipo_servicio), metricas in sumar(_nuevo_acumulado(), filas).items()
+        ]
+        modelo_estadistica.objects.bulk_create(objetos, batch_size=500)
+    return len(objetos)
+
+
+def resumen(desde, hasta):
+    """Estadísticas por día y por vehículo entre las fechas 'desde' y 'hasta' (inclusive), leyendo sólo los rollups."""
+    filas = EstadisticaDiaria.objects.filter(fecha__range=(desde, hasta))
+    sumas = {f'suma_{m}': Sum(m) for m in METRICAS}
+
+    por_dia = {}
+    for fila in filas.values('fecha', 'tipo_servicio').annotate(**sumas).order_by('fecha', 'tipo_servicio'):
+        dia = por_dia.setdefault(fila['fecha'], {
+            'fecha': fila['fecha'], 'total': 0, 'completadas': 0, 'canceladas': 0,
+            'minutos_anticipacion': 0.0, 'por_tipo_servicio': {},
+        })
+        for metrica in ('total', 'completadas', 'canceladas', 'minutos_anticipacion'):
+            dia[metrica] += fila[f'suma_{metrica}']
+        if fila['suma_total']:
+            dia['por_tipo_servicio'][fila['tipo_servicio']] = fila['suma_total']
+    for dia in por_dia.values():
+        anticipacion = dia.pop('minutos_anticipacion')
+        dia['anticipacion_promedio_min'] = round(anticipacion / dia['total'], 1) if dia['total'] else None
+
+    minutos_rango = ((hasta - desde) + timedelta(days=1)).days * 24 * 60
+    por_vehiculo = [
+        {
+            'vehiculo_id': fila['vehiculo'],
+            'patente': fila['vehiculo__patente'],
+            'servicios': fila['suma_total'],
+            'completadas': fila['suma_completadas'],
+            'minutos_servicio': round(fila['suma_minutos_servicio'], 1),
+            'utilizacion': round(fila['suma_minutos_servicio'] / minutos_rango, 4),
+        }
+        for fila in filas.filter(vehiculo__isnull=False)
+        .values('vehiculo', 'vehiculo__patente').annotate(**sumas).order_by('-suma_minutos_servicio', 'vehiculo')
+    ]
+    return {'por_dia': [d for d in por_dia.values() if d['total']], 'por_vehiculo': por_vehiculo}
@@ -0,0 +1,141 @@
+# asignaciones/services/eta.py
+"""
+Estimación de la duración de un servicio y de fecha_hora_fin_prevista.
+
+duración = distancia de gran círculo * FACTOR_RUTA / (velocidad del tipo de vehículo * factor de la
+hora del día) + tiempo de detención del tipo de servicio. Todo es configurable en settings.
+
+La distancia se memoiza con lru_cache sobre las coordenadas redondeadas a DECIMALES_CACHE (~100 m):
+los orígenes y destinos se repiten mucho (hospitales, bodegas, consultorios). estimar_fines()
+resuelve muchas filas a la vez con NumPy (carga masiva, motor de asignación, planificación).
+"""
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import coordenadas, haversine_km
+
+FACTOR_RUTA = getattr(settings, 'ASIGNACIONES_ETA_FACTOR_RUTA', 1.3)   # Distancia por calles / en línea recta
+DECIMALES_CACHE = 3
+VELOCIDAD_POR_DEFECTO_KMH = 30.0
+VELOCIDADES_KMH = getattr(settings, 'ASIGNACIONES_ETA_VELOCIDADES_KMH', {
+    'auto_funcionario': 35.0,
+    'furgon_insumos': 30.0,
+    'ambulancia': 40.0,
+    'camioneta_grande': 30.0,
+    'camion_carga': 25.0,
+    'otro': VELOCIDAD_POR_DEFECTO_KMH,
+})
+# (hora desde, hora hasta, factor sobre la velocidad); las horas sin tramo usan 1.0
+FACTORES_HORARIO = getattr(settings, 'ASIGNACIONES_ETA_FACTORES_HORARIO', [
+    (7, 10, 0.7),    # Punta de la mañana
+    (17, 20, 0.7),   # Punta de la tarde
+    (22, 24, 1.2),
+    (0, 6, 1.2),
+])
+DETENCION_MIN = getattr(settings, 'ASIGNACIONES_ETA_DETENCION_MIN', {
+    'funcionarios': 5,
+    'insumos': 20,
+    'pacientes': 15,
+    'otro': 10,
+})
+
+_FACTOR_POR_HORA = np.ones(24)
+for _desde, _hasta, _factor in FACTORES_HORARIO:
+    _FACTOR_POR_HORA[_desde:_hasta] = _factor
+
+
+@lru_cache(maxsize=getattr(settings, 'ASIGNACIONES_ETA_CACHE', 65536))
+def _distancia_redondeada(origen_lat, origen_lon, destino_lat, destino_lon):
+    return float(haversine_km(origen_lat, origen_lon, destino_lat, destino_lon))
+
+
+def distancia_km(origen_lat, origen_lon, destino_lat, destino_lon):
+    """Distancia de gran círculo memoizada, o None si falta alguna coordenada."""
+    if None in (origen_lat, origen_lon, destino_lat, destino_lon):
+        return None
+    return _distancia_redondeada(*(round(v, DECIMALES_CACHE) for v in (origen_lat, origen_lon, destino_lat, destino_lon)))
+
+
+def _hora_local(fecha_hora):
+    return timezone.localtime(fecha_hora).hour if timezone.is_aware(fecha_hora) else fecha_hora.hour
+
+
+def duracion(origen_lat, origen_lon, destino_lat, destino_lon, inicio, tipo_vehiculo=None, tipo_servicio=None):
+    """timedelta estimado del servicio, o None si faltan coordenadas."""
+    distancia = distancia_km(origen_lat, origen_lon, destino_lat, destino_lon)
+    if distancia is None:
+        return None
+    velocidad = VELOCIDADES_KMH.get(tipo_vehiculo, VELOCIDAD_POR_DEFECTO_KMH) * _FACTOR_POR_HORA[_hora_local(inicio)]
+    minutos = distancia * FACTOR_RUTA / velocidad * 60 + DETENCION_MIN.get(tipo_servicio, 0)
+    return timedelta(minutes=round(float(minutos), 1))
+
+
+def estimar_fin(inicio, origen_lat, origen_lon, destino_lat, destino_lon, tipo_vehiculo=None, tipo_servicio=None):
+    if inicio is None:
+        return None
+    estimada = duracion(origen_lat, origen_lon, destino_lat, destino_lon, inicio, tipo_vehiculo, tipo_servicio)
+    return inicio + estimada if estimada is not None else None
+
+
+def estimar_fines(filas):
+    """
+    Versión vectorizada para muchas filas. Cada fila es un dict con 'inicio', 'origen_lat', 'origen_lon',
+    'destino_lat', 'destino_lon' y opcionalmente 'tipo_vehiculo' y 'tipo_servicio'.
+    Devuelve la lista de fines estimados (None donde faltan datos), en el mismo orden.
+    """
+    if not filas:
+        return []
+    # Mismo redondeo que distancia_km(), para que ambas versiones den el mismo resultado
+    distancia = haversine_km(*(
+        np.round(coordenadas([f[campo] for f in filas]), DECIMALES_CACHE)
+        for campo in ('origen_lat', 'origen_lon', 'destino_lat', 'destino_lon')
+    ))
+    horas = np.array([_hora_local(f['inicio']) if f['inicio'] else 0 for f in filas], dtype=int)
+    velocidad = np.array([VELOCIDADES_KMH.get(f.get('tipo_vehiculo'), VELOCIDAD_POR_DEFECTO_KMH) for f in filas]) * _FACTOR_POR_HORA[horas]
+    detencion = np.array([DETENCION_MIN.get(f.get('tipo_servicio'), 0) for f in filas], dtype=float)
+    minutos = np.round(distancia * FACTOR_RUTA / velocidad * 60 + detencion, 1)
+    return [
+        f['inicio'] + timedelta(minutes=float(m)) if f['inicio'] and not np.isnan(m) else None
+        for f, m in zip(filas, minutos)
+    ]
+
+
+def duraciones_por_tipo(solicitudes, tipos_vehiculo, por_defecto):
+    """
+    Matriz (solicitudes x tipos_vehiculo) de minutos de servicio. Las solicitudes con
+    'fecha_hora_fin_prevista' duran lo mismo con cualquier tipo; las demás, la ETA de cada tipo
+    (o 'por_defecto', un timedelta, si les faltan coordenadas).
+    """
+    duracion = np.full((len(solicitudes), len(tipos_vehiculo)), por_defecto.total_seconds() / 60)
+    sin_fin = []
+    for i, s in enumerate(solicitudes):
+        if s['fecha_hora_fin_prevista'] is None:
+            sin_fin.append(i)
+        else:
+            duracion[i, :] = max((s['fecha_hora_fin_prevista'] - s['fecha_hora_requerida_inicio']).total_seconds() / 60, 0.0)
+    for t, tipo in enumerate(tipos_vehiculo):
+        fines = estimar_fines([
+            {'inicio': s['fecha_hora_requerida_inicio'], 'origen_lat': s['origen_lat'], 'origen_lon': s['origen_lon'],
+             'destino_lat': s['destino_lat'], 'destino_lon': s['destino_lon'],
+             'tipo_vehiculo': tipo, 'tipo_servicio': s['tipo_servicio']}
+            for s in (solicitudes[i] for i in sin_fin)
+        ])
+        for i, fin in zip(sin_fin, fines):
+            if fin is not None:
+                duracion[i, t] = (fin - solicitudes[i]['fecha_hora_requerida_inicio']).total_seconds() / 60
+    return duracion
+
+
+def tabla_velocidades(tipos_vehiculo):
+    """Matriz (tipos x 24 horas) con la velocidad en km/h de cada tipo a cada hora local."""
+    base = np.array([VELOCIDADES_KMH.get(tipo, VELOCIDAD_POR_DEFECTO_KMH) for tipo in tipos_vehiculo], dtype=float)
+    return base[:, None] * _FACTOR_POR_HORA[None, :]
+
+
+def tipo_vehiculo_de(vehiculo, req_tipo_vehiculo_preferente=None):
+    """El tipo del vehículo asignado o, si aún no hay, el preferido por la solicitud."""
+    return vehiculo.tipo_vehiculo if vehiculo is not None else req_tipo_vehiculo_preferente
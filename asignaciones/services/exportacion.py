@@ -0,0 +1,65 @@
+# asignaciones/services/exportacion.py
+"""
+Exportación del historial de asignaciones en CSV o NDJSON (un objeto JSON por línea).
+
+Las filas se leen con values_list().iterator(chunk_size=...) y se emiten a medida que llegan,
+así que la memoria usada no depende de cuántas filas se exporten y los primeros bytes salen
+apenas responde la base de datos.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+TAMANO_BLOQUE = 2000
+
+COLUMNAS = [
+    'id', 'estado', 'tipo_servicio',
+    'fecha_hora_solicitud', 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista', 'fecha_hora_fin_real',
+    'vehiculo_id', 'vehiculo__patente', 'conductor_id', 'conductor__nombre', 'conductor__apellido',
+    'origen_descripcion', 'destino_descripcion', 'req_pasajeros', 'req_carga_kg', 'observaciones',
+]
+COLUMNAS_FECHA = {i for i, columna in enumerate(COLUMNAS) if columna.startswith('fecha_hora_')}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def _filas(queryset):
+    for fila in queryset.values_list(*COLUMNAS).iterator(chunk_size=TAMANO_BLOQUE):
+        fila = list(fila)
+        for i in COLUMNAS_FECHA:
+            if fila[i] is not None:
+                fila[i] = timezone.localtime(fila[i]).isoformat()
+        yield fila
+
+
+def _csv(queryset):
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM: Excel abre el archivo como UTF-8
+    yield escritor.writerow(COLUMNAS)
+    for fila in _filas(queryset):
+        yield escritor.writerow(fila)
+
+
+def _ndjson(queryset):
+    for fila in _filas(queryset):
+        yield json.dumps(dict(zip(COLUMNAS, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def exportar(queryset, formato):
+    """Generador de texto con el queryset en el formato pedido ('csv' o 'ndjson')."""
+    if formato == 'csv':
+        return _csv(queryset)
+    if formato == 'ndjson':
+        return _ndjson(queryset)
+    raise ValueError(f'Formato desconocido: {formato}')
@@ -0,0 +1,86 @@
+# asignaciones/services/fotos.py
+"""
+Variantes redimensionadas de las fotos de vehículos (miniatura del listado, vista previa y WebP).
+
+Se generan en segundo plano (tarea 'variantes_foto') al subir una foto y se guardan junto a los
+originales, en vehiculos_fotos/variantes/. El nombre de cada variante se deriva del nombre de
+la foto original, que Django no reutiliza al subir otra, así que sus URLs se pueden cachear
+indefinidamente (ver la acción 'foto' de VehiculoViewSet). Al reemplazar o quitar la foto se
+borran el original anterior y sus variantes (eliminar_foto()).
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from ..cache import incrementar_version
+from ..models import Vehiculo
+
+DIRECTORIO_VARIANTES = 'vehiculos_fotos/variantes'
+CALIDAD = 80
+
+# nombre -> (ancho máximo, alto máximo, formato de Pillow, extensión, content type)
+VARIANTES = {
+    'miniatura': (120, 120, 'JPEG', 'jpg', 'image/jpeg'),
+    'vista_previa': (480, 480, 'JPEG', 'jpg', 'image/jpeg'),
+    'webp': (1280, 1280, 'WEBP', 'webp', 'image/webp'),
+}
+
+
+def ruta_variante(nombre_foto, variante):
+    base = os.path.splitext(os.path.basename(nombre_foto))[0]
+    return f"{DIRECTORIO_VARIANTES}/{base}__{variante}.{VARIANTES[variante][3]}"
+
+
+def version_foto(nombre_foto):
+    """Token corto para las URLs: cambia cuando cambia la foto."""
+    return hashlib.sha1(nombre_foto.encode()).hexdigest()[:10]
+
+
+def _redimensionar(imagen, ancho, alto, formato):
+    copia = imagen.copy()
+    copia.thumbnail((ancho, alto), Image.LANCZOS)
+    salida = BytesIO()
+    copia.save(salida, formato, quality=CALIDAD, optimize=formato == 'JPEG')
+    return salida.getvalue()
+
+
+def generar_variantes(vehiculo_id):
+    """Genera (o regenera) las variantes de la foto actual del vehículo. Devuelve False si no tiene foto."""
+    vehiculo = Vehiculo.objects.filter(pk=vehiculo_id).only('id', 'foto').first()
+    if vehiculo is None or not vehiculo.foto:
+        return False
+
+    with vehiculo.foto.open('rb') as archivo:
+        imagen = ImageOps.exif_transpose(Image.open(archivo))
+        imagen = imagen.convert('RGB')
+    for variante, (ancho, alto, formato, _, _) in VARIANTES.items():
+        ruta = ruta_variante(vehiculo.foto.name, variante)
+        if default_storage.exists(ruta):
+            default_storage.delete(ruta)
+        default_storage.save(ruta, ContentFile(_redimensionar(imagen, ancho, alto, formato)))
+
+    # Sólo si la foto no cambió mientras se generaban; si cambió, estas variantes ya no sirven
+    if Vehiculo.objects.filter(pk=vehiculo_id, foto=vehiculo.foto.name).update(foto_variantes_generadas=True):
+        transaction.on_commit(lambda: incrementar_version(Vehiculo))
+    else:
+        _borrar_variantes(vehiculo.foto.name)
+    return True
+
+
+def _borrar_variantes(nombre_foto):
+    for variante in VARIANTES:
+        default_storage.delete(ruta_variante(nombre_foto, variante))
+
+
+def eliminar_foto(nombre_foto):
+    """Borra del almacenamiento una foto reemplazada y sus variantes, si ningún vehículo la usa."""
+    if not nombre_foto or Vehiculo.objects.filter(foto=nombre_foto).exists():
+        return False
+    _borrar_variantes(nombre_foto)
+    default_storage.delete(nombre_foto)
+    return True
@@ -0,0 +1,74 @@
+# asignaciones/services/geo.py
+import math
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO_LAT = 111.32
+
+# Índice espacial por grilla: cada celda mide CELDA_GRADOS x CELDA_GRADOS (~5,5 km en latitud).
+# La celda se codifica en un solo entero (fila * FACTOR_FILA + columna) para que todas las
+# celdas de una misma fila sean un rango contiguo y se puedan consultar con BETWEEN sobre el índice.
+# Las columnas dan la vuelta en el antimeridiano: lon 180 es la columna 0, igual que lon -180.
+CELDA_GRADOS = 0.05
+FACTOR_FILA = 10000
+COLUMNAS = round(360 / CELDA_GRADOS)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en km. Acepta escalares o arrays de NumPy (con broadcasting)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def matriz_distancias_km(lats_a, lons_a, lats_b, lons_b):
+    """Matriz (len(a), len(b)) de distancias haversine. Las coordenadas nulas quedan como NaN."""
+    lats_a = np.asarray(lats_a, dtype=float)[:, None]
+    lons_a = np.asarray(lons_a, dtype=float)[:, None]
+    lats_b = np.asarray(lats_b, dtype=float)[None, :]
+    lons_b = np.asarray(lons_b, dtype=float)[None, :]
+    return haversine_km(lats_a, lons_a, lats_b, lons_b)
+
+
+def coordenadas(valores):
+    """Convierte una lista de floats (o None) a un array con NaN en lugar de None."""
+    return np.array([np.nan if v is None else v for v in valores], dtype=float)
+
+
+def _fila_columna(lat, lon):
+    return int(math.floor((lat + 90.0) / CELDA_GRADOS)), int(math.floor((lon + 180.0) / CELDA_GRADOS)) % COLUMNAS
+
+
+def celda_para(lat, lon):
+    """Celda de la grilla para una coordenada, o None si falta alguna."""
+    if lat is None or lon is None:
+        return None
+    fila, columna = _fila_columna(lat, lon)
+    return fila * FACTOR_FILA + columna
+
+
+def rangos_celdas(lat, lon, radio_km):
+    """
+    Rangos (desde, hasta) de celdas que cubren el cuadrado circunscrito al círculo de radio_km.
+    Se devuelve un rango por fila de la grilla, o dos si el cuadrado cruza el antimeridiano.
+    """
+    dlat = radio_km / KM_POR_GRADO_LAT
+    dlon = radio_km / (KM_POR_GRADO_LAT * max(math.cos(math.radians(lat)), 0.01))
+    fila_min = _fila_columna(max(lat - dlat, -90.0), lon)[0]
+    fila_max = _fila_columna(min(lat + dlat, 90.0), lon)[0]
+    if 2 * dlon >= 360.0 - CELDA_GRADOS:
+        columnas = [(0, COLUMNAS - 1)]
+    else:
+        col_min, col_max = _fila_columna(lat, lon - dlon)[1], _fila_columna(lat, lon + dlon)[1]
+        if lon - dlon < -180.0 or lon + dlon >= 180.0:
+            columnas = [(col_min, COLUMNAS - 1), (0, col_max)]
+        else:
+            columnas = [(col_min, col_max)]
+    return [
+        (fila * FACTOR_FILA + desde, fila * FACTOR_FILA + hasta)
+        for fila in range(fila_min, fila_max + 1)
+        for desde, hasta in columnas
+    ]
@@ -0,0 +1,376 @@
+# asignaciones/services/planificacion.py
+"""
+Planificador por horizonte: arma la secuencia de servicios de cada vehículo para todas las
+solicitudes 'pendiente_auto', y las 'programada' que asignó el propio motor o planificador
+(asignada_por_motor), cuyo inicio requerido cae en [desde, hasta). Las programadas a mano no se
+replanifican: cuentan como reservas fijas de su vehículo y conductor.
+
+El motor de asignación automática le da un servicio a cada vehículo libre. Aquí un vehículo
+encadena varios servicios del horizonte, así que la misma demanda se cubre con menos vehículos
+y menos km en vacío. La búsqueda (construcción golosa + búsqueda local) está en rutas.py.
+
+1. Se cargan las solicitudes, los vehículos que no están en mantenimiento y los conductores
+   activos con sus habilitaciones. Las reservas que no entran en el plan (activas, fuera del
+   horizonte) fijan desde cuándo y desde dónde está libre cada recurso y hasta cuándo.
+2. Las solicitudes se reparten en zonas por una grilla gruesa de su origen, y cada zona recibe
+   los vehículos más cercanos en proporción a su demanda. Las zonas no comparten recursos y se
+   resuelven en paralelo con un ProcessPoolExecutor (con procesos=1, como en la simulación de la
+   API, todo se resuelve en el mismo proceso).
+3. Cada ruta recibe un conductor habilitado para el tipo de vehículo y libre durante toda la
+   ruta (emparejamiento húngaro, igual que el motor).
+4. Con aplicar=True las solicitudes de las rutas con conductor quedan 'programada' con su
+   vehículo, conductor y fin previsto; las 'programada' del motor que el plan no cubre vuelven a
+   'pendiente_auto'.
+"""
+import math
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .. import eventos
+from ..cache import incrementar_version
+from ..models import Vehiculo, Conductor, Asignacion
+from . import estadisticas, eta, rutas
+from .asignacion_automatica import (
+    INFACTIBLE, PENALIZACION_TIPO, BONO_CONDUCTOR_PREFERENTE, DISTANCIA_DESCONOCIDA_KM, TIPOS_VEHICULO, INDICE_TIPO,
+    ESTADOS_CONDUCTOR, costo_vehiculos, costo_conductores, marcar_habilitaciones,
+)
+from .conflictos import ESTADOS_QUE_OCUPAN, DURACION_MAXIMA, DURACION_POR_DEFECTO, fin_efectivo
+from .geo import matriz_distancias_km, coordenadas
+
+HORIZONTE = timedelta(hours=getattr(settings, 'ASIGNACIONES_PLAN_HORIZONTE_HORAS', 12))
+TIEMPO_LIMITE_S = getattr(settings, 'ASIGNACIONES_PLAN_TIEMPO_LIMITE_S', 10.0)
+PROCESOS = getattr(settings, 'ASIGNACIONES_PLAN_PROCESOS', os.cpu_count() or 1)
+TOLERANCIA_MIN = getattr(settings, 'ASIGNACIONES_PLAN_TOLERANCIA_MIN', 10)        # Atraso aceptado al llegar al origen
+COSTO_VEHICULO_KM = getattr(settings, 'ASIGNACIONES_PLAN_COSTO_VEHICULO_KM', 30.0)  # Cuánto "cuesta" usar un vehículo más
+ZONA_GRADOS = getattr(settings, 'ASIGNACIONES_PLAN_ZONA_GRADOS', 0.2)              # ~22 km en latitud
+MINIMO_POR_ZONA = 100   # Las zonas más chicas se juntan con la grande más cercana
+
+
+CAMPOS_SOLICITUD = (
+    'id', 'estado', 'vehiculo_id', 'conductor_id', 'origen_lat', 'origen_lon', 'destino_lat', 'destino_lon',
+    'req_pasajeros', 'req_carga_kg', 'req_tipo_vehiculo_preferente', 'req_caracteristicas', 'tipo_servicio',
+    'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista',
+)
+
+
+def _minutos(fecha_hora, origen):
+    return (fecha_hora - origen).total_seconds() / 60
+
+
+def _planificables(incluir_programadas=True):
+    # Las programadas a mano (por un despachador) no se mueven: entran como reservas fijas
+    filtro = Q(estado='pendiente_auto')
+    if incluir_programadas:
+        filtro |= Q(estado='programada', asignada_por_motor=True)
+    return filtro
+
+
+def _cargar_datos(desde, hasta, incluir_programadas):
+    solicitudes = list(
+        Asignacion.objects.filter(
+            _planificables(incluir_programadas),
+            fecha_hora_requerida_inicio__gte=desde, fecha_hora_requerida_inicio__lt=hasta,
+        ).order_by('fecha_hora_requerida_inicio', 'id').values(*CAMPOS_SOLICITUD)
+    )
+    vehiculos = list(
+        Vehiculo.objects.exclude(estado='mantenimiento')
+        .values('id', 'estado', 'tipo_vehiculo', 'capacidad_pasajeros', 'capacidad_carga_kg', 'caracteristicas',
+                'ubicacion_actual_lat', 'ubicacion_actual_lon', 'conductor_preferente_id')
+    )
+    activos = Conductor.objects.filter(activo=True, estado_disponibilidad__in=ESTADOS_CONDUCTOR)
+    conductores = list(activos.values('id', 'ubicacion_actual_lat', 'ubicacion_actual_lon'))
+    marcar_habilitaciones(conductores, activos)
+    # Reservas que siguen en pie con o sin plan: acotan la disponibilidad de los recursos
+    planificadas = {s['id'] for s in solicitudes}
+    reservas = [
+        r for r in Asignacion.objects.filter(
+            estado__in=ESTADOS_QUE_OCUPAN,
+            fecha_hora_requerida_inicio__gt=desde - DURACION_MAXIMA,
+            fecha_hora_requerida_inicio__lt=hasta + DURACION_MAXIMA,
+        ).values('id', 'vehiculo_id', 'conductor_id', 'destino_lat', 'destino_lon',
+                 'fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista')
+        if r['id'] not in planificadas
+    ]
+    return solicitudes, vehiculos, conductores, reservas
+
+
+def _disponibilidad(recursos, reservas, campo, origen):
+    """
+    Agrega a cada recurso 'libre_desde' y 'libre_hasta' (minutos desde 'origen') según las reservas fijas:
+    las que empezaron antes de 'origen' lo ocupan hasta su fin (y el vehículo queda en su destino);
+    las posteriores marcan hasta cuándo se puede usar.
+    """
+    posicion = {r['id']: i for i, r in enumerate(recursos)}
+    for r in recursos:
+        r['libre_desde'], r['libre_hasta'] = 0.0, math.inf
+    for reserva in reservas:
+        i = posicion.get(reserva[campo])
+        if i is None:
+            continue
+        recurso = recursos[i]
+        inicio = reserva['fecha_hora_requerida_inicio']
+        if inicio <= origen:
+            fin = _minutos(fin_efectivo(inicio, reserva['fecha_hora_fin_prevista']), origen)
+            if fin > recurso['libre_desde']:
+                recurso['libre_desde'] = fin
+                if campo == 'vehiculo_id' and reserva['destino_lat'] is not None:
+                    recurso['ubicacion_actual_lat'] = reserva['destino_lat']
+                    recurso['ubicacion_actual_lon'] = reserva['destino_lon']
+        else:
+            recurso['libre_hasta'] = min(recurso['libre_hasta'], _minutos(inicio, origen))
+
+
+def _zona(solicitud):
+    if solicitud['origen_lat'] is None or solicitud['origen_lon'] is None:
+        return None
+    return math.floor(solicitud['origen_lat'] / ZONA_GRADOS), math.floor(solicitud['origen_lon'] / ZONA_GRADOS)
+
+
+def _zonas(solicitudes, vehiculos, procesos):
+    """Reparte solicitudes y vehículos en zonas independientes: lista de (índices de solicitudes, índices de vehículos)."""
+    todas = [(list(range(len(solicitudes))), list(range(len(vehiculos))))]
+    if procesos <= 1 or len(solicitudes) < 2 * MINIMO_POR_ZONA:
+        return todas
+    grupos = defaultdict(list)
+    for i, s in enumerate(solicitudes):
+        grupos[_zona(s)].append(i)
+    grandes = [clave for clave, indices in grupos.items() if clave is not None and len(indices) >= MINIMO_POR_ZONA]
+    if len(grandes) < 2:
+        return todas
+
+    def centro(indices):
+        return (np.nanmean(coordenadas([solicitudes[i]['origen_lat'] for i in indices])),
+                np.nanmean(coordenadas([solicitudes[i]['origen_lon'] for i in indices])))
+
+    centros = np.array([centro(grupos[clave]) for clave in grandes])
+    zonas = {clave: list(grupos[clave]) for clave in grandes}
+    for clave, indices in grupos.items():
+        if clave in zonas:
+            continue
+        if clave is None:
+            destino = max(grandes, key=lambda c: len(zonas[c]))
+        else:
+            lat, lon = centro(indices)
+            destino = grandes[int(np.argmin(matriz_distancias_km([lat], [lon], centros[:, 0], centros[:, 1])[0]))]
+        zonas[destino].extend(indices)
+
+    # Cada zona recibe vehículos en proporción a su demanda, empezando por los más cercanos a su centro
+    distancia = matriz_distancias_km(
+        coordenadas([v['ubicacion_actual_lat'] for v in vehiculos]),
+        coordenadas([v['ubicacion_actual_lon'] for v in vehiculos]),
+        centros[:, 0], centros[:, 1],
+    )
+    distancia = np.where(np.isnan(distancia), DISTANCIA_DESCONOCIDA_KM, distancia)
+    cupos = [math.ceil(len(vehiculos) * len(zonas[clave]) / len(solicitudes)) for clave in grandes]
+    por_zona = [[] for _ in grandes]
+    asignados = set()
+    for plano in np.argsort(distancia, axis=None, kind='stable'):
+        v, z = divmod(int(plano), len(grandes))
+        if v not in asignados and len(por_zona[z]) < cupos[z]:
+            por_zona[z].append(v)
+            asignados.add(v)
+    return [(sorted(zonas[clave]), sorted(por_zona[z])) for z, clave in enumerate(grandes)]
+
+
+def _datos_zona(indices_s, indices_v, solicitudes, vehiculos, matrices, comun):
+    compatibles, penalizacion, duracion = matrices
+    posicion_v = {v: k for k, v in enumerate(indices_v)}
+    filas, columnas = np.ix_(indices_s, indices_v)
+    return {
+        **comun,
+        'inicio': [solicitudes[i]['inicio_min'] for i in indices_s],
+        'duracion': duracion[indices_s],
+        'origen': np.column_stack([coordenadas([solicitudes[i][c] for i in indices_s]) for c in ('origen_lat', 'origen_lon')]),
+        'destino': np.column_stack([coordenadas([solicitudes[i][c] for i in indices_s]) for c in ('destino_lat', 'destino_lon')]),
+        'compatibles': compatibles[filas, columnas],
+        'penalizacion': penalizacion[filas, columnas],
+        'semilla': [posicion_v.get(solicitudes[i]['semilla'], -1) for i in indices_s],
+        'tipo': [vehiculos[v]['indice_tipo'] for v in indices_v],
+        'posicion': np.column_stack([coordenadas([vehiculos[v][c] for v in indices_v]) for c in ('ubicacion_actual_lat', 'ubicacion_actual_lon')]),
+        'disponible_desde': [vehiculos[v]['libre_desde'] for v in indices_v],
+        'disponible_hasta': [vehiculos[v]['libre_hasta'] for v in indices_v],
+    }
+
+
+def _resolver_zonas(zonas, procesos):
+    if procesos <= 1 or len(zonas) <= 1:
+        return [rutas.resolver_zona(zona) for zona in zonas]
+    with ProcessPoolExecutor(max_workers=min(procesos, len(zonas))) as pool:
+        return list(pool.map(rutas.resolver_zona, zonas))
+
+
+def _asignar_conductores(plan, vehiculos, conductores):
+    """Un conductor por ruta: habilitado para el tipo y libre desde la salida hasta el fin de la ruta."""
+    if not plan or not conductores:
+        return [None] * len(plan)
+    costo = costo_conductores([vehiculos[ruta['vehiculo']] for ruta in plan], conductores)
+    salida = np.array([min(ruta['tiempos'][0][2], ruta['inicio']) for ruta in plan])[:, None]
+    fin = np.array([ruta['tiempos'][-1][1] for ruta in plan])[:, None]
+    libre_desde = np.array([c['libre_desde'] for c in conductores])[None, :]
+    libre_hasta = np.array([c['libre_hasta'] for c in conductores])[None, :]
+    costo = np.where((libre_desde <= salida) & (libre_hasta >= fin), costo, INFACTIBLE)
+    # Mantener al conductor que ya tenían las 'programada' de la ruta
+    ids_conductores = np.array([c['id'] for c in conductores])
+    for r, ruta in enumerate(plan):
+        actuales = [c for c in ruta['conductores_actuales'] if c]
+        if actuales:
+            costo[r] -= np.where(np.isin(ids_conductores, actuales) & (costo[r] < INFACTIBLE), BONO_CONDUCTOR_PREFERENTE, 0.0)
+    elegidos = [None] * len(plan)
+    for r, c in zip(*linear_sum_assignment(costo)):
+        if costo[r, c] < INFACTIBLE:
+            elegidos[r] = conductores[c]['id']
+    return elegidos
+
+
+def planificar(desde=None, hasta=None, tiempo_limite=None, procesos=None, aplicar=True, incluir_programadas=True):
+    """
+    Planifica el horizonte [desde, hasta) (por defecto, desde ahora y por HORIZONTE).
+    Devuelve un resumen con las rutas; con aplicar=False no escribe nada (simulación).
+    """
+    ahora = timezone.now()
+    desde = desde or ahora
+    hasta = hasta or desde + HORIZONTE
+    tiempo_limite = TIEMPO_LIMITE_S if tiempo_limite is None else tiempo_limite
+    procesos = PROCESOS if procesos is None else procesos
+    origen = max(desde, ahora)   # Minuto 0 del plan: no se puede salir antes de ahora
+
+    solicitudes, vehiculos, conductores, reservas = _cargar_datos(desde, hasta, incluir_programadas)
+    _disponibilidad(vehiculos, reservas, 'vehiculo_id', origen)
+    _disponibilidad(conductores, reservas, 'conductor_id', origen)
+    # Sólo sirven los vehículos de un tipo que algún conductor puede manejar (sin habilitaciones = cualquiera)
+    habilitados = set()
+    for c in conductores:
+        habilitados.update(TIPOS_VEHICULO if not any(c['tipos']) else [t for t, si in zip(TIPOS_VEHICULO, c['tipos']) if si])
+    vehiculos = [v for v in vehiculos if v['tipo_vehiculo'] in habilitados]
+    for v in vehiculos:
+        v['indice_tipo'] = INDICE_TIPO.get(v['tipo_vehiculo'], len(TIPOS_VEHICULO))
+    posicion_vehiculo = {v['id']: i for i, v in enumerate(vehiculos)}
+    for s in solicitudes:
+        s['inicio_min'] = _minutos(s['fecha_hora_requerida_inicio'], origen)
+        s['semilla'] = posicion_vehiculo.get(s['vehiculo_id']) if s['estado'] == 'programada' else None
+
+    resumen = {
+        'desde': desde, 'hasta': hasta, 'solicitudes': len(solicitudes), 'programadas': 0,
+        'sin_asignar': len(solicitudes), 'vehiculos': 0,
+        'vehiculos_antes': len({s['vehiculo_id'] for s in solicitudes if s['estado'] == 'programada' and s['vehiculo_id']}),
+        'km_vacios': 0.0, 'zonas': 0, 'costo_inicial': 0.0, 'costo_final': 0.0, 'aplicado': False, 'rutas': [],
+    }
+    if not solicitudes or not vehiculos:
+        return resumen
+
+    preferente = np.array([s['req_tipo_vehiculo_preferente'] or '' for s in solicitudes], dtype=object)[:, None]
+    tipos = np.array([v['tipo_vehiculo'] for v in vehiculos], dtype=object)[None, :]
+    penalizacion = np.where((preferente != '') & (preferente != tipos), PENALIZACION_TIPO, 0.0)
+    # Una columna extra para los tipos desconocidos, que usan la velocidad por defecto
+    duracion = np.hstack([eta.duraciones_por_tipo(solicitudes, TIPOS_VEHICULO, DURACION_POR_DEFECTO), np.full((len(solicitudes), 1), DURACION_POR_DEFECTO.total_seconds() / 60)])
+    # Una reserva más larga que DURACION_MAXIMA no la verían conflictos.py ni _cargar_datos(): no se asigna
+    compatibles = (costo_vehiculos(solicitudes, vehiculos) < INFACTIBLE) & (
+        duracion[:, [v['indice_tipo'] for v in vehiculos]] <= DURACION_MAXIMA.total_seconds() / 60
+    )
+    local = timezone.localtime(origen) if timezone.is_aware(origen) else origen
+    comun = {
+        'velocidad': eta.tabla_velocidades(TIPOS_VEHICULO + [None]),
+        'minuto_inicial': local.hour * 60 + local.minute + local.second / 60,
+        'factor_ruta': eta.FACTOR_RUTA,
+        'tolerancia': TOLERANCIA_MIN,
+        'costo_vehiculo': COSTO_VEHICULO_KM,
+    }
+    zonas = _zonas(solicitudes, vehiculos, procesos)
+    comun['tiempo_limite'] = tiempo_limite * min(1.0, procesos / len(zonas))
+    datos = [
+        _datos_zona(indices_s, indices_v, solicitudes, vehiculos, (compatibles, penalizacion, duracion), {**comun, 'semilla_azar': z})
+        for z, (indices_s, indices_v) in enumerate(zonas)
+    ]
+
+    plan = []
+    for (indices_s, indices_v), resultado in zip(zonas, _resolver_zonas(datos, procesos)):
+        resumen['costo_inicial'] += resultado['costo_inicial']
+        resumen['costo_final'] += resultado['costo_final']
+        for ruta in resultado['rutas']:
+            servicios = [indices_s[j] for j in ruta['servicios']]
+            plan.append({
+                'vehiculo': indices_v[ruta['vehiculo']],
+                'servicios': servicios,
+                'tiempos': ruta['tiempos'],
+                'km_vacios': ruta['km_vacios'],
+                'inicio': solicitudes[servicios[0]]['inicio_min'],
+                'conductores_actuales': [solicitudes[i]['conductor_id'] if solicitudes[i]['estado'] == 'programada' else None for i in servicios],
+            })
+    elegidos = _asignar_conductores(plan, vehiculos, conductores)
+
+    asignaciones = []
+    for ruta, conductor_id in zip(plan, elegidos):
+        if conductor_id is None:
+            continue
+        vehiculo = vehiculos[ruta['vehiculo']]
+        for i in ruta['servicios']:
+            s = solicitudes[i]
+            asignaciones.append(Asignacion(
+                id=s['id'], vehiculo_id=vehiculo['id'], conductor_id=conductor_id, estado='programada', asignada_por_motor=True,
+                fecha_hora_fin_prevista=s['fecha_hora_fin_prevista'] or (
+                    s['fecha_hora_requerida_inicio'] + timedelta(minutes=round(float(duracion[i, vehiculo['indice_tipo']]), 1))
+                ),
+            ))
+        resumen['rutas'].append({
+            'vehiculo_id': vehiculo['id'], 'conductor_id': conductor_id,
+            'asignaciones': [solicitudes[i]['id'] for i in ruta['servicios']], 'km_vacios': round(ruta['km_vacios'], 2),
+        })
+        resumen['km_vacios'] += ruta['km_vacios']
+    resumen.update(
+        programadas=len(asignaciones), sin_asignar=len(solicitudes) - len(asignaciones), vehiculos=len(resumen['rutas']),
+        km_vacios=round(resumen['km_vacios'], 2), zonas=len(zonas),
+        costo_inicial=round(resumen['costo_inicial'], 2), costo_final=round(resumen['costo_final'], 2),
+    )
+    if aplicar:
+        cubiertas = {a.id for a in asignaciones}
+        devueltas = [s for s in solicitudes if s['estado'] == 'programada' and s['id'] not in cubiertas]
+        _aplicar(asignaciones, devueltas)
+        resumen['aplicado'] = True
+    return resumen
+
+
+def _aplicar(asignaciones, devueltas):
+    """Escribe el plan. Se omiten las solicitudes que cambiaron de estado mientras se planificaba."""
+    with transaction.atomic():
+        ids = [a.id for a in asignaciones] + [s['id'] for s in devueltas]
+        vigentes = set(Asignacion.objects.filter(_planificables(), id__in=ids).values_list('id', flat=True))
+        asignaciones = [a for a in asignaciones if a.id in vigentes]
+        devueltas = [
+            Asignacion(id=s['id'], vehiculo_id=None, conductor_id=None, estado='pendiente_auto',
+                       asignada_por_motor=False, fecha_hora_fin_prevista=s['fecha_hora_fin_prevista'])
+            for s in devueltas if s['id'] in vigentes
+        ]
+        usados = {a.vehiculo_id for a in asignaciones}
+        anteriores = set(
+            Asignacion.objects.filter(id__in=vigentes, estado='programada').exclude(vehiculo=None).values_list('vehiculo_id', flat=True)
+        )
+        with estadisticas.seguimiento(vigentes):
+            Asignacion.objects.bulk_update(
+                asignaciones + devueltas, ['vehiculo', 'conductor', 'estado', 'asignada_por_motor', 'fecha_hora_fin_prevista'],
+                batch_size=500,
+            )
+        if asignaciones or devueltas:
+            transaction.on_commit(lambda: incrementar_version(Asignacion))
+        reservados = list(Vehiculo.objects.filter(id__in=usados, estado='disponible').values_list('id', flat=True))
+        Vehiculo.objects.filter(id__in=reservados).update(estado='reservado')
+        # Los vehículos que se quedaron sin ninguna reserva dejan de estar 'reservado'
+        ocupado = Asignacion.objects.filter(estado__in=ESTADOS_QUE_OCUPAN, vehiculo=OuterRef('pk'))
+        liberados = list(
+            Vehiculo.objects.filter(id__in=anteriores - usados, estado='reservado').exclude(Exists(ocupado)).values_list('id', flat=True)
+        )
+        Vehiculo.objects.filter(id__in=liberados).update(estado='disponible')
+        if reservados or liberados:
+            transaction.on_commit(lambda: incrementar_version(Vehiculo))
+
+        eventos.publicar_al_confirmar('asignacion', [eventos.datos_asignacion(a) for a in asignaciones + devueltas])
+        eventos.publicar_al_confirmar('vehiculo', [{'id': pk, 'estado': 'reservado'} for pk in reservados])
+        eventos.publicar_al_confirmar('vehiculo', [{'id': pk, 'estado': 'disponible'} for pk in liberados])
@@ -0,0 +1,186 @@
+# asignaciones/services/posiciones.py
+"""
+Ingesta de posiciones GPS de vehículos (por patente) y conductores (por número de licencia).
+
+Los pings no se escriben uno por uno: se guardan en un buffer en memoria del proceso que conserva
+sólo la posición más reciente de cada unidad, y cada ASIGNACIONES_GPS_INTERVALO_S segundos un
+temporizador vacía el buffer con un bulk_update por modelo en una sola transacción. Así cientos de
+unidades reportando cada pocos segundos se convierten en una escritura por intervalo y proceso.
+Con ASIGNACIONES_GPS_HISTORIAL = True además se agregan todos los pings a PosicionHistorica.
+
+Si el proceso termina se pierden a lo más los pings del último intervalo. Los pings con 'ts' en el
+futuro (más allá de ASIGNACIONES_GPS_TOLERANCIA_FUTURO_S, por relojes desfasados) se rechazan: como
+nunca se pisa una posición más nueva, uno solo bloquearía todos los pings reales posteriores.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .. import eventos
+from ..cache import incrementar_version
+from ..models import Vehiculo, Conductor, PosicionHistorica
+from .geo import celda_para
+
+INTERVALO_VACIADO = getattr(settings, 'ASIGNACIONES_GPS_INTERVALO_S', 5)
+GUARDAR_HISTORIAL = getattr(settings, 'ASIGNACIONES_GPS_HISTORIAL', False)
+TOLERANCIA_FUTURO = timedelta(seconds=getattr(settings, 'ASIGNACIONES_GPS_TOLERANCIA_FUTURO_S', 120))
+MAX_PINGS = 5000
+TAMANO_LOTE_SQL = 500
+
+# Clave del ping -> (modelo, campo que lo identifica, campo FK en PosicionHistorica)
+UNIDADES = {
+    'patente': (Vehiculo, 'patente', 'vehiculo_id'),
+    'licencia': (Conductor, 'numero_licencia', 'conductor_id'),
+}
+
+_lock = threading.Lock()
+_lock_vaciado = threading.Lock()
+_ultimas = {}       # (tipo, identificador) -> (ts, lat, lon)
+_historial = []     # [(tipo, identificador, ts, lat, lon)]
+_escritas = {}      # (tipo, identificador) -> ts de la última posición escrita en la BD
+_temporizador = None
+
+
+class PingInvalido(ValueError):
+    pass
+
+
+def _coordenada(valor, minimo, maximo, nombre):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise PingInvalido(f'{nombre} debe ser numérico.')
+    if not minimo <= valor <= maximo:
+        raise PingInvalido(f'{nombre} fuera de rango.')
+    return float(valor)
+
+
+def parsear_ping(item):
+    """Devuelve ((tipo, identificador), ts, lat, lon) o lanza PingInvalido."""
+    if not isinstance(item, dict):
+        raise PingInvalido('Cada ping debe ser un objeto.')
+    tipos = [tipo for tipo in UNIDADES if item.get(tipo)]
+    if len(tipos) != 1:
+        raise PingInvalido(f"Cada ping debe traer exactamente uno de: {', '.join(UNIDADES)}.")
+    lat = _coordenada(item.get('lat'), -90, 90, 'lat')
+    lon = _coordenada(item.get('lon'), -180, 180, 'lon')
+    ts = item.get('ts')
+    if ts in (None, ''):
+        ts = timezone.now()
+    else:
+        try:
+            ts = parse_datetime(str(ts)) if not isinstance(ts, bool) else None
+        except (ValueError, TypeError):
+            ts = None  # Bien formada pero imposible, p.ej. mes 13
+        if ts is None:
+            raise PingInvalido('ts debe ser una fecha/hora ISO 8601.')
+        if timezone.is_naive(ts):
+            ts = timezone.make_aware(ts)
+        if ts > timezone.now() + TOLERANCIA_FUTURO:
+            raise PingInvalido('ts está en el futuro.')
+    return (tipos[0], str(item[tipos[0]])), ts, lat, lon
+
+
+def registrar(items):
+    """Valida y encola los pings. Devuelve (aceptados, errores) con errores = [{indice, error}]."""
+    validos, errores = [], []
+    for indice, item in enumerate(items):
+        try:
+            validos.append(parsear_ping(item))
+        except PingInvalido as e:
+            errores.append({'indice': indice, 'error': str(e)})
+
+    with _lock:
+        for clave, ts, lat, lon in validos:
+            actual = _ultimas.get(clave)
+            if actual is None or ts >= actual[0]:
+                _ultimas[clave] = (ts, lat, lon)
+            if GUARDAR_HISTORIAL:
+                _historial.append((*clave, ts, lat, lon))
+        _programar_vaciado()
+    return len(validos), errores
+
+
+def _programar_vaciado():
+    # Se llama con _lock tomado
+    global _temporizador
+    if _temporizador is None and (_ultimas or _historial):
+        _temporizador = threading.Timer(INTERVALO_VACIADO, _vaciar_en_hilo)
+        _temporizador.daemon = True
+        _temporizador.start()
+
+
+def _vaciar_en_hilo():
+    try:
+        vaciar()
+    finally:
+        connections.close_all()  # Conexiones abiertas por este hilo
+
+
+def vaciar():
+    """Escribe en la BD el contenido actual del buffer. Devuelve la cantidad de posiciones actualizadas."""
+    global _temporizador
+    with _lock_vaciado:
+        with _lock:
+            ultimas, historial = dict(_ultimas), list(_historial)
+            _ultimas.clear()
+            _historial.clear()
+            _temporizador = None
+        if not ultimas and not historial:
+            return 0
+        try:
+            actualizados = _escribir(ultimas, historial)
+        except Exception:
+            # Se devuelven al buffer (sin pisar pings más nuevos) para el próximo intento
+            with _lock:
+                for clave, valor in ultimas.items():
+                    if clave not in _ultimas or _ultimas[clave][0] < valor[0]:
+                        _ultimas[clave] = valor
+                _historial[:0] = historial
+                _programar_vaciado()
+            raise
+    return actualizados
+
+
+def _escribir(ultimas, historial):
+    actualizados = 0
+    modelos = set()
+    with transaction.atomic():
+        for tipo, (modelo, campo, campo_historial) in UNIDADES.items():
+            posiciones = {ident: valor for (t, ident), valor in ultimas.items() if t == tipo}
+            pings = [p for p in historial if p[0] == tipo]
+            identificadores = set(posiciones) | {p[1] for p in pings}
+            if not identificadores:
+                continue
+            ids = dict(modelo.objects.filter(**{f'{campo}__in': identificadores}).values_list(campo, 'id'))
+
+            objetos = []
+            for ident, (ts, lat, lon) in posiciones.items():
+                # Las unidades desconocidas se ignoran; un ping atrasado no pisa uno más nuevo ya escrito
+                if ident not in ids or _escritas.get((tipo, ident), ts) > ts:
+                    continue
+                objetos.append(modelo(
+                    id=ids[ident], ubicacion_actual_lat=lat, ubicacion_actual_lon=lon, celda_geo=celda_para(lat, lon),
+                ))
+                _escritas[(tipo, ident)] = ts
+            if objetos:
+                modelo.objects.bulk_update(
+                    objetos, ['ubicacion_actual_lat', 'ubicacion_actual_lon', 'celda_geo'], batch_size=TAMANO_LOTE_SQL
+                )
+                actualizados += len(objetos)
+                modelos.add(modelo)
+                eventos.publicar_al_confirmar(modelo._meta.model_name, [
+                    {'id': o.id, 'lat': o.ubicacion_actual_lat, 'lon': o.ubicacion_actual_lon} for o in objetos
+                ])
+
+            PosicionHistorica.objects.bulk_create([
+                PosicionHistorica(**{campo_historial: ids[ident]}, lat=lat, lon=lon, registrada=ts)
+                for _, ident, ts, lat, lon in pings if ident in ids
+            ], batch_size=TAMANO_LOTE_SQL)
+
+        # bulk_update no dispara señales
+        if modelos:
+            transaction.on_commit(lambda: incrementar_version(*modelos))
+    return actualizados
@@ -0,0 +1,308 @@
+# asignaciones/services/rutas.py
+"""
+Secuencias de servicios por vehículo (encadenamiento de viajes) para el planificador.
+
+No depende de Django: recibe listas y arrays y devuelve índices, así se puede ejecutar en los
+procesos del pool de planificacion.py. Los tiempos son minutos desde el inicio del plan.
+
+Una ruta es la lista de servicios de un vehículo ordenada por inicio requerido. Es factible si el
+vehículo llega a cada origen a más tardar 'tolerancia' minutos después del inicio requerido (si
+llega antes, espera), si la reserva de cada servicio empieza después del fin previsto de la
+anterior y si termina antes de su siguiente compromiso. Su costo son los km en vacío
+(hasta el primer origen y de cada destino al origen siguiente), más 'costo_vehiculo' por usar
+el vehículo y la penalización por tipo no preferente de cada servicio.
+
+Primero se arma una solución golosa (en orden de inicio, cada servicio va a la ruta donde agrega
+menos costo; las 'programada' parten en su vehículo actual) y después se mejora con búsqueda
+local hasta agotar el presupuesto de tiempo:
+- vaciar rutas: repartir los servicios de las rutas más cortas entre las demás (un vehículo menos);
+- reubicar: mover un servicio a la ruta donde cuesta menos;
+- insertar los que quedaron sin asignar.
+Sólo se aceptan movimientos que bajan el costo total.
+"""
+import bisect
+import random
+import time
+
+import numpy as np
+
+from .geo import matriz_distancias_km
+
+DISTANCIA_DESCONOCIDA_KM = 25.0
+PENALIZACION_SIN_ASIGNAR = 1000.0
+CANDIDATOS_VACIOS = 5     # Vehículos sin ruta que se prueban para cada servicio (los más cercanos)
+EPSILON = 1e-6
+
+
+def _distancias(desde, hacia):
+    desde = np.asarray(desde, dtype=float).reshape(-1, 2)
+    hacia = np.asarray(hacia, dtype=float).reshape(-1, 2)
+    distancia = matriz_distancias_km(desde[:, 0], desde[:, 1], hacia[:, 0], hacia[:, 1])
+    return np.where(np.isnan(distancia), DISTANCIA_DESCONOCIDA_KM, distancia)
+
+
+class Planificador:
+    """
+    'datos' es un dict con (n servicios, m vehículos, t tipos de vehículo):
+    inicio (n), duracion (n x t), origen y destino (n x 2), compatibles y penalizacion (n x m),
+    semilla (n, vehículo actual o -1), tipo, disponible_desde, disponible_hasta (m), posicion (m x 2),
+    velocidad (t x 24, km/h), minuto_inicial (minuto del día del instante 0), factor_ruta,
+    tolerancia, costo_vehiculo, tiempo_limite y semilla_azar.
+    """
+
+    def __init__(self, datos):
+        self.inicio = list(datos['inicio'])
+        self.duracion = np.asarray(datos['duracion'], dtype=float).tolist()
+        self.penalizacion = np.asarray(datos['penalizacion'], dtype=float).tolist()
+        self.tipo = list(datos['tipo'])
+        self.disponible_desde = list(datos['disponible_desde'])
+        self.disponible_hasta = list(datos['disponible_hasta'])
+        self.velocidad = np.asarray(datos['velocidad'], dtype=float).tolist()
+        self.minuto_inicial = datos['minuto_inicial']
+        self.factor_ruta = datos['factor_ruta']
+        self.tolerancia = datos['tolerancia']
+        self.costo_vehiculo = datos['costo_vehiculo']
+        self.semilla = list(datos['semilla'])
+        self.azar = random.Random(datos.get('semilla_azar', 0))
+
+        n, m = len(self.inicio), len(self.tipo)
+        self.entre = _distancias(datos['destino'], datos['origen']).tolist() if n else []
+        desde_vehiculo = _distancias(datos['posicion'], datos['origen']) if n and m else np.zeros((m, n))
+        self.desde_vehiculo = desde_vehiculo.tolist()
+        # Vehículos compatibles con cada servicio, del más cercano al más lejano
+        compatibles = np.asarray(datos['compatibles'], dtype=bool).reshape(n, m)
+        orden = np.argsort(desde_vehiculo, axis=0, kind='stable')
+        self.candidatos = [orden[:, j][compatibles[j, orden[:, j]]].tolist() for j in range(n)]
+
+        self.rutas = [[] for _ in range(m)]
+        self.costos = [0.0] * m
+        # Por ruta: (fin de cada servicio, km acumulados hasta cada servicio), para evaluar inserciones
+        self.horarios = [([], []) for _ in range(m)]
+        self.asignado = [-1] * n
+
+    # --- Evaluación ---
+
+    def _paso(self, v, previo, j, t):
+        """(fin del servicio j, km del tramo, última salida a tiempo) saliendo a las t desde 'previo' (o desde el vehículo), o None si llega tarde."""
+        tipo = self.tipo[v]
+        if previo is None:
+            distancia = self.desde_vehiculo[v][j]
+            reservado_hasta = self.disponible_desde[v]
+        else:
+            distancia = self.entre[previo][j]
+            reservado_hasta = self.inicio[previo] + self.duracion[previo][tipo]
+        if self.inicio[j] < reservado_hasta:
+            # Aunque llegue a tiempo, las reservas [inicio, fin previsto) no se pueden solapar (ver conflictos.py)
+            return None
+        llegada = t
+        if distancia:
+            velocidad = self.velocidad[tipo][int((self.minuto_inicial + t) // 60) % 24]
+            llegada = t + distancia * self.factor_ruta / velocidad * 60
+        if llegada > self.inicio[j] + self.tolerancia:
+            return None
+        comienzo = llegada if llegada > self.inicio[j] else self.inicio[j]
+        return comienzo + self.duracion[j][tipo], distancia, comienzo - (llegada - t)
+
+    def _horario(self, v, ruta, tiempos=None):
+        """(fines, km acumulados) de la ruta, o None si no es factible. Llena 'tiempos' con (comienzo, fin, salida)."""
+        t = self.disponible_desde[v]
+        km = 0.0
+        fines, acumulados = [], []
+        previo = None
+        for j in ruta:
+            paso = self._paso(v, previo, j, t)
+            if paso is None:
+                return None
+            t, distancia, salida = paso
+            km += distancia
+            fines.append(t)
+            acumulados.append(km)
+            if tiempos is not None:
+                # Sale lo más tarde posible para llegar justo a tiempo
+                tiempos.append((t - self.duracion[j][self.tipo[v]], t, salida))
+            previo = j
+        if t > self.disponible_hasta[v]:
+            return None
+        return fines, acumulados
+
+    def costo_ruta(self, v, ruta):
+        """Costo de la ruta del vehículo v, o None si no es factible."""
+        if not ruta:
+            return 0.0
+        horario = self._horario(v, ruta)
+        if horario is None:
+            return None
+        return horario[1][-1] + self.costo_vehiculo + sum(self.penalizacion[j][v] for j in ruta)
+
+    def _costo_insertando(self, v, j):
+        """(costo, posición) de la ruta de v con j en su lugar, o None. Sólo recorre desde la posición de j."""
+        ruta = self.rutas[v]
+        fines, acumulados = self.horarios[v]
+        posicion = bisect.bisect_right(ruta, self.inicio[j], key=self.inicio.__getitem__)
+        if posicion:
+            t, km, previo = fines[posicion - 1], acumulados[posicion - 1], ruta[posicion - 1]
+        else:
+            t, km, previo = self.disponible_desde[v], 0.0, None
+        paso = self._paso(v, previo, j, t)
+        if paso is None:
+            return None
+        t, distancia, _ = paso
+        km += distancia
+        previo = j
+        for k in range(posicion, len(ruta)):
+            paso = self._paso(v, previo, ruta[k], t)
+            if paso is None:
+                return None
+            t, distancia, _ = paso
+            km += distancia
+            if t == fines[k]:
+                # El vehículo absorbió el retraso esperando: el resto de la ruta no cambia
+                km += acumulados[-1] - acumulados[k]
+                t = fines[-1]
+                break
+            previo = ruta[k]
+        if t > self.disponible_hasta[v]:
+            return None
+        if not ruta:
+            return km + self.costo_vehiculo + self.penalizacion[j][v], posicion
+        return self.costos[v] + km - acumulados[-1] + self.penalizacion[j][v], posicion
+
+    def costo_total(self):
+        return sum(self.costos) + PENALIZACION_SIN_ASIGNAR * self.asignado.count(-1)
+
+    def _mejor_insercion(self, j, excluir=-1, abrir=True):
+        """(aumento de costo, vehículo, ruta nueva, costo nuevo) más barato para agregar j, o None."""
+        mejor = None
+        vacios = 0
+        for v in self.candidatos[j]:
+            if v == excluir:
+                continue
+            if not self.rutas[v]:
+                if not abrir or vacios >= CANDIDATOS_VACIOS:
+                    continue
+                vacios += 1
+            evaluado = self._costo_insertando(v, j)
+            if evaluado is None:
+                continue
+            aumento = evaluado[0] - self.costos[v]
+            if mejor is None or aumento < mejor[0]:
+                mejor = (aumento, v, evaluado[1], evaluado[0])
+        if mejor is None:
+            return None
+        aumento, v, posicion, costo = mejor
+        nueva = self.rutas[v].copy()
+        nueva.insert(posicion, j)
+        return aumento, v, nueva, costo
+
+    def _poner(self, v, ruta, costo):
+        self.rutas[v] = ruta
+        self.costos[v] = costo
+        self.horarios[v] = self._horario(v, ruta) if ruta else ([], [])
+
+    def _fijar(self, v, ruta, costo):
+        self._poner(v, ruta, costo)
+        for j in ruta:
+            self.asignado[j] = v
+
+    # --- Construcción y búsqueda local ---
+
+    def construir(self):
+        for j, v in enumerate(self.semilla):
+            if v >= 0 and v in self.candidatos[j]:
+                evaluado = self._costo_insertando(v, j)
+                if evaluado is not None:
+                    nueva = self.rutas[v].copy()
+                    nueva.insert(evaluado[1], j)
+                    self._fijar(v, nueva, evaluado[0])
+        for j in sorted(range(len(self.inicio)), key=self.inicio.__getitem__):
+            if self.asignado[j] < 0:
+                self._insertar(j)
+
+    def _insertar(self, j):
+        mejor = self._mejor_insercion(j)
+        if mejor is None:
+            return False
+        _, v, ruta, costo = mejor
+        self._fijar(v, ruta, costo)
+        return True
+
+    def _reubicar(self, j):
+        v = self.asignado[j]
+        sin_j = [k for k in self.rutas[v] if k != j]
+        costo_sin_j = self.costo_ruta(v, sin_j)
+        if costo_sin_j is None:
+            return False
+        mejor = self._mejor_insercion(j, excluir=v)
+        if mejor is None or costo_sin_j - self.costos[v] + mejor[0] > -EPSILON:
+            return False
+        _, destino, ruta, costo = mejor
+        self._poner(v, sin_j, costo_sin_j)
+        self._fijar(destino, ruta, costo)
+        return True
+
+    def _vaciar(self, v):
+        """Intenta repartir toda la ruta de v entre las rutas ya abiertas. Se deshace si no baja el costo."""
+        ruta, costo = self.rutas[v], self.costos[v]
+        anteriores = {v: (ruta, costo, self.horarios[v])}
+        self._poner(v, [], 0.0)
+        variacion = -costo
+        for j in ruta:
+            mejor = self._mejor_insercion(j, excluir=v, abrir=False)
+            if mejor is None:
+                break
+            aumento, destino, nueva, costo_destino = mejor
+            anteriores.setdefault(destino, (self.rutas[destino], self.costos[destino], self.horarios[destino]))
+            self._poner(destino, nueva, costo_destino)
+            variacion += aumento
+        else:
+            if variacion < -EPSILON:
+                for w in anteriores:
+                    for j in self.rutas[w]:
+                        self.asignado[j] = w
+                return True
+        for w, (ruta_anterior, costo_anterior, horario_anterior) in anteriores.items():
+            self.rutas[w], self.costos[w], self.horarios[w] = ruta_anterior, costo_anterior, horario_anterior
+        return False
+
+    def mejorar(self, tiempo_limite):
+        limite = time.perf_counter() + tiempo_limite
+        while True:
+            mejoro = False
+            abiertas = sorted((v for v, ruta in enumerate(self.rutas) if ruta), key=lambda v: len(self.rutas[v]))
+            for v in abiertas:
+                if time.perf_counter() >= limite:
+                    return
+                if self.rutas[v] and self._vaciar(v):
+                    mejoro = True
+            asignados = [j for j, v in enumerate(self.asignado) if v >= 0]
+            self.azar.shuffle(asignados)
+            for j in asignados:
+                if time.perf_counter() >= limite:
+                    return
+                mejoro = self._reubicar(j) or mejoro
+            for j, v in enumerate(self.asignado):
+                if v < 0 and time.perf_counter() < limite:
+                    mejoro = self._insertar(j) or mejoro
+            if not mejoro:
+                return
+
+    def resultado(self):
+        rutas = []
+        for v, ruta in enumerate(self.rutas):
+            if ruta:
+                tiempos = []
+                _, acumulados = self._horario(v, ruta, tiempos)
+                rutas.append({'vehiculo': v, 'servicios': ruta, 'tiempos': tiempos, 'km_vacios': acumulados[-1]})
+        return {'rutas': rutas, 'sin_asignar': [j for j, v in enumerate(self.asignado) if v < 0]}
+
+
+def resolver_zona(datos):
+    """Punto de entrada para el pool de procesos: construye, mejora y devuelve el plan de una zona."""
+    planificador = Planificador(datos)
+    planificador.construir()
+    costo_inicial = planificador.costo_total()
+    planificador.mejorar(datos['tiempo_limite'])
+    resultado = planificador.resultado()
+    resultado['costo_inicial'] = costo_inicial
+    resultado['costo_final'] = planificador.costo_total()
+    return resultado
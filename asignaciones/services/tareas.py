@@ -0,0 +1,132 @@
+# asignaciones/services/tareas.py
+"""
+Cola de trabajos en segundo plano sobre la tabla Tarea, sin Redis ni broker externo.
+
+Las vistas encolan (un INSERT dentro de la misma transacción que el cambio que lo origina) y
+responden de inmediato; el comando 'procesar_tareas' toma las tareas disponibles y las ejecuta.
+Cada tarea se toma con un UPDATE condicional (... WHERE estado = 'pendiente'), así que se pueden
+correr varios workers sin que dos ejecuten la misma. Si el manejador falla se reintenta con espera
+exponencial hasta max_intentos; las que quedan 'en_proceso' porque un worker murió se devuelven
+a la cola después de TIEMPO_MAXIMO_EN_PROCESO.
+
+Con ASIGNACIONES_TAREAS_SINCRONAS = True las tareas se ejecutan al confirmar la transacción,
+en el mismo proceso (útil en desarrollo, sin worker).
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Tarea
+from .asignacion_automatica import asignar_pendientes
+from .fotos import generar_variantes
+from .planificacion import planificar
+
+logger = logging.getLogger(__name__)
+
+TAREAS_SINCRONAS = getattr(settings, 'ASIGNACIONES_TAREAS_SINCRONAS', False)
+ESPERA_BASE_REINTENTO = timedelta(seconds=10)
+TIEMPO_MAXIMO_EN_PROCESO = timedelta(minutes=10)
+
+
+def _asignar_pendientes(clave):
+    return asignar_pendientes()
+
+
+def _variantes_foto(clave):
+    return generar_variantes(int(clave))
+
+
+def _planificar(clave):
+    desde, _, hasta = clave.partition('|')
+    return planificar(parse_datetime(desde) if desde else None, parse_datetime(hasta) if hasta else None)
+
+
+MANEJADORES = {
+    'asignar_pendientes': _asignar_pendientes,   # clave = '' (una sola pendiente a la vez)
+    'variantes_foto': _variantes_foto,           # clave = id del vehículo
+    'planificar': _planificar,                   # clave = 'desde|hasta' en ISO ('' = horizonte desde ahora)
+}
+
+
+def encolar(tipo, clave=''):
+    """Encola el trabajo 'tipo' para 'clave'. Si ya hay uno pendiente igual no se agrega otro."""
+    if tipo not in MANEJADORES:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+    clave = str(clave)
+    if TAREAS_SINCRONAS:
+        transaction.on_commit(lambda: MANEJADORES[tipo](clave))
+        return
+    Tarea.objects.bulk_create([Tarea(tipo=tipo, clave=clave)], ignore_conflicts=True)
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola las tareas 'en_proceso' de workers que murieron. Devuelve cuántas."""
+    limite = timezone.now() - TIEMPO_MAXIMO_EN_PROCESO
+    recuperadas = 0
+    for tarea in Tarea.objects.filter(estado='en_proceso', iniciada__lt=limite):
+        recuperadas += _reprogramar(tarea, 'Se superó el tiempo máximo en proceso.')
+    return recuperadas
+
+
+def tomar(limite=10):
+    """Marca como 'en_proceso' hasta 'limite' tareas disponibles y las devuelve."""
+    ahora = timezone.now()
+    candidatas = list(
+        Tarea.objects.filter(estado='pendiente', disponible_desde__lte=ahora)
+        .order_by('disponible_desde', 'id').values_list('id', flat=True)[:limite]
+    )
+    tomadas = []
+    for pk in candidatas:
+        if Tarea.objects.filter(pk=pk, estado='pendiente').update(
+            estado='en_proceso', intentos=F('intentos') + 1, iniciada=ahora
+        ):
+            tomadas.append(pk)
+    return list(Tarea.objects.filter(pk__in=tomadas).order_by('disponible_desde', 'id'))
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya tomada y registra el resultado. Devuelve True si terminó bien."""
+    try:
+        MANEJADORES[tarea.tipo](tarea.clave)
+    except Exception:
+        logger.exception('Falló la tarea %s', tarea)
+        _reprogramar(tarea, traceback.format_exc())
+        return False
+    Tarea.objects.filter(pk=tarea.pk).update(estado='completada', finalizada=timezone.now(), ultimo_error='')
+    return True
+
+
+def _reprogramar(tarea, error):
+    """Vuelve a encolar con espera exponencial o la marca 'fallida' si agotó los intentos."""
+    ahora = timezone.now()
+    if tarea.intentos >= tarea.max_intentos:
+        Tarea.objects.filter(pk=tarea.pk).update(estado='fallida', finalizada=ahora, ultimo_error=error)
+        return 0
+    espera = ESPERA_BASE_REINTENTO * (2 ** max(tarea.intentos - 1, 0))
+    try:
+        with transaction.atomic():
+            Tarea.objects.filter(pk=tarea.pk).update(estado='pendiente', disponible_desde=ahora + espera, ultimo_error=error)
+    except IntegrityError:
+        # Ya se encoló el mismo trabajo de nuevo: esa tarea pendiente lo cubre
+        Tarea.objects.filter(pk=tarea.pk).update(
+            estado='fallida', finalizada=ahora, ultimo_error=f'{error}\nReemplazada por otra tarea pendiente.'
+        )
+        return 0
+    return 1
+
+
+def procesar_disponibles(limite=10):
+    """Toma y ejecuta un lote de tareas. Devuelve (ejecutadas, fallidas)."""
+    ejecutadas = fallidas = 0
+    for tarea in tomar(limite):
+        if ejecutar(tarea):
+            ejecutadas += 1
+        else:
+            fallidas += 1
+    return ejecutadas, fallidas
@@ -0,0 +1,117 @@
+# asignaciones/services/transiciones.py
+"""
+Transiciones de estado de las asignaciones (iniciar / completar).
+
+Cada transición corre en su propia transacción y escribe con UPDATE condicionales
+(... WHERE estado = <estado esperado>) que tocan sólo las columnas que cambian: si dos
+despachadores inician la misma asignación a la vez, sólo uno de los UPDATE afecta una fila y
+el otro recibe TransicionInvalida. Si falla el vehículo o el conductor se revierte la transición
+completa. queryset.update() no dispara señales, así que las versiones de caché y los rollups de
+estadísticas se actualizan aquí.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .. import eventos
+from ..cache import incrementar_version
+from ..models import Vehiculo, Conductor, Asignacion
+from . import estadisticas
+
+MAX_TRANSICIONES = 1000
+ESTADOS_VEHICULO_PARA_INICIAR = ['disponible', 'reservado']
+
+
+class TransicionInvalida(Exception):
+    pass
+
+
+def _iniciar(asignacion):
+    if asignacion['estado'] != 'programada':
+        raise TransicionInvalida('La asignación no está programada o ya está en otro estado.')
+    if not asignacion['vehiculo_id'] or not asignacion['conductor_id']:
+        raise TransicionInvalida('La asignación debe tener un vehículo y un conductor asignados para poder iniciarla.')
+
+    # El UPDATE de la asignación va primero: es el que decide quién gana ante transiciones concurrentes
+    tomadas = Asignacion.objects.filter(
+        pk=asignacion['id'], estado='programada',
+        vehiculo_id=asignacion['vehiculo_id'], conductor_id=asignacion['conductor_id'],
+    ).update(estado='activa')
+    if not tomadas:
+        raise TransicionInvalida('La asignación cambió de estado mientras se procesaba.')
+
+    if not Vehiculo.objects.filter(
+        pk=asignacion['vehiculo_id'], estado__in=ESTADOS_VEHICULO_PARA_INICIAR
+    ).update(estado='en_uso'):
+        patente = Vehiculo.objects.filter(pk=asignacion['vehiculo_id']).values_list('patente', flat=True).first()
+        raise TransicionInvalida(f'El vehículo {patente} no está disponible.')
+
+    if not Conductor.objects.filter(
+        pk=asignacion['conductor_id'], activo=True, estado_disponibilidad='disponible'
+    ).update(estado_disponibilidad='en_ruta'):
+        conductor = Conductor.objects.filter(pk=asignacion['conductor_id']).first()
+        raise TransicionInvalida(f'El conductor {conductor} no está disponible o no está activo.')
+
+    eventos.publicar_al_confirmar('vehiculo', [{'id': asignacion['vehiculo_id'], 'estado': 'en_uso'}])
+    eventos.publicar_al_confirmar('conductor', [{'id': asignacion['conductor_id'], 'estado_disponibilidad': 'en_ruta'}])
+    return {'estado': 'activa'}
+
+
+def _completar(asignacion):
+    if asignacion['estado'] != 'activa':
+        raise TransicionInvalida('La asignación no está activa o ya está completada/cancelada.')
+
+    cambios = {'estado': 'completada', 'fecha_hora_fin_real': timezone.now()}
+    tomadas = Asignacion.objects.filter(pk=asignacion['id'], estado='activa').update(**cambios)
+    if not tomadas:
+        raise TransicionInvalida('La asignación cambió de estado mientras se procesaba.')
+    if asignacion['vehiculo_id']:
+        Vehiculo.objects.filter(pk=asignacion['vehiculo_id']).update(estado='disponible')
+        eventos.publicar_al_confirmar('vehiculo', [{'id': asignacion['vehiculo_id'], 'estado': 'disponible'}])
+    if asignacion['conductor_id']:
+        Conductor.objects.filter(pk=asignacion['conductor_id']).update(estado_disponibilidad='disponible')
+        eventos.publicar_al_confirmar('conductor', [{'id': asignacion['conductor_id'], 'estado_disponibilidad': 'disponible'}])
+    return cambios
+
+
+TRANSICIONES = {
+    'iniciar': _iniciar,
+    'completar': _completar,
+}
+
+
+def transicionar(accion, ids):
+    """
+    Aplica la transición 'accion' a cada asignación de 'ids', cada una en su propia transacción.
+    Devuelve (ids_procesados, errores) con errores = {id: mensaje}; un error no afecta al resto.
+    """
+    if accion not in TRANSICIONES:
+        raise ValueError(f'Transición desconocida: {accion}')
+    transicion = TRANSICIONES[accion]
+
+    # Una sola lectura para todo el lote; los UPDATE condicionales validan que nada haya cambiado
+    asignaciones = {
+        fila['id']: fila
+        for fila in Asignacion.objects.filter(pk__in=ids).values(*estadisticas.CAMPOS, 'conductor_id')
+    }
+    procesadas, errores = [], {}
+    for pk in dict.fromkeys(ids):
+        asignacion = asignaciones.get(pk)
+        if asignacion is None:
+            errores[pk] = 'No existe la asignación.'
+            continue
+        try:
+            with transaction.atomic():
+                cambios = transicion(asignacion)
+                estadisticas.aplicar(estadisticas.diferencia([asignacion], [{**asignacion, **cambios}]))
+                eventos.publicar_al_confirmar('asignacion', [{
+                    'id': pk, 'estado': cambios['estado'],
+                    'vehiculo_id': asignacion['vehiculo_id'], 'conductor_id': asignacion['conductor_id'],
+                }])
+        except TransicionInvalida as e:
+            errores[pk] = str(e)
+        else:
+            procesadas.append(pk)
+
+    if procesadas:
+        transaction.on_commit(lambda: incrementar_version(Vehiculo, Conductor, Asignacion))
+    return procesadas, errores
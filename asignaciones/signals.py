@@ -0,0 +1,113 @@
+# asignaciones/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import eventos
+from .cache import incrementar_version
+from .models import Vehiculo, Conductor, HabilitacionConductor, Asignacion
+from .services import estadisticas, fotos, tareas
+
+
+@receiver([post_save, post_delete], sender=Vehiculo)
+@receiver([post_save, post_delete], sender=Conductor)
+def invalidar_cache_flota(sender, **kwargs):
+    # Después del commit: si no, una lectura concurrente podría cachear datos viejos con la versión nueva
+    transaction.on_commit(lambda: incrementar_version(sender))
+
+
+@receiver([post_save, post_delete], sender=Asignacion)
+def invalidar_conteos_asignaciones(sender, **kwargs):
+    # Las asignaciones no cachean respuestas, pero su versión invalida los conteos de la paginación
+    transaction.on_commit(lambda: incrementar_version(Asignacion))
+
+
+@receiver([post_save, post_delete], sender=HabilitacionConductor)
+def invalidar_cache_habilitaciones(sender, **kwargs):
+    # Las habilitaciones se muestran como parte del conductor
+    transaction.on_commit(lambda: incrementar_version(Conductor))
+
+
+@receiver(pre_save, sender=Vehiculo)
+def detectar_foto_nueva(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Antes de que FileField.pre_save lo guarde, un archivo recién subido aún no está 'committed'
+    instance._foto_nueva = bool(not raw and instance.foto and not instance.foto._committed)
+    if instance._foto_nueva or not instance.foto:
+        instance.foto_variantes_generadas = False
+    # La foto que se reemplaza (o se quita) se borra después del commit, con sus variantes
+    instance._foto_anterior = None
+    if raw or instance._state.adding or (update_fields is not None and 'foto' not in update_fields):
+        return
+    if instance._foto_nueva or not instance.foto:
+        anterior = sender.objects.filter(pk=instance.pk).values_list('foto', flat=True).first()
+        if anterior and anterior != instance.foto.name:
+            instance._foto_anterior = anterior
+
+
+@receiver(post_save, sender=Vehiculo)
+def encolar_variantes_foto(sender, instance, raw=False, **kwargs):
+    if getattr(instance, '_foto_nueva', False):
+        tareas.encolar('variantes_foto', instance.pk)
+    anterior = getattr(instance, '_foto_anterior', None)
+    if anterior:
+        transaction.on_commit(lambda: fotos.eliminar_foto(anterior))
+
+
+# Modelo -> (tipo de evento, datos publicados, campos de los que dependen)
+EVENTOS_FLOTA = {
+    Vehiculo: ('vehiculo', eventos.datos_vehiculo, ['estado', 'ubicacion_actual_lat', 'ubicacion_actual_lon']),
+    Conductor: ('conductor', eventos.datos_conductor,
+                ['estado_disponibilidad', 'activo', 'ubicacion_actual_lat', 'ubicacion_actual_lon']),
+}
+
+
+@receiver(pre_save, sender=Vehiculo)
+@receiver(pre_save, sender=Conductor)
+def recordar_estado_previo(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Sólo se publica si cambia la disponibilidad o la posición; guardar otros campos no genera eventos
+    _, _, campos = EVENTOS_FLOTA[sender]
+    instance._valores_previos = None
+    if raw or instance._state.adding or not instance.pk or not eventos.hay_suscriptores():
+        return
+    if update_fields is not None and not set(campos) & set(update_fields):
+        instance._valores_previos = {campo: getattr(instance, campo) for campo in campos}
+        return
+    instance._valores_previos = sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_save, sender=Conductor)
+def publicar_flota(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    tipo, datos, campos = EVENTOS_FLOTA[sender]
+    previos = getattr(instance, '_valores_previos', None)
+    if created or previos is None or any(previos[campo] != getattr(instance, campo) for campo in campos):
+        eventos.publicar_al_confirmar(tipo, [datos(instance)])
+
+
+def _afecta_estadisticas(update_fields):
+    return update_fields is None or bool(estadisticas.CAMPOS_RELEVANTES & set(update_fields))
+
+
+@receiver(pre_save, sender=Asignacion)
+def recordar_valores_previos(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Valores guardados en la BD (no los del objeto en memoria, que ya pueden haber cambiado)
+    instance._filas_previas = []
+    if not raw and instance.pk and not instance._state.adding and _afecta_estadisticas(update_fields):
+        instance._filas_previas = estadisticas.filas_de([instance.pk])
+
+
+@receiver(post_save, sender=Asignacion)
+def actualizar_estadisticas(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _afecta_estadisticas(update_fields):
+        return
+    previas = getattr(instance, '_filas_previas', [])
+    estadisticas.aplicar(estadisticas.diferencia(previas, [estadisticas.fila_de(instance)]))
+    if created or (previas and previas[0]['estado'] != instance.estado):
+        eventos.publicar_al_confirmar('asignacion', [eventos.datos_asignacion(instance)])
+
+
+@receiver(post_delete, sender=Asignacion)
+def descontar_estadisticas(sender, instance, **kwargs):
+    estadisticas.aplicar(estadisticas.diferencia([estadisticas.fila_de(instance)], []))
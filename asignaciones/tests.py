@@ -1,3 +1,1073 @@
-from django.test import TestCase
+import csv
+import json
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.db.models.expressions import RawSQL
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import conteos, eventos, metricas, replicas
+from .admin import AniosIndexadosQuerySet
+from .models import Vehiculo, Conductor, Asignacion, EstadisticaDiaria, Tarea
+from .pagination import ConteoEstimadoPaginator
+from .services import (
+    asignacion_automatica, caracteristicas, cercania, conflictos, disponibilidad, estadisticas,
+    eta, exportacion, fotos, planificacion, posiciones, transiciones,
+)
+
+CACHES_PRUEBAS = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'pruebas-{alias}'}
+    for alias in ('default', 'versiones', 'respuestas')
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBAS)
+class PruebaBase(TestCase):
+    """Datos mínimos y un cliente autenticado. Los cachés son en memoria y se vacían en cada prueba."""
+
+    def setUp(self):
+        for alias in CACHES_PRUEBAS:
+            caches[alias].clear()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('pruebas'))
+        self.ahora = timezone.now().replace(microsecond=0)
+        self._secuencia = 0
+
+    def _siguiente(self):
+        self._secuencia += 1
+        return self._secuencia
+
+    def crear_vehiculo(self, **campos):
+        n = self._siguiente()
+        datos = {
+            'marca': 'Toyota', 'modelo': 'Hiace', 'patente': f'PR-{n:04d}', 'tipo_vehiculo': 'auto_funcionario',
+            'capacidad_pasajeros': 4, 'capacidad_carga_kg': 300,
+            'ubicacion_actual_lat': -33.45, 'ubicacion_actual_lon': -70.65,
+        }
+        datos.update(campos)
+        return Vehiculo.objects.create(**datos)
+
+    def crear_conductor(self, tipos=('auto_funcionario',), **campos):
+        n = self._siguiente()
+        datos = {
+            'nombre': 'Ana', 'apellido': f'Prueba{n}', 'numero_licencia': f'LIC-{n:05d}',
+            'fecha_vencimiento_licencia': date.today() + timedelta(days=365),
+            'ubicacion_actual_lat': -33.45, 'ubicacion_actual_lon': -70.65,
+        }
+        datos.update(campos)
+        conductor = Conductor.objects.create(**datos)
+        conductor.definir_tipos_habilitados(tipos)
+        return conductor
+
+    def crear_asignacion(self, inicio=None, duracion=timedelta(hours=1), **campos):
+        inicio = inicio or self.ahora + timedelta(days=1)
+        datos = {
+            'destino_descripcion': 'Hospital', 'tipo_servicio': 'funcionarios', 'estado': 'programada',
+            'fecha_hora_requerida_inicio': inicio,
+            'fecha_hora_fin_prevista': inicio + duracion if duracion is not None else None,
+        }
+        datos.update(campos)
+        return Asignacion.objects.create(**datos)
+
+    def datos_api(self, inicio, fin, **campos):
+        datos = {
+            'destino_descripcion': 'Hospital', 'tipo_servicio': 'funcionarios', 'estado': 'programada',
+            'fecha_hora_requerida_inicio': inicio.isoformat(), 'fecha_hora_fin_prevista': fin.isoformat(),
+        }
+        datos.update(campos)
+        return datos
+
+
+class AsignacionAutomaticaTests(PruebaBase):
+
+    def pendiente(self, inicio, **campos):
+        return self.crear_asignacion(inicio, None, estado='pendiente_auto', origen_lat=-33.45, origen_lon=-70.65,
+                                     destino_lat=-33.40, destino_lon=-70.60, **campos)
+
+    def test_vehiculo_en_uso_no_hace_fallar_solicitudes_futuras(self):
+        vehiculo = self.crear_vehiculo(estado='en_uso')
+        self.crear_conductor()
+        self.crear_asignacion(self.ahora - timedelta(minutes=30), timedelta(hours=1), estado='activa', vehiculo=vehiculo)
+        pendientes = [self.pendiente(self.ahora + timedelta(days=2, hours=h)) for h in range(5)]
+        resumen = asignacion_automatica.asignar_pendientes()
+        self.assertEqual(resumen, {'asignadas': 1, 'fallidas': 0, 'pendientes': 4})
+        estados = sorted(Asignacion.objects.filter(pk__in=[p.pk for p in pendientes]).values_list('estado', flat=True))
+        self.assertEqual(estados, ['pendiente_auto'] * 4 + ['programada'])
+        vehiculo.refresh_from_db()
+        self.assertEqual(vehiculo.estado, 'en_uso')
+
+    def test_falla_solo_si_ningun_vehiculo_de_la_flota_sirve(self):
+        self.crear_vehiculo(estado='mantenimiento', capacidad_pasajeros=12)
+        self.crear_conductor()
+        grande = self.pendiente(self.ahora + timedelta(days=1), req_pasajeros=10)
+        imposible = self.pendiente(self.ahora + timedelta(days=1), req_pasajeros=40)
+        resumen = asignacion_automatica.asignar_pendientes()
+        self.assertEqual(resumen, {'asignadas': 0, 'fallidas': 1, 'pendientes': 1})
+        grande.refresh_from_db()
+        imposible.refresh_from_db()
+        self.assertEqual((grande.estado, imposible.estado), ('pendiente_auto', 'fallo_auto'))
+
+    def test_reserva_en_otro_horario_no_bloquea_el_vehiculo(self):
+        vehiculo = self.crear_vehiculo()
+        conductor = self.crear_conductor()
+        self.crear_asignacion(self.ahora + timedelta(days=7), vehiculo=vehiculo, conductor=conductor)
+        solicitud = self.pendiente(self.ahora + timedelta(hours=2))
+        asignacion_automatica.asignar_pendientes()
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.estado, solicitud.vehiculo_id, solicitud.conductor_id), ('programada', vehiculo.pk, conductor.pk))
+        self.assertIsNotNone(solicitud.fecha_hora_fin_prevista)
+        self.assertTrue(solicitud.asignada_por_motor)
+        vehiculo.refresh_from_db()
+        self.assertEqual(vehiculo.estado, 'reservado')
+
+    def test_no_usa_recursos_con_reservas_solapadas(self):
+        ocupado, libre = self.crear_vehiculo(), self.crear_vehiculo(ubicacion_actual_lat=-33.60)
+        conductor_ocupado, conductor_libre = self.crear_conductor(), self.crear_conductor(ubicacion_actual_lat=-33.60)
+        inicio = self.ahora + timedelta(days=1)
+        self.crear_asignacion(inicio - timedelta(minutes=30), vehiculo=ocupado)
+        self.crear_asignacion(inicio - timedelta(minutes=30), conductor=conductor_ocupado)
+        solicitud = self.pendiente(inicio)
+        asignacion_automatica.asignar_pendientes()
+        solicitud.refresh_from_db()
+        self.assertEqual((solicitud.vehiculo_id, solicitud.conductor_id), (libre.pk, conductor_libre.pk))
+
+
+class CercaniaTests(PruebaBase):
+
+    def test_busqueda_cruza_el_antimeridiano(self):
+        # Fiyi: a ambos lados de lon 180, a ~2 km uno del otro
+        este = self.crear_vehiculo(ubicacion_actual_lat=-16.5, ubicacion_actual_lon=179.99)
+        oeste = self.crear_vehiculo(ubicacion_actual_lat=-16.5, ubicacion_actual_lon=-179.99)
+        self.crear_vehiculo()
+        cercanos = cercania.buscar_cercanos(Vehiculo.objects.all(), -16.5, 179.995, k=5, radio_km=10)
+        self.assertEqual({v.pk for v, _ in cercanos}, {este.pk, oeste.pk})
+
+
+class ConflictosHorarioTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        self.vehiculo = self.crear_vehiculo()
+        self.inicio = self.ahora + timedelta(days=2)
+
+    def test_rechaza_reserva_solapada(self):
+        self.crear_asignacion(self.inicio, timedelta(hours=2), vehiculo=self.vehiculo)
+        respuesta = self.cliente.post('/api/asignaciones/', self.datos_api(
+            self.inicio + timedelta(hours=1), self.inicio + timedelta(hours=3), vehiculo_id=self.vehiculo.pk,
+        ), format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('vehiculo_id', respuesta.data)
+
+    def test_reservas_contiguas_no_chocan(self):
+        self.crear_asignacion(self.inicio, timedelta(hours=2), vehiculo=self.vehiculo)
+        respuesta = self.cliente.post('/api/asignaciones/', self.datos_api(
+            self.inicio + timedelta(hours=2), self.inicio + timedelta(hours=3), vehiculo_id=self.vehiculo.pk,
+        ), format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+
+    def test_rechaza_asignacion_mas_larga_que_duracion_maxima(self):
+        fin = self.inicio + conflictos.DURACION_MAXIMA + timedelta(hours=48)
+        respuesta = self.cliente.post('/api/asignaciones/', self.datos_api(
+            self.inicio, fin, vehiculo_id=self.vehiculo.pk,
+        ), format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('fecha_hora_fin_prevista', respuesta.data)
+        self.assertFalse(Asignacion.objects.exists())
+
+    def test_detecta_reserva_de_duracion_maxima_que_empezo_antes(self):
+        # La reserva más larga permitida que todavía no termina al inicio de la nueva
+        inicio_largo = self.inicio - conflictos.DURACION_MAXIMA + timedelta(minutes=30)
+        larga = self.crear_asignacion(inicio_largo, conflictos.DURACION_MAXIMA, vehiculo=self.vehiculo)
+        encontrados = conflictos.buscar_conflictos(self.inicio, self.inicio + timedelta(hours=1), vehiculo_id=self.vehiculo.pk)
+        self.assertEqual([c['asignacion_id'] for c in encontrados], [larga.pk])
+
+
+class CargaMasivaTests(PruebaBase):
+
+    def test_crea_el_lote(self):
+        inicio = self.ahora + timedelta(days=1)
+        respuesta = self.cliente.post('/api/asignaciones/bulk/', [
+            self.datos_api(inicio, inicio + timedelta(hours=1)),
+            self.datos_api(inicio, inicio + timedelta(hours=2), tipo_servicio='insumos'),
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertEqual(respuesta.data['procesadas'], 2)
+        self.assertEqual(sorted(Asignacion.objects.values_list('id', flat=True)), sorted(respuesta.data['ids']))
+
+    def test_choque_dentro_del_lote_no_escribe_nada(self):
+        vehiculo = self.crear_vehiculo()
+        inicio = self.ahora + timedelta(days=1)
+        respuesta = self.cliente.post('/api/asignaciones/bulk/', [
+            self.datos_api(inicio, inicio + timedelta(hours=2), vehiculo_id=vehiculo.pk),
+            self.datos_api(inicio + timedelta(hours=1), inicio + timedelta(hours=3), vehiculo_id=vehiculo.pk),
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        # Cada elemento del par informa el choque con el otro
+        self.assertEqual([(e['indice'], list(e['errores'])) for e in respuesta.data['errores']], [(0, ['vehiculo_id']), (1, ['vehiculo_id'])])
+        self.assertIn('elemento 0 del lote', respuesta.data['errores'][1]['errores']['vehiculo_id'][0])
+        self.assertFalse(Asignacion.objects.exists())
+
+    def test_rechaza_asignacion_mas_larga_que_duracion_maxima(self):
+        inicio = self.ahora + timedelta(days=1)
+        fin = inicio + conflictos.DURACION_MAXIMA + timedelta(minutes=1)
+        respuesta = self.cliente.post('/api/asignaciones/bulk/', [
+            self.datos_api(inicio, inicio + timedelta(hours=1)),
+            self.datos_api(inicio, fin),
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([e['indice'] for e in respuesta.data['errores']], [1])
+        self.assertFalse(Asignacion.objects.exists())
+
+
+class PaginacionTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        for h in range(25):
+            self.crear_asignacion(self.ahora + timedelta(hours=h))
+
+    def test_cursor_recorre_todo_sin_repetir_y_vuelve_atras(self):
+        esperados = list(Asignacion.objects.order_by('-fecha_hora_solicitud', '-id').values_list('id', flat=True))
+        paginas, url = [], '/api/asignaciones/?paginacion=cursor'
+        while url:
+            respuesta = self.cliente.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertNotIn('count', respuesta.data)
+            paginas.append([fila['id'] for fila in respuesta.data['results']])
+            url = respuesta.data['next']
+            anterior = respuesta.data['previous']
+        self.assertEqual([pk for pagina in paginas for pk in pagina], esperados)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        respuesta = self.cliente.get(anterior)
+        self.assertEqual([fila['id'] for fila in respuesta.data['results']], paginas[1])
+
+    def test_cursor_invalido_es_404(self):
+        self.assertEqual(self.cliente.get('/api/asignaciones/?cursor=no-es-un-cursor').status_code, 404)
+
+    def test_conteo_cacheado_se_invalida_al_escribir(self):
+        respuesta = self.cliente.get('/api/asignaciones/')
+        self.assertEqual((respuesta.data['count'], respuesta.data['count_exacto']), (11, False))  # Cota inferior
+        respuesta = self.cliente.get('/api/asignaciones/?conteo=exacto')
+        self.assertEqual((respuesta.data['count'], respuesta.data['count_exacto']), (25, True))
+        with self.assertNumQueries(1):  # Sólo la página: el total sale del caché
+            respuesta = self.cliente.get('/api/asignaciones/')
+        self.assertEqual((respuesta.data['count'], respuesta.data['count_exacto']), (25, True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_asignacion()
+        respuesta = self.cliente.get('/api/asignaciones/')
+        self.assertFalse(respuesta.data['count_exacto'])
+        # La última página deduce el total exacto y lo deja en el caché
+        self.cliente.get('/api/asignaciones/?page=3')
+        self.assertEqual(self.cliente.get('/api/asignaciones/').data['count'], 26)
+
+
+class BusquedaTextoTests(PruebaBase):
+
+    def buscar(self, texto, **params):
+        respuesta = self.cliente.get('/api/asignaciones/', {'search': texto, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return [fila['id'] for fila in respuesta.data['results']]
+
+    def indexadas(self, termino):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM asignaciones_asignacion_fts WHERE asignaciones_asignacion_fts MATCH %s', [termino]
+            )
+            return {fila[0] for fila in cursor.fetchall()}
+
+    def test_triggers_mantienen_el_indice(self):
+        asignacion = self.crear_asignacion(destino_descripcion='Hospital Rancagua')
+        self.assertEqual(self.indexadas('rancagua'), {asignacion.pk})
+
+        # queryset.update() no dispara señales: el índice lo mantiene el trigger
+        Asignacion.objects.filter(pk=asignacion.pk).update(destino_descripcion='Consultorio Curicó')
+        self.assertEqual(self.indexadas('rancagua'), set())
+        self.assertEqual(self.indexadas('curico'), {asignacion.pk})
+
+        Asignacion.objects.filter(pk=asignacion.pk).delete()
+        self.assertEqual(self.indexadas('curico'), set())
+
+    def test_prefijos_y_datos_del_vehiculo(self):
+        ambulancia = self.crear_asignacion(destino_descripcion='Traslado en ambulancia')
+        vehiculo = self.crear_vehiculo(patente='ZZ-9911', marca='Mercedes')
+        con_vehiculo = self.crear_asignacion(vehiculo=vehiculo, destino_descripcion='Hospital')
+        self.crear_asignacion(destino_descripcion='Hospital Base')
+
+        self.assertEqual(self.buscar('ambul'), [ambulancia.pk])
+        self.assertEqual(self.buscar('merced'), [con_vehiculo.pk])
+        self.assertEqual(self.buscar('hospital merced'), [con_vehiculo.pk])  # Todos los términos
+
+    def test_ordena_por_relevancia(self):
+        # La más relevante se crea primero: el orden por defecto (más recientes) la dejaría al final
+        tres_veces = self.crear_asignacion(destino_descripcion='Laboratorio', observaciones='Laboratorio, muestras del laboratorio')
+        una_vez = self.crear_asignacion(
+            inicio=self.ahora + timedelta(days=2), destino_descripcion='Hospital',
+            observaciones='Pasa por el laboratorio de la clínica central',
+        )
+        self.crear_asignacion(destino_descripcion='Hospital')
+
+        self.assertEqual(self.buscar('laboratorio'), [tres_veces.pk, una_vez.pk])
+        # Un ?ordering= explícito manda sobre la relevancia
+        self.assertEqual(self.buscar('laboratorio', ordering='-fecha_hora_requerida_inicio'), [una_vez.pk, tres_veces.pk])
+
+
+class RespuestasParcialesTests(PruebaBase):
+
+    def test_expand_anida_los_serializers_registrados(self):
+        conductor = self.crear_conductor()
+        vehiculo = self.crear_vehiculo(conductor_preferente=conductor)
+        asignacion = self.crear_asignacion(vehiculo=vehiculo, conductor=conductor)
+        respuesta = self.cliente.get(f'/api/asignaciones/{asignacion.pk}/?expand=vehiculo,conductor&fields=id,vehiculo,conductor')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(set(respuesta.data), {'id', 'vehiculo', 'conductor'})
+        self.assertEqual(respuesta.data['vehiculo']['patente'], vehiculo.patente)
+        self.assertEqual(respuesta.data['conductor']['numero_licencia'], conductor.numero_licencia)
+        # Sólo el serializer de nivel superior aplica ?expand=
+        self.assertEqual(respuesta.data['vehiculo']['conductor_preferente'], conductor.pk)
+
+
+class RespuestaCacheadaTests(PruebaBase):
+
+    def test_if_none_match_responde_304_sin_consultas(self):
+        self.crear_vehiculo()
+        respuesta = self.cliente.get('/api/vehiculos/')
+        etag = respuesta['ETag']
+        with self.assertNumQueries(0):
+            respuesta = self.cliente.get('/api/vehiculos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        # Otra URL tiene otro ETag
+        self.assertNotEqual(self.cliente.get('/api/vehiculos/?ordering=estado')['ETag'], etag)
+
+    def test_escribir_cambia_la_version(self):
+        vehiculo = self.crear_vehiculo(marca='Toyota')
+        etag = self.cliente.get(f'/api/vehiculos/{vehiculo.pk}/')['ETag']
+        etag_conductores = self.cliente.get('/api/conductores/')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cliente.get(f'/api/vehiculos/{vehiculo.pk}/').data['marca'], 'Toyota')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.cliente.patch(f'/api/vehiculos/{vehiculo.pk}/', {'marca': 'Nissan'}, format='json').status_code, 200)
+        respuesta = self.cliente.get(f'/api/vehiculos/{vehiculo.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.data['marca'], 'Nissan')
+
+        # Los listados que no dependen de Vehiculo siguen vigentes
+        self.assertEqual(self.cliente.get('/api/conductores/', HTTP_IF_NONE_MATCH=etag_conductores).status_code, 304)
+
+    def test_autenticacion_perezosa(self):
+        # Las lecturas no dependen del usuario: un anónimo recibe el cuerpo que cacheó otro usuario
+        vehiculo = self.crear_vehiculo()
+        autenticado = self.cliente.get('/api/vehiculos/')
+        anonimo = APIClient()
+        with self.assertNumQueries(0):
+            respuesta = anonimo.get('/api/vehiculos/')
+        self.assertEqual((respuesta.status_code, respuesta['ETag']), (200, autenticado['ETag']))
+        self.assertEqual(respuesta.data, autenticado.data)
+
+        # Pero las escrituras sí autentican, aunque perform_authentication no haga nada
+        self.assertEqual(anonimo.patch(f'/api/vehiculos/{vehiculo.pk}/', {'marca': 'Kia'}, format='json').status_code, 401)
+        anonimo.credentials(HTTP_AUTHORIZATION='Token invalido')
+        self.assertEqual(anonimo.patch(f'/api/vehiculos/{vehiculo.pk}/', {'marca': 'Kia'}, format='json').status_code, 401)
+        vehiculo.refresh_from_db()
+        self.assertEqual(vehiculo.marca, 'Toyota')
+
+
+class TransicionesTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        self.vehiculo = self.crear_vehiculo(estado='reservado')
+        self.conductor = self.crear_conductor()
+        self.asignacion = self.crear_asignacion(self.ahora, vehiculo=self.vehiculo, conductor=self.conductor)
+
+    def estados(self):
+        self.asignacion.refresh_from_db()
+        self.vehiculo.refresh_from_db()
+        self.conductor.refresh_from_db()
+        return self.asignacion.estado, self.vehiculo.estado, self.conductor.estado_disponibilidad
+
+    def test_iniciar_y_completar(self):
+        respuesta = self.cliente.post(f'/api/asignaciones/{self.asignacion.pk}/iniciar/')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(self.estados(), ('activa', 'en_uso', 'en_ruta'))
+        respuesta = self.cliente.post('/api/asignaciones/transicion/', {'accion': 'completar', 'ids': [self.asignacion.pk, 999999]}, format='json')
+        self.assertEqual(respuesta.data['procesadas'], [self.asignacion.pk])
+        self.assertEqual(list(respuesta.data['errores']), [999999])
+        self.assertEqual(self.estados(), ('completada', 'disponible', 'disponible'))
+        self.assertIsNotNone(self.asignacion.fecha_hora_fin_real)
+
+    def test_solo_una_de_dos_transiciones_concurrentes_gana(self):
+        # Ambos despachadores leyeron la asignación como 'programada'
+        leida = Asignacion.objects.filter(pk=self.asignacion.pk).values(*estadisticas.CAMPOS, 'conductor_id').get()
+        self.assertEqual(transiciones.TRANSICIONES['iniciar'](dict(leida)), {'estado': 'activa'})
+        with self.assertRaises(transiciones.TransicionInvalida):
+            transiciones.TRANSICIONES['iniciar'](dict(leida))
+        self.assertEqual(self.estados(), ('activa', 'en_uso', 'en_ruta'))
+
+    def test_vehiculo_no_disponible_revierte_la_transicion(self):
+        Vehiculo.objects.filter(pk=self.vehiculo.pk).update(estado='mantenimiento')
+        procesadas, errores = transiciones.transicionar('iniciar', [self.asignacion.pk])
+        self.assertEqual(procesadas, [])
+        self.assertIn(self.vehiculo.patente, errores[self.asignacion.pk])
+        self.assertEqual(self.estados(), ('programada', 'mantenimiento', 'disponible'))
+
+
+class ExportacionTests(PruebaBase):
+
+    def exportar(self, **params):
+        respuesta = self.cliente.get('/api/asignaciones/exportar/', params)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b''.join(respuesta.streaming_content).decode()
+
+    def test_csv_con_encabezado_y_filas(self):
+        vehiculo = self.crear_vehiculo(patente='EX-0001')
+        asignacion = self.crear_asignacion(vehiculo=vehiculo, destino_descripcion='Hospital, "sector B"', duracion=None)
+
+        respuesta, texto = self.exportar(formato='csv')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="asignaciones.csv"', respuesta['Content-Disposition'])
+        self.assertTrue(texto.startswith('\ufeff'))
+        filas = list(csv.DictReader(texto[1:].splitlines()))
+        self.assertEqual(len(filas), 1)
+        fila = filas[0]
+        self.assertEqual(fila['id'], str(asignacion.pk))
+        self.assertEqual(fila['vehiculo__patente'], 'EX-0001')
+        self.assertEqual(fila['destino_descripcion'], 'Hospital, "sector B"')
+        self.assertEqual(fila['fecha_hora_fin_prevista'], '')
+        self.assertEqual(fila['fecha_hora_requerida_inicio'], timezone.localtime(asignacion.fecha_hora_requerida_inicio).isoformat())
+
+    def test_ndjson_respeta_filtros_y_busqueda(self):
+        completada = self.crear_asignacion(estado='completada', destino_descripcion='Hospital Rancagua')
+        self.crear_asignacion(estado='completada', destino_descripcion='Consultorio')
+        self.crear_asignacion(estado='programada', destino_descripcion='Hospital Rancagua')
+
+        respuesta, texto = self.exportar(formato='ndjson', estado='completada', search='rancagua')
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in texto.splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], [completada.pk])
+        self.assertEqual(set(filas[0]), set(exportacion.COLUMNAS))
+
+    def test_sin_filas_y_formato_invalido(self):
+        _, texto = self.exportar(formato='csv')
+        self.assertEqual(texto, '\ufeff' + ','.join(exportacion.COLUMNAS) + '\r\n')
+        self.assertEqual(self.exportar(formato='ndjson')[1], '')
+        self.assertEqual(self.cliente.get('/api/asignaciones/exportar/?formato=xlsx').status_code, 400)
+
+
+class EstadisticasTests(PruebaBase):
+
+    def rollups(self):
+        return sorted(EstadisticaDiaria.objects.exclude(total=0).values_list(
+            'fecha', 'vehiculo_id', 'tipo_servicio', 'total', 'completadas', 'canceladas'))
+
+    def test_deltas_coinciden_con_reconstruir(self):
+        vehiculo = self.crear_vehiculo()
+        a = self.crear_asignacion(vehiculo=vehiculo)
+        b = self.crear_asignacion(self.ahora + timedelta(days=2))
+        c = self.crear_asignacion(self.ahora + timedelta(days=2), tipo_servicio='insumos')
+        b.estado = 'cancelada'
+        b.save()
+        c.vehiculo = vehiculo
+        c.fecha_hora_requerida_inicio += timedelta(days=1)
+        c.save()
+        Asignacion.objects.filter(pk=a.pk).update(estado='activa')
+        transiciones.transicionar('completar', [a.pk])
+        b.delete()
+
+        incrementales = self.rollups()
+        self.assertEqual(sum(fila[3] for fila in incrementales), 2)
+        self.assertIn((timezone.localtime(a.fecha_hora_requerida_inicio).date(), vehiculo.pk, 'funcionarios', 1, 1, 0), incrementales)
+        estadisticas.reconstruir()
+        self.assertEqual(self.rollups(), incrementales)
+
+    def test_endpoint_lee_los_rollups(self):
+        self.crear_asignacion(self.ahora + timedelta(days=1))
+        self.crear_asignacion(self.ahora + timedelta(days=1), estado='cancelada')
+        dia = timezone.localtime(self.ahora + timedelta(days=1)).date()
+        respuesta = self.cliente.get(f'/api/estadisticas/?desde={dia}&hasta={dia}')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([(d['total'], d['canceladas']) for d in respuesta.data['por_dia']], [(2, 1)])
+
+    def test_actualizacion_masiva_ajusta_estadisticas(self):
+        asignaciones = [self.crear_asignacion(self.ahora + timedelta(days=1, hours=h)) for h in range(3)]
+        respuesta = self.cliente.patch('/api/asignaciones/bulk/', [
+            {'id': a.pk, 'estado': 'cancelada'} for a in asignaciones[:2]
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        fila = EstadisticaDiaria.objects.get()
+        self.assertEqual((fila.total, fila.canceladas), (3, 2))
+
+
+class PosicionesTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        posiciones._escritas.clear()
+        self.addCleanup(posiciones._escritas.clear)
+        # Sin temporizador: las pruebas vacían el buffer a mano
+        programar = mock.patch.object(posiciones, '_programar_vaciado')
+        programar.start()
+        self.addCleanup(programar.stop)
+
+    def test_ping_del_futuro_no_bloquea_los_siguientes(self):
+        vehiculo = self.crear_vehiculo()
+        futuro = (self.ahora + timedelta(days=30)).isoformat()
+        aceptados, errores = posiciones.registrar([{'patente': vehiculo.patente, 'lat': -20.0, 'lon': -70.0, 'ts': futuro}])
+        self.assertEqual((aceptados, [e['indice'] for e in errores]), (0, [0]))
+        posiciones.registrar([{'patente': vehiculo.patente, 'lat': -33.0, 'lon': -71.0, 'ts': self.ahora.isoformat()}])
+        self.assertEqual(posiciones.vaciar(), 1)
+        vehiculo.refresh_from_db()
+        self.assertEqual((vehiculo.ubicacion_actual_lat, vehiculo.ubicacion_actual_lon), (-33.0, -71.0))
+        # Un pequeño desfase de reloj se acepta
+        casi_ahora = (timezone.now() + posiciones.TOLERANCIA_FUTURO / 2).isoformat()
+        self.assertEqual(posiciones.registrar([{'patente': vehiculo.patente, 'lat': -33.1, 'lon': -71.0, 'ts': casi_ahora}])[0], 1)
+        posiciones.vaciar()
+
+    def test_ts_imposible_es_un_error_del_ping(self):
+        respuesta = self.cliente.post('/api/posiciones/', [
+            {'patente': 'PR-0001', 'lat': -33.45, 'lon': -70.65, 'ts': '2024-13-45T00:00:00'},
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['aceptados'], 0)
+        self.assertEqual([e['indice'] for e in respuesta.data['errores']], [0])
+        with self.assertRaises(posiciones.PingInvalido):
+            posiciones.parsear_ping({'licencia': 'LIC-1', 'lat': 0, 'lon': 0, 'ts': '2024-02-30T10:00:00'})
+
+
+@mock.patch.object(eventos, 'hay_suscriptores', return_value=True)
+class EventosFlotaTests(PruebaBase):
+
+    def publicados(self, guardar):
+        with mock.patch.object(eventos, 'publicar_al_confirmar') as publicar:
+            guardar()
+        return [(tipo, filas[0]) for (tipo, filas), _ in publicar.call_args_list]
+
+    def test_vehiculo_publica_solo_si_cambia_estado_o_posicion(self, _):
+        vehiculo = self.crear_vehiculo()
+        vehiculo.marca = 'Nissan'
+        self.assertEqual(self.publicados(vehiculo.save), [])
+        vehiculo.estado = 'en_uso'
+        self.assertEqual(self.publicados(vehiculo.save), [('vehiculo', eventos.datos_vehiculo(vehiculo))])
+        vehiculo.ubicacion_actual_lat = -33.5
+        self.assertEqual(len(self.publicados(lambda: vehiculo.save(update_fields=['ubicacion_actual_lat']))), 1)
+        self.assertEqual(self.publicados(lambda: vehiculo.save(update_fields=['marca'])), [])
+
+    def test_conductor_publica_solo_si_cambia_disponibilidad(self, _):
+        conductor = self.crear_conductor()
+        conductor.telefono = '+56 9 1234 5678'
+        self.assertEqual(self.publicados(conductor.save), [])
+        conductor.activo = False
+        self.assertEqual(self.publicados(conductor.save), [('conductor', eventos.datos_conductor(conductor))])
+
+
+class TareasTests(PruebaBase):
+
+    def test_rafaga_de_solicitudes_encola_una_sola_resolucion(self):
+        inicio = self.ahora + timedelta(days=1)
+        for _ in range(3):
+            respuesta = self.cliente.post('/api/asignaciones/', self.datos_api(
+                inicio, inicio + timedelta(hours=1), estado='pendiente_auto',
+            ), format='json')
+            self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertEqual(list(Tarea.objects.values_list('tipo', 'clave', 'estado')), [('asignar_pendientes', '', 'pendiente')])
+
+    def test_carga_masiva_encola_una_resolucion(self):
+        inicio = self.ahora + timedelta(days=1)
+        respuesta = self.cliente.post('/api/asignaciones/bulk/', [
+            self.datos_api(inicio, inicio + timedelta(hours=1), estado='pendiente_auto') for _ in range(2)
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertEqual(list(Tarea.objects.values_list('tipo', 'clave')), [('asignar_pendientes', '')])
+
+
+class FotosTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def imagen(self, nombre):
+        salida = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(salida, 'JPEG')
+        return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/jpeg')
+
+    def archivos(self, nombre_foto):
+        return [nombre_foto] + [fotos.ruta_variante(nombre_foto, v) for v in fotos.VARIANTES]
+
+    def test_reemplazar_la_foto_borra_la_anterior_y_sus_variantes(self):
+        vehiculo = self.crear_vehiculo(foto=self.imagen('primera.jpg'))
+        fotos.generar_variantes(vehiculo.pk)
+        anteriores = self.archivos(vehiculo.foto.name)
+        self.assertTrue(all(default_storage.exists(ruta) for ruta in anteriores))
+
+        vehiculo.foto = self.imagen('segunda.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            vehiculo.save()
+        self.assertFalse(any(default_storage.exists(ruta) for ruta in anteriores))
+        self.assertTrue(default_storage.exists(vehiculo.foto.name))
+
+    def test_quitar_la_foto_la_borra(self):
+        vehiculo = self.crear_vehiculo(foto=self.imagen('unica.jpg'))
+        nombre = vehiculo.foto.name
+        vehiculo.foto = None
+        with self.captureOnCommitCallbacks(execute=True):
+            vehiculo.save()
+        self.assertFalse(default_storage.exists(nombre))
+
+
+@mock.patch.dict(metricas._series, clear=True)
+class MetricasTests(PruebaBase):
+
+    def test_middleware_cuenta_peticiones_consultas_y_latencia(self):
+        self.crear_vehiculo()
+        for _ in range(2):
+            self.assertEqual(self.cliente.get('/api/vehiculos/').status_code, 200)
+        self.assertEqual(self.cliente.get('/api/vehiculos/999999/').status_code, 404)
+
+        serie = metricas._series[('vehiculo-list', 'GET')]
+        self.assertEqual(serie.cantidad, 2)
+        self.assertEqual(sum(serie.buckets), 2)
+        self.assertGreater(serie.consultas, 0)
+        self.assertGreater(serie.bytes, 0)
+        self.assertEqual(serie.por_estado, {'2xx': 2})
+        self.assertEqual(metricas._series[('vehiculo-detail', 'GET')].por_estado, {'4xx': 1})
+
+        metricas.registrar('otra', 'POST', 201, 0.3)
+        texto = metricas.texto_prometheus()
+        for linea in (
+            'gestor_http_request_duration_seconds_bucket{ruta="otra",metodo="POST",le="0.25"} 0',
+            'gestor_http_request_duration_seconds_bucket{ruta="otra",metodo="POST",le="0.5"} 1',
+            'gestor_http_request_duration_seconds_bucket{ruta="otra",metodo="POST",le="+Inf"} 1',
+            'gestor_http_request_duration_seconds_count{ruta="vehiculo-list",metodo="GET"} 2',
+            'gestor_http_requests_total{ruta="vehiculo-list",metodo="GET",estado="2xx"} 2',
+        ):
+            self.assertIn(linea, texto)
+
+    def test_acceso_al_endpoint(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)  # También desde 127.0.0.1
+
+        self.client.force_login(User.objects.create_user('comun'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        respuesta = self.client.get('/api/metrics/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('# TYPE gestor_http_request_duration_seconds histogram', respuesta.content.decode())
+        self.client.logout()
+
+        with mock.patch.object(metricas, 'TOKEN', 'secreto'):
+            self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+            self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='secreto').status_code, 403)
+        with mock.patch.object(metricas, 'IPS_PERMITIDAS', {'127.0.0.1'}):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+
+class GenerarDatosTests(PruebaBase):
+
+    def generar(self, **opciones):
+        salida = StringIO()
+        call_command('generar_datos', vehiculos=6, conductores=8, asignaciones=50, dias=10, lote=20,
+                     stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_genera_datos_reproducibles_y_sus_rollups(self):
+        self.assertIn('50 asignaciones', self.generar())
+        self.assertEqual((Vehiculo.objects.count(), Conductor.objects.count(), Asignacion.objects.count()), (6, 8, 50))
+        self.assertEqual(EstadisticaDiaria.objects.aggregate(total=Sum('total'))['total'], 50)
+        primera = list(Asignacion.objects.order_by('id').values_list('destino_descripcion', 'estado', 'req_pasajeros'))
+
+        # --limpiar reemplaza los datos; con la misma semilla se obtiene lo mismo
+        self.generar(limpiar=True)
+        self.assertEqual(Asignacion.objects.count(), 50)
+        self.assertEqual(list(Asignacion.objects.order_by('id').values_list('destino_descripcion', 'estado', 'req_pasajeros')), primera)
+
+
+@override_settings(CACHES=CACHES_PRUEBAS)
+@mock.patch.object(replicas, 'REPLICAS', ['replica'])
+class ReplicasTests(SimpleTestCase):
+    """Sin base de datos: dentro de la transacción de un TestCase el router siempre elige 'default'."""
+
+    def setUp(self):
+        caches['versiones'].clear()
+        self.fabrica = RequestFactory()
+        self.router = replicas.RouterReplicas()
+
+    def atender(self, request, respuesta=None):
+        """Pasa la petición por el middleware y devuelve (respuesta, alias de lectura y de escritura en la vista)."""
+        vistos = {}
+
+        def vista(request):
+            vistos['lectura'] = self.router.db_for_read(Vehiculo)
+            vistos['escritura'] = self.router.db_for_write(Vehiculo)
+            return respuesta or HttpResponse()
+        return replicas.ReplicaLecturaMiddleware(vista)(request), vistos
+
+    def test_lecturas_a_la_replica_y_escrituras_a_default(self):
+        _, vistos = self.atender(self.fabrica.get('/api/vehiculos/'))
+        self.assertEqual(vistos, {'lectura': 'replica', 'escritura': 'default'})
+        # Fuera de una petición, en una transacción o con usar_primaria() se lee de 'default'
+        self.assertIsNone(replicas.replica_actual())
+        self.assertEqual(self.router.db_for_read(Vehiculo), 'default')
+
+        def vista(request):
+            with replicas.usar_primaria():
+                primaria = self.router.db_for_read(Vehiculo)
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                en_transaccion = self.router.db_for_read(Vehiculo)
+            return HttpResponse(f'{primaria},{en_transaccion},{self.router.db_for_read(Vehiculo)}')
+        respuesta = replicas.ReplicaLecturaMiddleware(vista)(self.fabrica.get('/'))
+        self.assertEqual(respuesta.content, b'default,default,replica')
+
+        _, vistos = self.atender(self.fabrica.post('/api/vehiculos/'))
+        self.assertEqual(vistos, {'lectura': 'default', 'escritura': 'default'})
+
+    def test_despues_de_escribir_el_cliente_lee_de_default(self):
+        token = {'HTTP_AUTHORIZATION': 'Token abc'}
+        self.atender(self.fabrica.patch('/api/vehiculos/1/', **token))
+        self.assertEqual(self.atender(self.fabrica.get('/api/vehiculos/', **token))[1]['lectura'], 'default')
+        # Otro cliente sigue en la réplica, también si viene de la misma IP
+        self.assertEqual(self.atender(self.fabrica.get('/api/vehiculos/', HTTP_AUTHORIZATION='Token xyz'))[1]['lectura'], 'replica')
+
+        # Al iniciar sesión queda marcada la cookie nueva
+        respuesta = HttpResponse()
+        respuesta.set_cookie(settings.SESSION_COOKIE_NAME, 'nueva')
+        self.atender(self.fabrica.post('/admin/login/'), respuesta)
+        self.fabrica.cookies[settings.SESSION_COOKIE_NAME] = 'nueva'
+        self.assertEqual(self.atender(self.fabrica.get('/api/vehiculos/'))[1]['lectura'], 'default')
+
+        caches['versiones'].clear()  # Pasó la ventana
+        self.assertEqual(self.atender(self.fabrica.get('/api/vehiculos/', **token))[1]['lectura'], 'replica')
+
+    def test_streaming_lee_de_la_replica_al_iterar(self):
+        contenido = (self.router.db_for_read(Vehiculo) for _ in range(2))
+        respuesta, _ = self.atender(self.fabrica.get('/api/asignaciones/exportar/'), StreamingHttpResponse(contenido))
+        self.assertEqual(b''.join(respuesta.streaming_content), b'replicareplica')
+
+    def test_sin_replicas_todo_va_a_default(self):
+        with mock.patch.object(replicas, 'REPLICAS', []):
+            _, vistos = self.atender(self.fabrica.get('/api/vehiculos/'))
+            self.atender(self.fabrica.post('/api/vehiculos/'))
+        self.assertEqual(vistos['lectura'], 'default')
+        self.assertEqual(caches['versiones'].get_many(replicas._claves_cliente(self.fabrica.get('/'))), {})
+
+
+class HabilitacionesTests(PruebaBase):
+
+    def test_filtro_habilitado_para(self):
+        ambos = self.crear_conductor(tipos=('ambulancia', 'auto_funcionario'))
+        solo_auto = self.crear_conductor(tipos=('auto_funcionario',))
+        self.crear_conductor(tipos=())
+
+        def ids(tipo):
+            respuesta = self.cliente.get(f'/api/conductores/?habilitado_para={tipo}')
+            self.assertEqual(respuesta.status_code, 200)
+            return {fila['id'] for fila in respuesta.data['results']}
+
+        self.assertEqual(ids('ambulancia'), {ambos.pk})
+        self.assertEqual(ids('auto_funcionario'), {ambos.pk, solo_auto.pk})
+        self.assertEqual(ids('camion_carga'), set())
+        self.assertEqual(self.cliente.get('/api/conductores/?habilitado_para=nave').status_code, 400)
+
+
+@override_settings(CACHES=CACHES_PRUEBAS)
+class MigracionHabilitacionesTests(TransactionTestCase):
+    """Migra hacia atrás hasta antes de 0011, crea conductores con el texto y vuelve a migrar."""
+
+    def test_copia_el_texto_a_filas(self):
+        call_command('migrate', 'asignaciones', '0010_foto_variantes', verbosity=0)
+        try:
+            apps = MigrationExecutor(connection).loader.project_state(('asignaciones', '0010_foto_variantes')).apps
+            ConductorAntiguo = apps.get_model('asignaciones', 'Conductor')
+            datos = {'nombre': 'Ana', 'apellido': 'Prueba', 'fecha_vencimiento_licencia': date.today()}
+            varios = ConductorAntiguo.objects.create(
+                numero_licencia='L-1', tipos_vehiculo_habilitados=' ambulancia,auto_funcionario , ambulancia', **datos
+            )
+            desconocido = ConductorAntiguo.objects.create(numero_licencia='L-2', tipos_vehiculo_habilitados='nave,otro', **datos)
+            vacio = ConductorAntiguo.objects.create(numero_licencia='L-3', tipos_vehiculo_habilitados='', **datos)
+        finally:
+            call_command('migrate', 'asignaciones', verbosity=0)
+
+        def tipos(pk):
+            return sorted(Conductor.objects.get(pk=pk).habilitaciones.values_list('tipo_vehiculo', flat=True))
+        self.assertEqual(tipos(varios.pk), ['ambulancia', 'auto_funcionario'])
+        self.assertEqual(tipos(desconocido.pk), ['otro'])
+        self.assertEqual(tipos(vacio.pk), [])
+        # post_migrate rehace los triggers FTS que pierde la tabla al reconstruirse
+        self.assertEqual(list(Conductor.objects.filter(pk__in=RawSQL(
+            "SELECT rowid FROM asignaciones_conductor_fts WHERE asignaciones_conductor_fts MATCH 'ana'", []
+        )).order_by('pk').values_list('pk', flat=True)), [varios.pk, desconocido.pk, vacio.pk])
+
+
+class CaracteristicasTests(PruebaBase):
+
+    def test_parsear_reconoce_sinonimos_y_respeta_negaciones(self):
+        bits = caracteristicas.BITS
+        casos = {
+            'Silla de ruedas, refrigerado': bits['silla_ruedas'] | bits['refrigerado'],
+            'camioneta con silla de ruedas y GPS': bits['silla_ruedas'] | bits['gps'],
+            'sin aire acondicionado': 0,
+            'no requiere oxígeno': 0,
+            'no necesita oxígeno ni camilla, GPS': bits['gps'],
+            'sin camilla pero con oxígeno': bits['oxigeno'],
+            'silla de bebé': 0,
+            'aire': 0,
+        }
+        for texto, mascara in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(caracteristicas.parsear(texto)[0], mascara)
+        self.assertEqual(caracteristicas.parsear('silla de bebé, 4x4')[1], ['silla de bebé'])
+
+    def test_filtro_de_vehiculos_por_superconjunto(self):
+        con_todo = self.crear_vehiculo(caracteristicas_adicionales='Aire acondicionado, GPS, Silla de ruedas')
+        con_aire = self.crear_vehiculo(caracteristicas_adicionales='Aire acondicionado')
+        self.crear_vehiculo(caracteristicas_adicionales='Sin aire acondicionado, GPS')
+        self.crear_vehiculo(caracteristicas_adicionales='Silla de bebé')
+
+        def ids(filtro):
+            respuesta = self.cliente.get(f'/api/vehiculos/?caracteristicas={filtro}&fields=id')
+            self.assertEqual(respuesta.status_code, 200)
+            return {fila['id'] for fila in respuesta.data['results']}
+
+        self.assertEqual(ids('aire_acondicionado'), {con_todo.pk, con_aire.pk})
+        self.assertEqual(ids('silla_ruedas,gps'), {con_todo.pk})
+        self.assertEqual(self.cliente.get('/api/vehiculos/?caracteristicas=silla').status_code, 400)
+
+
+class EtaTests(PruebaBase):
+    ORIGEN = (-33.45, -70.65)
+    DESTINO = (-33.35, -70.65)   # 0,1° al norte: 11,12 km
+
+    def setUp(self):
+        super().setUp()
+        eta._distancia_redondeada.cache_clear()
+        self.mediodia = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+
+    def test_duracion_para_una_distancia_conocida(self):
+        self.assertAlmostEqual(eta.distancia_km(*self.ORIGEN, *self.DESTINO), 11.12, places=2)
+        # 11,12 km * 1,3 / 35 km/h = 24,8 min, más 5 de detención; en la punta la velocidad baja a 0,7
+        self.assertEqual(eta.duracion(*self.ORIGEN, *self.DESTINO, self.mediodia, 'auto_funcionario', 'funcionarios'),
+                         timedelta(minutes=29.8))
+        punta = self.mediodia.replace(hour=8)
+        self.assertEqual(eta.duracion(*self.ORIGEN, *self.DESTINO, punta, 'auto_funcionario', 'funcionarios'),
+                         timedelta(minutes=40.4))
+        # La versión vectorizada da lo mismo que la escalar
+        filas = [{'inicio': inicio, 'origen_lat': self.ORIGEN[0], 'origen_lon': self.ORIGEN[1],
+                  'destino_lat': self.DESTINO[0], 'destino_lon': self.DESTINO[1],
+                  'tipo_vehiculo': 'auto_funcionario', 'tipo_servicio': 'funcionarios'} for inicio in (self.mediodia, punta)]
+        self.assertEqual(eta.estimar_fines(filas), [
+            eta.estimar_fin(f['inicio'], *self.ORIGEN, *self.DESTINO, 'auto_funcionario', 'funcionarios') for f in filas
+        ])
+
+    def test_sin_coordenadas(self):
+        self.assertIsNone(eta.distancia_km(None, *self.ORIGEN[1:], *self.DESTINO))
+        self.assertIsNone(eta.estimar_fin(self.mediodia, *self.ORIGEN, None, None))
+        self.assertIsNone(eta.estimar_fin(None, *self.ORIGEN, *self.DESTINO))
+        fila = {'inicio': self.mediodia, 'origen_lat': None, 'origen_lon': None, 'destino_lat': 1.0, 'destino_lon': 1.0}
+        self.assertEqual(eta.estimar_fines([fila]), [None])
+
+        # Por la API queda sin fin previsto en vez de fallar
+        inicio = self.ahora + timedelta(days=1)
+        datos = self.datos_api(inicio, inicio, origen_lat=self.ORIGEN[0])
+        del datos['fecha_hora_fin_prevista']
+        respuesta = self.cliente.post('/api/asignaciones/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertIsNone(Asignacion.objects.get(pk=respuesta.data['id']).fecha_hora_fin_prevista)
+
+    def test_cache_de_distancias_al_cambiar_la_posicion(self):
+        distancia = eta.distancia_km(*self.ORIGEN, *self.DESTINO)
+        eta.distancia_km(*self.ORIGEN, *self.DESTINO)
+        self.assertEqual(eta._distancia_redondeada.cache_info()[:2], (1, 1))  # (aciertos, fallos)
+
+        # Unos metros no cambian la clave redondeada; 1 km sí, y no se devuelve la distancia anterior
+        self.assertEqual(eta.distancia_km(self.ORIGEN[0] + 0.0001, self.ORIGEN[1], *self.DESTINO), distancia)
+        movida = eta.distancia_km(self.ORIGEN[0] - 0.01, self.ORIGEN[1], *self.DESTINO)
+        self.assertAlmostEqual(movida - distancia, 1.11, places=2)
+        self.assertEqual(eta._distancia_redondeada.cache_info()[:2], (2, 2))
+
+    def test_carga_masiva_estima_los_fines(self):
+        inicio = self.ahora + timedelta(days=1)
+        item = {'destino_descripcion': 'Hospital', 'tipo_servicio': 'insumos', 'estado': 'programada',
+                'fecha_hora_requerida_inicio': inicio.isoformat(), 'origen_lat': self.ORIGEN[0], 'origen_lon': self.ORIGEN[1],
+                'destino_lat': self.DESTINO[0], 'destino_lon': self.DESTINO[1]}
+        respuesta = self.cliente.post('/api/asignaciones/bulk/', [item, self.datos_api(inicio, inicio + timedelta(hours=3))], format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        estimada, con_fin = (Asignacion.objects.get(pk=pk) for pk in respuesta.data['ids'])
+        self.assertEqual(estimada.fecha_hora_fin_prevista, eta.estimar_fin(inicio, *self.ORIGEN, *self.DESTINO, None, 'insumos'))
+        self.assertEqual(con_fin.fecha_hora_fin_prevista, inicio + timedelta(hours=3))
+
+
+class PlanificacionTests(PruebaBase):
+
+    def test_no_programa_servicios_mas_largos_que_duracion_maxima(self):
+        vehiculo = self.crear_vehiculo()
+        self.crear_conductor()
+        inicio = self.ahora + timedelta(hours=2)
+        cercana = self.crear_asignacion(inicio, None, estado='pendiente_auto', origen_lat=-33.45, origen_lon=-70.65,
+                                        destino_lat=-33.40, destino_lon=-70.60)
+        # ~1.600 km: la ETA supera DURACION_MAXIMA
+        lejana = self.crear_asignacion(inicio + timedelta(hours=3), None, estado='pendiente_auto', origen_lat=-33.45,
+                                       origen_lon=-70.65, destino_lat=-18.48, destino_lon=-70.31)
+        resumen = planificacion.planificar(self.ahora, self.ahora + timedelta(hours=12), tiempo_limite=1, procesos=1)
+        self.assertEqual(resumen['programadas'], 1)
+        cercana.refresh_from_db()
+        lejana.refresh_from_db()
+        self.assertEqual((cercana.estado, cercana.vehiculo_id), ('programada', vehiculo.pk))
+        self.assertEqual(lejana.estado, 'pendiente_auto')
+
+    def test_no_deshace_reservas_manuales(self):
+        vehiculo = self.crear_vehiculo()
+        libre = self.crear_conductor()
+        ausente = self.crear_conductor(estado_disponibilidad='no_disponible')
+        inicio = self.ahora + timedelta(hours=2)
+        manual = self.crear_asignacion(inicio, vehiculo=vehiculo, conductor=ausente)
+        pendiente = self.crear_asignacion(inicio + timedelta(minutes=30), None, estado='pendiente_auto')
+        planificacion.planificar(self.ahora, self.ahora + timedelta(hours=12), tiempo_limite=1, procesos=1)
+        manual.refresh_from_db()
+        pendiente.refresh_from_db()
+        self.assertEqual((manual.estado, manual.vehiculo_id, manual.conductor_id), ('programada', vehiculo.pk, ausente.pk))
+        # El vehículo de la reserva manual está ocupado en ese horario
+        self.assertEqual(pendiente.estado, 'pendiente_auto')
+
+    def test_replanifica_las_del_motor(self):
+        disponible = self.crear_vehiculo()
+        self.crear_conductor()
+        inicio = self.ahora + timedelta(hours=2)
+        # Su vehículo entró a mantenimiento: el plan la mueve a otro
+        del_motor = self.crear_asignacion(inicio, estado='programada', asignada_por_motor=True,
+                                          vehiculo=self.crear_vehiculo(estado='mantenimiento'))
+        planificacion.planificar(self.ahora, self.ahora + timedelta(hours=12), tiempo_limite=1, procesos=1)
+        del_motor.refresh_from_db()
+        self.assertEqual((del_motor.estado, del_motor.vehiculo_id), ('programada', disponible.pk))
+        self.assertTrue(del_motor.asignada_por_motor)
+
+    def test_editarla_a_mano_la_saca_del_motor(self):
+        asignacion = self.crear_asignacion(asignada_por_motor=True)
+        respuesta = self.cliente.patch(f'/api/asignaciones/{asignacion.pk}/', {'conductor_id': self.crear_conductor().pk}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        asignacion.refresh_from_db()
+        self.assertFalse(asignacion.asignada_por_motor)
+
+    def test_simulacion_de_la_api_no_usa_pool_de_procesos(self):
+        self.crear_vehiculo()
+        self.crear_conductor()
+        self.crear_asignacion(self.ahora + timedelta(hours=2), None, estado='pendiente_auto')
+        with mock.patch.object(planificacion, 'ProcessPoolExecutor') as pool:
+            respuesta = self.cliente.post('/api/asignaciones/planificar/?simular=1')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data['programadas'], 1)
+        pool.assert_not_called()
+        self.assertFalse(Asignacion.objects.filter(estado='programada').exists())
+
+
+class DisponibilidadTests(PruebaBase):
+
+    def test_reserva_larga_que_empezo_antes_de_la_ventana_ocupa(self):
+        vehiculo = self.crear_vehiculo()
+        desde = self.ahora + timedelta(days=3)
+        inicio = desde - conflictos.DURACION_MAXIMA + timedelta(hours=2)
+        reserva = self.crear_asignacion(inicio, conflictos.DURACION_MAXIMA, vehiculo=vehiculo)
+        bloques, libres = disponibilidad.calendario('vehiculo', Vehiculo.objects.all(), desde, desde + timedelta(days=1))[vehiculo.pk]
+        self.assertEqual(bloques, [[desde, desde + timedelta(hours=2), [reserva.pk]]])
+        self.assertEqual(libres, [(desde + timedelta(hours=2), desde + timedelta(days=1))])
+
+    def test_funde_reservas_solapadas_y_descarta_canceladas(self):
+        vehiculo = self.crear_vehiculo()
+        desde = self.ahora + timedelta(days=3)
+        a = self.crear_asignacion(desde + timedelta(hours=1), timedelta(hours=2), vehiculo=vehiculo)
+        b = self.crear_asignacion(desde + timedelta(hours=2), timedelta(hours=2), vehiculo=vehiculo)
+        self.crear_asignacion(desde + timedelta(hours=6), timedelta(hours=1), vehiculo=vehiculo, estado='cancelada')
+        bloques, _ = disponibilidad.calendario('vehiculo', Vehiculo.objects.all(), desde, desde + timedelta(days=1))[vehiculo.pk]
+        self.assertEqual(bloques, [[desde + timedelta(hours=1), desde + timedelta(hours=4), [a.pk, b.pk]]])
+
+
+class AdminTests(PruebaBase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        self.url = reverse('admin:asignaciones_asignacion_changelist')
+
+    def test_listados_y_filtro_autocompletar(self):
+        vehiculo = self.crear_vehiculo(patente='AD-0001')
+        elegida = self.crear_asignacion(vehiculo=vehiculo)
+        self.crear_asignacion(vehiculo=self.crear_vehiculo(patente='AD-0002'))
+        for modelo in ('vehiculo', 'conductor', 'asignacion'):
+            self.assertEqual(self.client.get(reverse(f'admin:asignaciones_{modelo}_changelist')).status_code, 200)
+
+        respuesta = self.client.get(self.url, {'vehiculo__id__exact': vehiculo.pk, 'estado': 'programada', 'q': 'Hospital'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([a.pk for a in respuesta.context['cl'].result_list], [elegida.pk])
+        html = respuesta.content.decode()
+        # El selector sólo trae la opción elegida (no la tabla completa) y conserva los demás parámetros
+        selector = re.search(r'<select[^>]*id="filtro_vehiculo".*?</select>', html, re.S).group()
+        self.assertIn(f'<option value="{vehiculo.pk}" selected>', selector)
+        self.assertNotIn('AD-0002', selector)
+        self.assertIn('<input type="hidden" name="estado" value="programada">', html)
+        self.assertIn('<input type="hidden" name="q" value="Hospital">', html)
+
+    def test_anios_de_date_hierarchy(self):
+        todas = AniosIndexadosQuerySet(Asignacion)
+        self.assertEqual(list(todas.datetimes('fecha_hora_requerida_inicio', 'year')), [])
+        for anio in (2024, 2026):
+            self.crear_asignacion(timezone.make_aware(datetime(anio, 6, 1, 12, 0)))
+        self.crear_asignacion(timezone.make_aware(datetime(2026, 12, 31, 23, 30)))
+        # Mismo resultado que el datetimes() de Django (que trunca cada fila), también sin los años vacíos
+        for orden in ('ASC', 'DESC'):
+            self.assertEqual(
+                list(todas.datetimes('fecha_hora_requerida_inicio', 'year', orden)),
+                list(Asignacion.objects.datetimes('fecha_hora_requerida_inicio', 'year', orden)),
+            )
+        self.assertEqual([d.year for d in todas.datetimes('fecha_hora_requerida_inicio', 'year')], [2024, 2026])
+        self.assertEqual(self.client.get(self.url, {'fecha_hora_requerida_inicio__year': 2026}).status_code, 200)
+
+    @mock.patch.object(conteos, 'MINIMO_ESTIMADO', 1)
+    def test_paginador_estima_sin_filtros(self):
+        for _ in range(3):
+            self.crear_asignacion()
+        conteos.analizar()
+        self.crear_asignacion(estado='cancelada')
+        # Sin filtros vale lo que dejó ANALYZE; con filtros se cuenta exacto
+        self.assertEqual(ConteoEstimadoPaginator(Asignacion.objects.order_by('pk'), 10).count, 3)
+        self.assertEqual(ConteoEstimadoPaginator(Asignacion.objects.filter(estado='cancelada').order_by('pk'), 10).count, 1)
+
+    def test_accion_masiva_de_estado(self):
+        vehiculo = self.crear_vehiculo()
+        asignaciones = [self.crear_asignacion(vehiculo=vehiculo) for _ in range(3)]
+        ya_cancelada = self.crear_asignacion(vehiculo=vehiculo, estado='cancelada')
+        ids = [a.pk for a in asignaciones[:2]] + [ya_cancelada.pk]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(self.url, {'action': 'marcar_cancelada', '_selected_action': ids}, follow=True)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('2 asignación(es) marcada(s) como &quot;Cancelada&quot;', respuesta.content.decode())
+        self.assertEqual(
+            dict(Asignacion.objects.values_list('id', 'estado')),
+            {asignaciones[0].pk: 'cancelada', asignaciones[1].pk: 'cancelada', asignaciones[2].pk: 'programada', ya_cancelada.pk: 'cancelada'},
+        )
+        # queryset.update() no dispara señales: los rollups se ajustan en la acción
+        self.assertEqual(EstadisticaDiaria.objects.aggregate(Sum('canceladas'))['canceladas__sum'], 3)
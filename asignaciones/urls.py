@@ -1,7 +1,8 @@
 # asignaciones/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VehiculoViewSet, ConductorViewSet, AsignacionViewSet
+from .metricas import vista_metricas
+from .views import VehiculoViewSet, ConductorViewSet, AsignacionViewSet, EstadisticasView, PosicionesView, stream_eventos
 
 router = DefaultRouter()
 router.register(r'vehiculos', VehiculoViewSet, basename='vehiculo')
@@ -9,5 +10,9 @@ router.register(r'conductores', ConductorViewSet, basename='conductor')
 router.register(r'asignaciones', AsignacionViewSet, basename='asignacion')
 
 urlpatterns = [
+    path('estadisticas/', EstadisticasView.as_view(), name='estadisticas'),
+    path('posiciones/', PosicionesView.as_view(), name='posiciones'),
+    path('eventos/', stream_eventos, name='eventos'),
+    path('metrics/', vista_metricas, name='metricas'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,47 +1,254 @@
 # GOPH/gestor_vehiculos/asignaciones/views.py
+import asyncio
+
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from rest_framework.authtoken.models import Token
+from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 
 
+from . import eventos
+from .cache import RespuestaCacheadaMixin
 from .models import Vehiculo, Conductor, Asignacion
+from .filters import BusquedaTextoFilter, ConductorFilter, VehiculoFilter, filtrar_habilitados
+from .pagination import AsignacionPagination, ConteoCacheadoPagination
 from .serializers import (
+    CaracteristicasField,
     VehiculoSerializer,
     ConductorSerializer,
     AsignacionSerializer
 )
+from .services import carga_masiva, disponibilidad
+from .services.cercania import buscar_cercanos
+from .services.conflictos import detectar_conflictos
+from .services.estadisticas import resumen
+from .services.exportacion import exportar, FORMATOS
+from .services import planificacion, posiciones, tareas
+from .services.fotos import VARIANTES, ruta_variante, version_foto
+from .services.transiciones import transicionar, TRANSICIONES, MAX_TRANSICIONES
+
+
+MAX_HORIZONTE_PLAN = timedelta(days=7)
+MAX_SEGUNDOS_SIMULACION = 5
+
+
+def parametro_fecha(request, nombre, por_defecto):
+    """Lee un datetime ISO de los query params (naive = hora local). Lanza ValueError si es inválido."""
+    valor = request.query_params.get(nombre)
+    if not valor:
+        return por_defecto
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        raise ValueError(nombre)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+class ListadoRapidoMixin:
+    """
+    Listados sin el costo por campo/objeto de DRF: si todos los campos pedidos son columnas simples
+    (texto, números, fechas, choices o ids de relaciones) se lee el queryset con .values() y se arma
+    cada fila como un dict. Si hay algún campo calculado o un objeto anidado (?expand=) se usa el
+    serializer normal.
+    """
+    CAMPOS_SIMPLES = (
+        serializers.BooleanField, serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+        serializers.FloatField, serializers.DecimalField, serializers.DateTimeField, serializers.DateField,
+        serializers.PrimaryKeyRelatedField, CaracteristicasField,
+    )
+    CAMPOS_CONVERTIDOS = (serializers.DateTimeField, serializers.DateField, serializers.DecimalField, CaracteristicasField)
+
+    def campos_valores(self, serializer):
+        campos = []
+        for nombre, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if not isinstance(campo, self.CAMPOS_SIMPLES) or '.' in campo.source or campo.source == '*':
+                return None
+            convertir = campo.to_representation if isinstance(campo, self.CAMPOS_CONVERTIDOS) else None
+            campos.append((nombre, campo.source, convertir))
+        return campos
+
+    def list(self, request, *args, **kwargs):
+        campos = self.campos_valores(self.get_serializer())
+        if campos is None:
+            return super().list(request, *args, **kwargs)
+
+        # 'id' y los campos de orden se leen siempre: la paginación por cursor los necesita
+        extra = {'id', *getattr(self.paginator, 'campos_cursor', ())}
+        columnas = list({fuente for _, fuente, _ in campos} | extra)
+        queryset = self.filter_queryset(self.get_queryset()).values(*columnas)
+        page = self.paginate_queryset(queryset)
+        filas = page if page is not None else queryset
+        data = [
+            {nombre: (convertir(fila[fuente]) if convertir and fila[fuente] is not None else fila[fuente])
+             for nombre, fuente, convertir in campos}
+            for fila in filas
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class CercanosMixin:
+    """Agrega la acción GET .../cercanos/?lat=&lon=&k=&radio_km= usando el índice 'celda_geo'."""
+    MAX_K_CERCANOS = 100
+
+    def filtrar_cercanos(self, queryset):
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='cercanos')
+    def cercanos(self, request):
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+            k = int(request.query_params.get('k', 10))
+            radio_km = request.query_params.get('radio_km')
+            radio_km = float(radio_km) if radio_km not in (None, '') else None
+        except (KeyError, ValueError):
+            return Response({'error': 'Debe indicar lat y lon numéricos (k y radio_km son opcionales).'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or k < 1 or (radio_km is not None and radio_km <= 0):
+            return Response({'error': 'Parámetros fuera de rango.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filtrar_cercanos(self.filter_queryset(self.get_queryset()))
+        resultados = buscar_cercanos(queryset, lat, lon, k=min(k, self.MAX_K_CERCANOS), radio_km=radio_km)
+        data = []
+        for obj, distancia in resultados:
+            item = self.get_serializer(obj).data
+            item['distancia_km'] = distancia
+            data.append(item)
+        return Response(data)
 
-class VehiculoViewSet(viewsets.ModelViewSet):
+
+class DisponibilidadMixin:
+    """
+    Agrega la acción GET .../disponibilidad/?desde=&dias=&minimo_min= con las franjas ocupadas y
+    libres de cada recurso (con los mismos filtros del listado), para toda la flota en una respuesta.
+    """
+    MAX_DIAS_DISPONIBILIDAD = 31
+    recurso_disponibilidad = None   # 'vehiculo' o 'conductor'
+    campos_disponibilidad = ()
+
+    def motivo_no_disponible(self, fila):
+        """Motivo por el que el recurso está ocupado toda la ventana (p.ej. en mantenimiento), o None."""
+        return None
+
+    @action(detail=False, methods=['get'], url_path='disponibilidad')
+    def disponibilidad(self, request):
+        try:
+            desde = parametro_fecha(request, 'desde', timezone.now())
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida en el parámetro {e}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            dias = int(request.query_params.get('dias', 7))
+            minimo = timedelta(minutes=int(request.query_params.get('minimo_min', 0)))
+        except ValueError:
+            return Response({'error': 'dias y minimo_min deben ser enteros.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= dias <= self.MAX_DIAS_DISPONIBILIDAD or minimo < timedelta(0):
+            return Response({'error': f'dias debe estar entre 1 y {self.MAX_DIAS_DISPONIBILIDAD} y minimo_min no puede ser negativo.'}, status=status.HTTP_400_BAD_REQUEST)
+        hasta = desde + timedelta(days=dias)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        calendario = disponibilidad.calendario(self.recurso_disponibilidad, queryset, desde, hasta, minimo)
+        data = []
+        for fila in queryset.values('id', *self.campos_disponibilidad):
+            motivo = self.motivo_no_disponible(fila)
+            if motivo:
+                ocupado, libre = [[desde, hasta, []]], []
+            else:
+                ocupado, libre = calendario.get(fila['id'], ([], [(desde, hasta)] if hasta - desde >= minimo else []))
+            data.append({
+                **fila,
+                'motivo_no_disponible': motivo,
+                'ocupado': [{'inicio': inicio, 'fin': fin, 'asignaciones': ids} for inicio, fin, ids in ocupado],
+                'libre': [{'inicio': inicio, 'fin': fin} for inicio, fin in libre],
+                'minutos_libres': round(sum((fin - inicio).total_seconds() for inicio, fin in libre) / 60, 1),
+            })
+        return Response({'desde': desde, 'hasta': hasta, 'minimo_min': minimo.total_seconds() / 60, 'recursos': data})
+
+
+class VehiculoViewSet(RespuestaCacheadaMixin, ListadoRapidoMixin, CercanosMixin, DisponibilidadMixin, viewsets.ModelViewSet):
     queryset = Vehiculo.objects.all().order_by('marca', 'modelo')
     serializer_class = VehiculoSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    modelos_cache = (Vehiculo, Conductor) # Conductor por ?expand=conductor_preferente
+    pagination_class = ConteoCacheadoPagination # ?conteo=exacto para el total exacto (cacheado)
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['estado', 'marca', 'tipo_vehiculo', 'capacidad_pasajeros'] # CORREGIDO: 'capacidad' a 'capacidad_pasajeros', añadido 'tipo_vehiculo'
+    filter_backends = [DjangoFilterBackend, BusquedaTextoFilter, OrderingFilter]
+    filterset_class = VehiculoFilter # estado, marca, tipo_vehiculo, capacidad_pasajeros(__gte), capacidad_carga_kg__gte y ?caracteristicas=silla_ruedas,...
     search_fields = ['patente', 'modelo', 'marca']
+    busqueda_fts = {'pk': 'asignaciones_vehiculo_fts'}
     ordering_fields = ['marca', 'modelo', 'capacidad_pasajeros', 'estado', 'tipo_vehiculo'] # CORREGIDO: 'capacidad' a 'capacidad_pasajeros', añadido 'tipo_vehiculo'
+    recurso_disponibilidad = 'vehiculo'
+    campos_disponibilidad = ('patente', 'tipo_vehiculo', 'capacidad_pasajeros', 'capacidad_carga_kg', 'estado')
 
-class ConductorViewSet(viewsets.ModelViewSet):
-    queryset = Conductor.objects.all().order_by('apellido', 'nombre')
+    def motivo_no_disponible(self, fila):
+        return 'mantenimiento' if fila['estado'] == 'mantenimiento' else None
+
+    @action(detail=True, methods=['get'], url_path=r'foto/(?P<variante>[a-z_]+)', url_name='foto')
+    def foto(self, request, pk=None, variante=None):
+        # Variante redimensionada de la foto (ver services/fotos.py y VehiculoSerializer.foto_variantes)
+        vehiculo = self.get_object()
+        if variante not in VARIANTES or not vehiculo.foto or not vehiculo.foto_variantes_generadas:
+            raise Http404
+        try:
+            archivo = default_storage.open(ruta_variante(vehiculo.foto.name, variante), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(archivo, content_type=VARIANTES[variante][4])
+        if request.query_params.get('v') == version_foto(vehiculo.foto.name):
+            # La URL versionada nunca cambia de contenido: el navegador no necesita volver a pedirla
+            patch_cache_control(response, public=True, max_age=365 * 24 * 3600, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=3600)
+        return response
+
+class ConductorViewSet(RespuestaCacheadaMixin, ListadoRapidoMixin, CercanosMixin, DisponibilidadMixin, viewsets.ModelViewSet):
+    queryset = Conductor.objects.all().prefetch_related('habilitaciones').order_by('apellido', 'nombre')
     serializer_class = ConductorSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    modelos_cache = (Conductor,)
+    pagination_class = ConteoCacheadoPagination
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['activo', 'estado_disponibilidad'] # Añadido 'estado_disponibilidad'
+    filter_backends = [DjangoFilterBackend, BusquedaTextoFilter, OrderingFilter]
+    filterset_class = ConductorFilter # activo, estado_disponibilidad y ?habilitado_para=<tipo_vehiculo>
     search_fields = ['nombre', 'apellido', 'numero_licencia']
+    busqueda_fts = {'pk': 'asignaciones_conductor_fts'}
     ordering_fields = ['apellido', 'nombre', 'activo', 'estado_disponibilidad'] # Añadido 'estado_disponibilidad'
+    recurso_disponibilidad = 'conductor'
+    campos_disponibilidad = ('nombre', 'apellido', 'activo', 'estado_disponibilidad')
+
+    def motivo_no_disponible(self, fila):
+        if not fila['activo']:
+            return 'inactivo'
+        return 'no_disponible' if fila['estado_disponibilidad'] == 'no_disponible' else None
 
+    def filtrar_cercanos(self, queryset):
+        # ?tipo_vehiculo= devuelve sólo conductores habilitados para ese tipo
+        tipo = self.request.query_params.get('tipo_vehiculo')
+        if tipo:
+            queryset = filtrar_habilitados(queryset, tipo)
+        return queryset
 
-class AsignacionViewSet(viewsets.ModelViewSet):
+
+class AsignacionViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     queryset = Asignacion.objects.all().select_related('vehiculo', 'conductor').order_by('-fecha_hora_solicitud')
     serializer_class = AsignacionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AsignacionPagination # ?paginacion=cursor para paginación por cursor (keyset)
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, BusquedaTextoFilter, OrderingFilter]
     # Actualizado para los nuevos nombres y campos
     filterset_fields = {
         'estado': ['exact'],
@@ -51,53 +258,211 @@ class AsignacionViewSet(viewsets.ModelViewSet):
         'fecha_hora_requerida_inicio': ['exact', 'gte', 'lte', 'date'], # Permite filtrar por fecha, mayor/menor que
     }
     search_fields = ['destino_descripcion', 'vehiculo__patente', 'observaciones'] # CORREGIDO: 'destino' a 'destino_descripcion'
+    # En SQLite ?search= usa FTS5 sobre la asignación (incluye origen) y su vehículo (patente, marca, modelo)
+    busqueda_fts = {'pk': 'asignaciones_asignacion_fts', 'vehiculo': 'asignaciones_vehiculo_fts'}
     ordering_fields = ['fecha_hora_requerida_inicio', 'fecha_hora_fin_prevista', 'estado', 'tipo_servicio'] # CORREGIDO: 'fecha_hora_inicio' a 'fecha_hora_requerida_inicio'
 
+    @action(detail=False, methods=['get'], url_path='conflictos')
+    def conflictos(self, request):
+        # Reporte de reservas solapadas: ?desde=&hasta= (por defecto, los próximos 7 días)
+        try:
+            desde = parametro_fecha(request, 'desde', timezone.now())
+            hasta = parametro_fecha(request, 'hasta', desde + timedelta(days=7))
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida en el parámetro {e}.'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta <= desde:
+            return Response({'error': 'El parámetro hasta debe ser posterior a desde.'}, status=status.HTTP_400_BAD_REQUEST)
+        reporte = detectar_conflictos(desde, hasta)
+        return Response({'desde': desde, 'hasta': hasta, 'total': len(reporte), 'conflictos': reporte})
+
+    @action(detail=False, methods=['post'], url_path='planificar')
+    def planificar(self, request):
+        # Encola el planificador por horizonte (?desde=&hasta=); con ?simular=1 devuelve el plan sin guardarlo
+        try:
+            desde = parametro_fecha(request, 'desde', timezone.now())
+            hasta = parametro_fecha(request, 'hasta', desde + planificacion.HORIZONTE)
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida en el parámetro {e}.'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta <= desde or hasta - desde > MAX_HORIZONTE_PLAN:
+            return Response({'error': f'El horizonte debe ser válido y de a lo más {MAX_HORIZONTE_PLAN.days} días.'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('simular') in ('1', 'true'):
+            # En el proceso de la petición, sin pool: el worker y el comando son los que reparten por zonas
+            tiempo = min(planificacion.TIEMPO_LIMITE_S, MAX_SEGUNDOS_SIMULACION)
+            return Response(planificacion.planificar(desde, hasta, tiempo_limite=tiempo, procesos=1, aplicar=False))
+        tareas.encolar('planificar', f'{desde.isoformat()}|{hasta.isoformat()}')
+        return Response({'encolada': True, 'desde': desde, 'hasta': hasta}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path='exportar')
+    def exportar(self, request):
+        # Historial completo (mismos filtros, búsqueda y orden que el listado) sin paginar: ?formato=csv|ndjson
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({'error': f"El formato debe ser uno de: {', '.join(FORMATOS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(exportar(queryset, formato), content_type=FORMATOS[formato])
+        response['Content-Disposition'] = f'attachment; filename="asignaciones.{formato}"'
+        return response
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        # POST: crea una lista de asignaciones. PATCH: actualiza una lista (cada elemento con su 'id').
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({'error': 'Se espera una lista de objetos.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > carga_masiva.MAX_ELEMENTOS:
+            return Response({'error': f'Máximo {carga_masiva.MAX_ELEMENTOS} elementos por solicitud.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        actualizar = request.method == 'PATCH'
+        asignaciones, errores = carga_masiva.procesar_lote(items, actualizar=actualizar, context=self.get_serializer_context())
+        if errores:
+            return Response({'errores': errores}, status=status.HTTP_400_BAD_REQUEST)
+        if any(a.estado == 'pendiente_auto' for a in asignaciones):
+            tareas.encolar('asignar_pendientes')
+        return Response(
+            {'procesadas': len(asignaciones), 'ids': [a.pk for a in asignaciones]},
+            status=status.HTTP_200_OK if actualizar else status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['post'], url_path='transicion')
+    def transicion(self, request):
+        # Inicia o completa varias asignaciones de una vez: {"accion": "iniciar"|"completar", "ids": [...]}
+        accion = request.data.get('accion')
+        ids = request.data.get('ids')
+        if accion not in TRANSICIONES:
+            return Response({'error': f"La acción debe ser una de: {', '.join(TRANSICIONES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response({'error': 'Se espera una lista de ids de asignaciones.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_TRANSICIONES:
+            return Response({'error': f'Máximo {MAX_TRANSICIONES} asignaciones por solicitud.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        procesadas, errores = transicionar(accion, ids)
+        self._encolar_reasignacion(accion, procesadas)
+        return Response({'procesadas': procesadas, 'errores': errores}, status=status.HTTP_200_OK)
+
+    def _encolar_reasignacion(self, accion, procesadas):
+        # Completar libera vehículos y conductores: el motor corre en segundo plano por si hay solicitudes esperando
+        if accion == 'completar' and procesadas:
+            tareas.encolar('asignar_pendientes')
+
+    def _transicion_individual(self, accion, mensaje):
+        asignacion = self.get_object()
+        procesadas, errores = transicionar(accion, [asignacion.pk])
+        if errores:
+            return Response({'error': errores[asignacion.pk]}, status=status.HTTP_400_BAD_REQUEST)
+        self._encolar_reasignacion(accion, procesadas)
+        asignacion.refresh_from_db()
+        return Response({'status': mensaje, 'asignacion': self.get_serializer(asignacion).data}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], url_path='completar')
     def completar_asignacion(self, request, pk=None):
-        asignacion = self.get_object()
-        if asignacion.estado == 'activa':
-            asignacion.estado = 'completada'
-            asignacion.fecha_hora_fin_real = timezone.now()
-            if asignacion.vehiculo:
-                asignacion.vehiculo.estado = 'disponible'
-                asignacion.vehiculo.save()
-            if asignacion.conductor: # Poner conductor como disponible también
-                asignacion.conductor.estado_disponibilidad = 'disponible'
-                asignacion.conductor.save()
-            asignacion.save()
-            return Response({'status': 'asignación completada', 'asignacion': self.get_serializer(asignacion).data}, status=status.HTTP_200_OK)
-        else:
-            return Response({'error': 'La asignación no está activa o ya está completada/cancelada.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._transicion_individual('completar', 'asignación completada')
 
     @action(detail=True, methods=['post'], url_path='iniciar')
     def iniciar_asignacion(self, request, pk=None):
-        asignacion = self.get_object()
-        if asignacion.estado == 'programada':
-            if not asignacion.vehiculo or not asignacion.conductor:
-                return Response({'error': 'La asignación debe tener un vehículo y un conductor asignados para poder iniciarla.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            if asignacion.vehiculo.estado != 'disponible' and asignacion.vehiculo.estado != 'reservado': # Permitir iniciar si estaba reservado
-                return Response({'error': f'El vehículo {asignacion.vehiculo.patente} no está disponible.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if asignacion.conductor.estado_disponibilidad != 'disponible' or not asignacion.conductor.activo :
-                return Response({'error': f'El conductor {asignacion.conductor} no está disponible o no está activo.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            asignacion.vehiculo.estado = 'en_uso'
-            asignacion.vehiculo.save()
-            asignacion.conductor.estado_disponibilidad = 'en_ruta'
-            asignacion.conductor.save()
-            
-            asignacion.estado = 'activa'
-            asignacion.save()
-            return Response({'status': 'asignación iniciada', 'asignacion': self.get_serializer(asignacion).data}, status=status.HTTP_200_OK)
-        else:
-            return Response({'error': 'La asignación no está programada o ya está en otro estado.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._transicion_individual('iniciar', 'asignación iniciada')
 
     def perform_create(self, serializer):
-        # Aquí podrías llamar a tu futuro servicio de asignación automática si el estado es 'pendiente_auto'
-        # asignacion_obj = serializer.save()
-        # if asignacion_obj.estado == 'pendiente_auto':
-        #     from .services import intentar_asignacion_automatica # Suponiendo que lo crearás
-        #     intentar_asignacion_automatica(asignacion_obj)
-        serializer.save()
\ No newline at end of file
+        asignacion_obj = serializer.save()
+        if asignacion_obj.estado == 'pendiente_auto':
+            # El motor corre en el worker (manage.py procesar_tareas) sobre todas las pendientes: una
+            # ráfaga de solicitudes comparte la misma tarea 'asignar_pendientes' y se resuelve una vez
+            tareas.encolar('asignar_pendientes')
+
+
+class EstadisticasView(APIView):
+    """Dashboard de uso de la flota: ?desde=&hasta= (fechas YYYY-MM-DD, por defecto los últimos 30 días)."""
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_DIAS = 366
+
+    def _fecha(self, request, nombre, por_defecto):
+        valor = request.query_params.get(nombre)
+        if not valor:
+            return por_defecto
+        try:
+            fecha = parse_date(valor)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            raise ValueError(nombre)
+        return fecha
+
+    def get(self, request):
+        hoy = timezone.localdate()
+        try:
+            desde = self._fecha(request, 'desde', hoy - timedelta(days=29))
+            hasta = self._fecha(request, 'hasta', hoy)
+        except ValueError as e:
+            return Response({'error': f'Fecha inválida en el parámetro {e} (formato YYYY-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta < desde or (hasta - desde).days >= self.MAX_DIAS:
+            return Response({'error': f'El rango debe ser válido y de a lo más {self.MAX_DIAS} días.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'desde': desde, 'hasta': hasta, **resumen(desde, hasta)})
+
+
+class PosicionesView(APIView):
+    """
+    Ingesta de pings GPS: POST con [{"patente"|"licencia": ..., "lat": ..., "lon": ..., "ts": ...}, ...].
+    Las posiciones se escriben en lote cada pocos segundos (ver services/posiciones.py), por eso responde 202.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Se espera una lista de pings.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > posiciones.MAX_PINGS:
+            return Response({'error': f'Máximo {posiciones.MAX_PINGS} pings por solicitud.'}, status=status.HTTP_400_BAD_REQUEST)
+        aceptados, errores = posiciones.registrar(items)
+        return Response({'aceptados': aceptados, 'errores': errores}, status=status.HTTP_202_ACCEPTED)
+
+
+INTERVALO_KEEPALIVE_SSE = 15
+
+
+async def _usuario_eventos(request):
+    # EventSource no permite cabeceras propias, así que el token también se acepta como ?token=
+    clave = request.GET.get('token')
+    autorizacion = request.headers.get('Authorization', '')
+    if not clave and autorizacion.startswith('Token '):
+        clave = autorizacion[len('Token '):].strip()
+    if clave:
+        token = await Token.objects.select_related('user').filter(key=clave).afirst()
+        return token.user if token and token.user.is_active else None
+    usuario = await request.auser()
+    return usuario if usuario.is_authenticated else None
+
+
+async def _flujo_eventos(suscripcion):
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), INTERVALO_KEEPALIVE_SSE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield eventos.formato_sse(evento)
+    finally:
+        eventos.desuscribir(suscripcion)
+
+
+async def stream_eventos(request):
+    """
+    Stream Server-Sent Events con los cambios de estado de asignaciones y de estado/posición de la flota.
+    ?tipos=asignacion,vehiculo,conductor filtra por tipo. Requiere un servidor ASGI (uvicorn, daphne...).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+    if 'wsgi.version' in request.META:
+        return JsonResponse({'error': 'El stream de eventos requiere servir la aplicación con ASGI.'}, status=501)
+    if await _usuario_eventos(request) is None:
+        return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+
+    tipos = [t for t in request.GET.get('tipos', '').split(',') if t] or list(eventos.TIPOS)
+    desconocidos = set(tipos) - set(eventos.TIPOS)
+    if desconocidos:
+        return JsonResponse({'error': f"Tipos desconocidos: {', '.join(sorted(desconocidos))}."}, status=400)
+
+    response = StreamingHttpResponse(_flujo_eventos(eventos.suscribir(tipos)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Que nginx no acumule el stream
+    return response
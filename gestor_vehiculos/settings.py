@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'asignaciones.metricas.MetricasMiddleware', # Primero, para medir también al resto de los middleware (ver /api/metrics/)
+    'asignaciones.replicas.ReplicaLecturaMiddleware', # Lecturas GET a la réplica, si hay (ver DATABASES)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -108,6 +111,40 @@ DATABASES = {
     }
 }
 
+# Réplica de lectura opcional: las lecturas seguras de la API (listados, exportación, estadísticas)
+# van a la réplica y todo lo demás a 'default' (ver asignaciones/replicas.py). Para probarla en local
+# con un segundo archivo SQLite: GESTOR_DB_REPLICA=replica.sqlite3 y 'manage.py sincronizar_replica'.
+if os.environ.get('GESTOR_DB_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['GESTOR_DB_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+ASIGNACIONES_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+ASIGNACIONES_REPLICA_VENTANA_S = 5 # Segundos que un cliente lee de 'default' después de escribir
+DATABASE_ROUTERS = ['asignaciones.replicas.RouterReplicas']
+
+# Caché
+# 'versiones' guarda los contadores de versión por modelo (asignaciones/cache.py); debe ser compartido
+# entre todos los procesos del servidor, por eso usa archivos. 'respuestas' guarda los cuerpos de las
+# respuestas cacheadas en memoria de cada proceso (LocMemCache descarta las menos usadas al llenarse).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gestor-default',
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'versiones',
+    },
+    'respuestas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gestor-respuestas',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 500, 'CULL_FREQUENCY': 4},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators